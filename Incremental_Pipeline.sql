@@ -0,0 +1,105 @@
+USE ROLE accountadmin;
+
+-- Incremental refresh of doc_extract: only PDFs that are new, whose content
+-- changed (md5) or that were extracted with another field set are sent to
+-- AI_EXTRACT. Run Initial_Setup.sql first.
+
+ALTER STAGE pdf_extractor_db.pdf_processing.pdf_upload_stage SET DIRECTORY = (ENABLE = TRUE);
+
+ALTER TABLE pdf_extractor_db.pdf_processing.doc_extract ADD COLUMN IF NOT EXISTS md5 STRING;
+ALTER TABLE pdf_extractor_db.pdf_processing.doc_extract ADD COLUMN IF NOT EXISTS field_set_id STRING;
+ALTER TABLE pdf_extractor_db.pdf_processing.doc_extract ADD COLUMN IF NOT EXISTS extracted_at TIMESTAMP_LTZ;
+
+-- Mark rows built by Initial_Setup.sql as current so they are not extracted again
+ALTER STAGE pdf_extractor_db.pdf_processing.pdf_upload_stage REFRESH;
+
+UPDATE pdf_extractor_db.pdf_processing.doc_extract t
+SET md5 = d.md5, field_set_id = 'loan_docs_v1', extracted_at = CURRENT_TIMESTAMP()
+FROM DIRECTORY (@pdf_extractor_db.pdf_processing.pdf_upload_stage) d
+WHERE t.relative_path = d.relative_path
+  AND t.md5 IS NULL;
+
+
+-- set_id names the responseFormat list below and is stamped on every row as
+-- field_set_id: call with a new id whenever the list changes so every PDF is
+-- extracted again with the new fields. pdf_extractor.incremental uses the same
+-- column, so pass it the same id (set_id='loan_docs_v1') when both maintain this table
+CREATE OR REPLACE PROCEDURE pdf_extractor_db.pdf_processing.refresh_doc_extract(set_id STRING)
+RETURNS NUMBER
+LANGUAGE SQL
+AS
+$$
+BEGIN
+  ALTER STAGE pdf_extractor_db.pdf_processing.pdf_upload_stage REFRESH;
+
+  MERGE INTO pdf_extractor_db.pdf_processing.doc_extract t
+  USING (
+    SELECT d.relative_path, d.md5, :set_id AS field_set_id,
+    AI_EXTRACT(
+      file => TO_FILE('@pdf_extractor_db.pdf_processing.pdf_upload_stage', d.relative_path),
+      responseFormat => [
+        'Company Name',
+        'Doing Business As',
+        'Primary ID Type',
+        'Primary ID Number',
+        'Country of Issue',
+        'State/Province of Issue',
+        'Date of Issue',
+        'Customer Name',
+        'Address Type',
+        'Primary Address',
+        'City',
+        'County',
+        'Country',
+        'Postal Code',
+        'State/Province',
+        'Primary Contact Name',
+        'Primary Contact Number',
+        'Contact Type',
+        'Primary Email Address',
+        'Fax #',
+        'Previous Address',
+        'Organization ID',
+        'Date Business Established',
+        'Country of Incorporation',
+        'State/Province of Organization',
+        'Resolution Date',
+        '# of Required Signers',
+        '# of Employees',
+        'Date Current Ownership Started'
+      ]
+    ) AS extract_data
+    FROM DIRECTORY (@pdf_extractor_db.pdf_processing.pdf_upload_stage) d
+    LEFT JOIN pdf_extractor_db.pdf_processing.doc_extract e
+      ON e.relative_path = d.relative_path
+    WHERE LOWER(d.relative_path) LIKE '%.pdf'
+      AND (e.relative_path IS NULL
+           OR e.md5 IS DISTINCT FROM d.md5
+           OR e.field_set_id IS DISTINCT FROM :set_id)
+  ) s
+  ON t.relative_path = s.relative_path
+  WHEN MATCHED THEN UPDATE SET
+    md5 = s.md5,
+    field_set_id = s.field_set_id,
+    extract_data = s.extract_data,
+    extracted_at = CURRENT_TIMESTAMP()
+  WHEN NOT MATCHED THEN INSERT (relative_path, md5, field_set_id, extract_data, extracted_at)
+    VALUES (s.relative_path, s.md5, s.field_set_id, s.extract_data, CURRENT_TIMESTAMP());
+
+  RETURN SQLROWCOUNT;
+END;
+$$;
+
+CALL pdf_extractor_db.pdf_processing.refresh_doc_extract('loan_docs_v1');
+
+-- Daily load: a serverless task picks up whatever arrived since the last run
+CREATE OR REPLACE TASK pdf_extractor_db.pdf_processing.refresh_doc_extract_task
+  SCHEDULE = 'USING CRON 0 2 * * * UTC'
+AS
+  CALL pdf_extractor_db.pdf_processing.refresh_doc_extract('loan_docs_v1');
+
+ALTER TASK pdf_extractor_db.pdf_processing.refresh_doc_extract_task RESUME;
+
+select relative_path, md5, field_set_id, extracted_at
+from pdf_extractor_db.pdf_processing.doc_extract
+order by extracted_at desc;
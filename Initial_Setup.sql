@@ -50,11 +50,14 @@ FROM DIRECTORY (@pdf_extractor_db.pdf_processing.pdf_upload_stage);
 
 select * from pdf_extractor_db.pdf_processing.doc_extract;
 
+-- Ad hoc look at every extracted field; Typed_Extract.sql materializes them as
+-- typed columns so regular queries need not parse extract_data
 select relative_path
 ,extract_data:response:"Company Name"
 ,extract_data:response:"Doing Business As"
 ,extract_data:response:"Primary ID Type"
 ,extract_data:response:"Primary ID Number"
+,extract_data:response:"Country of Issue"
 ,extract_data:response:"State/Province of Issue"
 ,extract_data:response:"Date of Issue"
 ,extract_data:response:"Customer Name"
@@ -64,12 +67,14 @@ select relative_path
 ,extract_data:response:"County"
 ,extract_data:response:"Country"
 ,extract_data:response:"Postal Code"
+,extract_data:response:"State/Province"
 ,extract_data:response:"Primary Contact Name"
 ,extract_data:response:"Primary Contact Number"
 ,extract_data:response:"Contact Type"
 ,extract_data:response:"Primary Email Address"
 ,extract_data:response:"Fax #"
 ,extract_data:response:"Previous Address"
+,extract_data:response:"Organization ID"
 ,extract_data:response:"Date Business Established"
 ,extract_data:response:"Country of Incorporation"
 ,extract_data:response:"State/Province of Organization"
@@ -0,0 +1,117 @@
+USE ROLE accountadmin;
+
+-- Typed copy of doc_extract: one native column per extracted field, so
+-- analytics scan DATE, NUMBER and STRING columns instead of parsing the
+-- extract_data VARIANT on every read. Run Initial_Setup.sql first.
+--
+-- Generated from the "Loan Docs: Full" template of pdf_extractor/schema.py
+-- (types and normalization rules live there); regenerate after changing it:
+--   python -m pdf_extractor.schema --template "Loan Docs: Full" --cluster-by DATE_OF_ISSUE
+-- Add --plain for a MERGE-maintained table instead of a dynamic table.
+
+CREATE OR REPLACE DYNAMIC TABLE pdf_extractor_db.pdf_processing.doc_extract_typed
+TARGET_LAG = '1 hour'
+WAREHOUSE = compute_wh
+CLUSTER BY (DATE_OF_ISSUE)
+COMMENT = 'Typed AI_EXTRACT fields, field set b96aaef527123521'
+AS
+SELECT
+    relative_path,
+    COMPANY_NAME::STRING AS COMPANY_NAME,
+    DOING_BUSINESS_AS::STRING AS DOING_BUSINESS_AS,
+    PRIMARY_ID_TYPE::STRING AS PRIMARY_ID_TYPE,
+    PRIMARY_ID_NUMBER::STRING AS PRIMARY_ID_NUMBER,
+    COUNTRY_OF_ISSUE::STRING AS COUNTRY_OF_ISSUE,
+    STATE_PROVINCE_OF_ISSUE::STRING AS STATE_PROVINCE_OF_ISSUE,
+    COALESCE(TRY_TO_DATE(DATE_OF_ISSUE), TRY_TO_DATE(DATE_OF_ISSUE, 'MM/DD/YYYY'), TRY_TO_DATE(DATE_OF_ISSUE, 'DD-MON-YYYY'), TRY_TO_DATE(DATE_OF_ISSUE, 'MMMM DD, YYYY'))::DATE AS DATE_OF_ISSUE,
+    CUSTOMER_NAME::STRING AS CUSTOMER_NAME,
+    ADDRESS_TYPE::STRING AS ADDRESS_TYPE,
+    PRIMARY_ADDRESS::STRING AS PRIMARY_ADDRESS,
+    CITY::STRING AS CITY,
+    COUNTY::STRING AS COUNTY,
+    COUNTRY::STRING AS COUNTRY,
+    POSTAL_CODE::STRING AS POSTAL_CODE,
+    STATE_PROVINCE::STRING AS STATE_PROVINCE,
+    PRIMARY_CONTACT_NAME::STRING AS PRIMARY_CONTACT_NAME,
+    PRIMARY_CONTACT_NUMBER::STRING AS PRIMARY_CONTACT_NUMBER,
+    CONTACT_TYPE::STRING AS CONTACT_TYPE,
+    PRIMARY_EMAIL_ADDRESS::STRING AS PRIMARY_EMAIL_ADDRESS,
+    FAX_NUM::STRING AS FAX_NUM,
+    PREVIOUS_ADDRESS::STRING AS PREVIOUS_ADDRESS,
+    ORGANIZATION_ID::STRING AS ORGANIZATION_ID,
+    COALESCE(TRY_TO_DATE(DATE_BUSINESS_ESTABLISHED), TRY_TO_DATE(DATE_BUSINESS_ESTABLISHED, 'MM/DD/YYYY'), TRY_TO_DATE(DATE_BUSINESS_ESTABLISHED, 'DD-MON-YYYY'), TRY_TO_DATE(DATE_BUSINESS_ESTABLISHED, 'MMMM DD, YYYY'))::DATE AS DATE_BUSINESS_ESTABLISHED,
+    COUNTRY_OF_INCORPORATION::STRING AS COUNTRY_OF_INCORPORATION,
+    STATE_PROVINCE_OF_ORGANIZATION::STRING AS STATE_PROVINCE_OF_ORGANIZATION,
+    COALESCE(TRY_TO_DATE(RESOLUTION_DATE), TRY_TO_DATE(RESOLUTION_DATE, 'MM/DD/YYYY'), TRY_TO_DATE(RESOLUTION_DATE, 'DD-MON-YYYY'), TRY_TO_DATE(RESOLUTION_DATE, 'MMMM DD, YYYY'))::DATE AS RESOLUTION_DATE,
+    TRY_TO_NUMBER(REGEXP_REPLACE(NUM_OF_REQUIRED_SIGNERS, '[^0-9-]', ''))::NUMBER(38, 0) AS NUM_OF_REQUIRED_SIGNERS,
+    TRY_TO_NUMBER(REGEXP_REPLACE(NUM_OF_EMPLOYEES, '[^0-9-]', ''))::NUMBER(38, 0) AS NUM_OF_EMPLOYEES,
+    COALESCE(TRY_TO_DATE(DATE_CURRENT_OWNERSHIP_STARTED), TRY_TO_DATE(DATE_CURRENT_OWNERSHIP_STARTED, 'MM/DD/YYYY'), TRY_TO_DATE(DATE_CURRENT_OWNERSHIP_STARTED, 'DD-MON-YYYY'), TRY_TO_DATE(DATE_CURRENT_OWNERSHIP_STARTED, 'MMMM DD, YYYY'))::DATE AS DATE_CURRENT_OWNERSHIP_STARTED
+FROM (
+SELECT
+    relative_path,
+    IFF(UPPER(TRIM(COMPANY_NAME)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(COMPANY_NAME)) AS COMPANY_NAME,
+    IFF(UPPER(TRIM(DOING_BUSINESS_AS)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(DOING_BUSINESS_AS)) AS DOING_BUSINESS_AS,
+    IFF(UPPER(TRIM(PRIMARY_ID_TYPE)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(PRIMARY_ID_TYPE)) AS PRIMARY_ID_TYPE,
+    IFF(UPPER(TRIM(PRIMARY_ID_NUMBER)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(PRIMARY_ID_NUMBER)) AS PRIMARY_ID_NUMBER,
+    IFF(UPPER(TRIM(COUNTRY_OF_ISSUE)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(COUNTRY_OF_ISSUE)) AS COUNTRY_OF_ISSUE,
+    IFF(UPPER(TRIM(STATE_PROVINCE_OF_ISSUE)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(STATE_PROVINCE_OF_ISSUE)) AS STATE_PROVINCE_OF_ISSUE,
+    IFF(UPPER(TRIM(DATE_OF_ISSUE)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(DATE_OF_ISSUE)) AS DATE_OF_ISSUE,
+    IFF(UPPER(TRIM(CUSTOMER_NAME)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(CUSTOMER_NAME)) AS CUSTOMER_NAME,
+    IFF(UPPER(TRIM(ADDRESS_TYPE)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(ADDRESS_TYPE)) AS ADDRESS_TYPE,
+    IFF(UPPER(REGEXP_REPLACE(TRIM(PRIMARY_ADDRESS), '[[:space:]]+', ' ')) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, REGEXP_REPLACE(TRIM(PRIMARY_ADDRESS), '[[:space:]]+', ' ')) AS PRIMARY_ADDRESS,
+    IFF(UPPER(TRIM(CITY)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(CITY)) AS CITY,
+    IFF(UPPER(TRIM(COUNTY)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(COUNTY)) AS COUNTY,
+    IFF(UPPER(TRIM(COUNTRY)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(COUNTRY)) AS COUNTRY,
+    IFF(UPPER(TRIM(POSTAL_CODE)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(POSTAL_CODE)) AS POSTAL_CODE,
+    IFF(UPPER(TRIM(STATE_PROVINCE)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(STATE_PROVINCE)) AS STATE_PROVINCE,
+    IFF(UPPER(TRIM(PRIMARY_CONTACT_NAME)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(PRIMARY_CONTACT_NAME)) AS PRIMARY_CONTACT_NAME,
+    REGEXP_REPLACE(IFF(UPPER(TRIM(PRIMARY_CONTACT_NUMBER)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(PRIMARY_CONTACT_NUMBER)), '[^0-9]', '') AS PRIMARY_CONTACT_NUMBER,
+    IFF(UPPER(TRIM(CONTACT_TYPE)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(CONTACT_TYPE)) AS CONTACT_TYPE,
+    LOWER(IFF(UPPER(TRIM(PRIMARY_EMAIL_ADDRESS)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(PRIMARY_EMAIL_ADDRESS))) AS PRIMARY_EMAIL_ADDRESS,
+    REGEXP_REPLACE(IFF(UPPER(TRIM(FAX_NUM)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(FAX_NUM)), '[^0-9]', '') AS FAX_NUM,
+    IFF(UPPER(REGEXP_REPLACE(TRIM(PREVIOUS_ADDRESS), '[[:space:]]+', ' ')) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, REGEXP_REPLACE(TRIM(PREVIOUS_ADDRESS), '[[:space:]]+', ' ')) AS PREVIOUS_ADDRESS,
+    IFF(UPPER(TRIM(ORGANIZATION_ID)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(ORGANIZATION_ID)) AS ORGANIZATION_ID,
+    IFF(UPPER(TRIM(DATE_BUSINESS_ESTABLISHED)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(DATE_BUSINESS_ESTABLISHED)) AS DATE_BUSINESS_ESTABLISHED,
+    IFF(UPPER(TRIM(COUNTRY_OF_INCORPORATION)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(COUNTRY_OF_INCORPORATION)) AS COUNTRY_OF_INCORPORATION,
+    IFF(UPPER(TRIM(STATE_PROVINCE_OF_ORGANIZATION)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(STATE_PROVINCE_OF_ORGANIZATION)) AS STATE_PROVINCE_OF_ORGANIZATION,
+    IFF(UPPER(TRIM(RESOLUTION_DATE)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(RESOLUTION_DATE)) AS RESOLUTION_DATE,
+    IFF(UPPER(TRIM(NUM_OF_REQUIRED_SIGNERS)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(NUM_OF_REQUIRED_SIGNERS)) AS NUM_OF_REQUIRED_SIGNERS,
+    IFF(UPPER(TRIM(NUM_OF_EMPLOYEES)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(NUM_OF_EMPLOYEES)) AS NUM_OF_EMPLOYEES,
+    IFF(UPPER(TRIM(DATE_CURRENT_OWNERSHIP_STARTED)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(DATE_CURRENT_OWNERSHIP_STARTED)) AS DATE_CURRENT_OWNERSHIP_STARTED
+FROM (
+SELECT
+    relative_path,
+    TO_VARCHAR(extract_data['response']['Company Name']) AS COMPANY_NAME,
+    TO_VARCHAR(extract_data['response']['Doing Business As']) AS DOING_BUSINESS_AS,
+    TO_VARCHAR(extract_data['response']['Primary ID Type']) AS PRIMARY_ID_TYPE,
+    TO_VARCHAR(extract_data['response']['Primary ID Number']) AS PRIMARY_ID_NUMBER,
+    TO_VARCHAR(extract_data['response']['Country of Issue']) AS COUNTRY_OF_ISSUE,
+    TO_VARCHAR(extract_data['response']['State/Province of Issue']) AS STATE_PROVINCE_OF_ISSUE,
+    TO_VARCHAR(extract_data['response']['Date of Issue']) AS DATE_OF_ISSUE,
+    TO_VARCHAR(extract_data['response']['Customer Name']) AS CUSTOMER_NAME,
+    TO_VARCHAR(extract_data['response']['Address Type']) AS ADDRESS_TYPE,
+    TO_VARCHAR(extract_data['response']['Primary Address']) AS PRIMARY_ADDRESS,
+    TO_VARCHAR(extract_data['response']['City']) AS CITY,
+    TO_VARCHAR(extract_data['response']['County']) AS COUNTY,
+    TO_VARCHAR(extract_data['response']['Country']) AS COUNTRY,
+    TO_VARCHAR(extract_data['response']['Postal Code']) AS POSTAL_CODE,
+    TO_VARCHAR(extract_data['response']['State/Province']) AS STATE_PROVINCE,
+    TO_VARCHAR(extract_data['response']['Primary Contact Name']) AS PRIMARY_CONTACT_NAME,
+    TO_VARCHAR(extract_data['response']['Primary Contact Number']) AS PRIMARY_CONTACT_NUMBER,
+    TO_VARCHAR(extract_data['response']['Contact Type']) AS CONTACT_TYPE,
+    TO_VARCHAR(extract_data['response']['Primary Email Address']) AS PRIMARY_EMAIL_ADDRESS,
+    TO_VARCHAR(extract_data['response']['Fax #']) AS FAX_NUM,
+    TO_VARCHAR(extract_data['response']['Previous Address']) AS PREVIOUS_ADDRESS,
+    TO_VARCHAR(extract_data['response']['Organization ID']) AS ORGANIZATION_ID,
+    TO_VARCHAR(extract_data['response']['Date Business Established']) AS DATE_BUSINESS_ESTABLISHED,
+    TO_VARCHAR(extract_data['response']['Country of Incorporation']) AS COUNTRY_OF_INCORPORATION,
+    TO_VARCHAR(extract_data['response']['State/Province of Organization']) AS STATE_PROVINCE_OF_ORGANIZATION,
+    TO_VARCHAR(extract_data['response']['Resolution Date']) AS RESOLUTION_DATE,
+    TO_VARCHAR(extract_data['response']['# of Required Signers']) AS NUM_OF_REQUIRED_SIGNERS,
+    TO_VARCHAR(extract_data['response']['# of Employees']) AS NUM_OF_EMPLOYEES,
+    TO_VARCHAR(extract_data['response']['Date Current Ownership Started']) AS DATE_CURRENT_OWNERSHIP_STARTED
+FROM pdf_extractor_db.pdf_processing.doc_extract
+)
+);
+
+SELECT * FROM pdf_extractor_db.pdf_processing.doc_extract_typed;
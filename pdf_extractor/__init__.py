@@ -0,0 +1,3 @@
+"""
+Building blocks of the PDF Data Extractor that run without Streamlit.
+"""
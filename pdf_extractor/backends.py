@@ -0,0 +1,161 @@
+"""
+Session backends: the interface every query of the extractor goes through.
+
+A backend exposes the part of Snowpark's Session the extractor uses,
+`sql(query, params)` returning an object with `collect()` and
+`collect_nowait()`, and counts the queries issued, the bytes of SQL text
+sent and the bytes of bind values sent with them. When a
+backend carries a RunTrace in `trace`, each query is also timed and
+recorded there with its query ID. The live app wraps its Snowpark session
+in SnowflakeBackend; benchmarks and offline runs use
+pdf_extractor.local_cortex.LocalCortexBackend instead.
+"""
+
+import threading
+import time
+
+from pdf_extractor.execution import classify_error
+
+
+def bind_chars(params):
+    """Characters of bind values sent with a query."""
+    return sum(len(str(value)) for value in params or () if value is not None)
+
+
+class QueryStats:
+    """Number of queries issued and bytes of SQL text and bind values sent through a backend."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_bytes = 0
+        self.bind_bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, query, params=None):
+        with self._lock:
+            self.queries += 1
+            self.sql_bytes += len(query.encode("utf-8"))
+            self.bind_bytes += sum(len(str(value).encode("utf-8")) for value in params or () if value is not None)
+
+    def snapshot(self):
+        """Return (queries, sql_bytes) so far."""
+        with self._lock:
+            return self.queries, self.sql_bytes
+
+    def reset(self):
+        with self._lock:
+            self.queries = 0
+            self.sql_bytes = 0
+            self.bind_bytes = 0
+
+
+class TracedJob:
+    """Async job that records its query in a RunTrace when its result is fetched.
+
+    The duration runs from submission until result() returns, so for jobs
+    polled by a QueryRunner it includes up to one poll interval.
+    """
+
+    def __init__(self, job, trace, step, started_at, input_chars):
+        self.job = job
+        self.trace = trace
+        self.step = step
+        self.started_at = started_at
+        self.input_chars = input_chars
+
+    @property
+    def query_id(self):
+        return getattr(self.job, "query_id", None)
+
+    def is_done(self):
+        return self.job.is_done()
+
+    def result(self):
+        try:
+            rows = self.job.result()
+        except Exception as e:
+            self.trace.record(self.step, self.started_at, self.query_id, self.input_chars, classify_error(e))
+            raise
+        self.trace.record(self.step, self.started_at, self.query_id, self.input_chars, "ok")
+        return rows
+
+
+class TracedStatement:
+    """Statement whose execution is recorded in a RunTrace.
+
+    collect() runs through collect_nowait() so that the query ID is known
+    for synchronous queries too.
+    """
+
+    def __init__(self, statement, trace, query, params=None):
+        self.statement = statement
+        self.trace = trace
+        self.query = query
+        self.input_chars = len(query) + bind_chars(params)
+        # Tagged when the statement is created, like the query text itself
+        self.step = trace.current()
+
+    def collect(self):
+        return self.collect_nowait().result()
+
+    def collect_nowait(self):
+        started_at = time.time()
+        try:
+            job = self.statement.collect_nowait()
+        except Exception as e:
+            self.trace.record(self.step, started_at, None, self.input_chars, classify_error(e))
+            raise
+        return TracedJob(job, self.trace, self.step, started_at, self.input_chars)
+
+
+def traced_bulk_load(backend, table_name, row_count, load):
+    """Run `load()`, a bulk load into `table_name`, counted and traced like one query."""
+    statement = f"-- bulk load of {row_count} rows into {table_name}"
+    backend.stats.record(statement)
+    trace = backend.trace
+    if trace is None:
+        return load()
+    step = trace.current()
+    started_at = time.time()
+    try:
+        result = load()
+    except Exception as e:
+        trace.record(step, started_at, None, len(statement), classify_error(e))
+        raise
+    trace.record(step, started_at, None, len(statement), "ok")
+    return result
+
+
+def traced(statement, trace, query, params=None):
+    """Wrap `statement` for `trace`, or return it unchanged when there is no trace."""
+    if trace is None:
+        return statement
+    return TracedStatement(statement, trace, query, params)
+
+
+class SnowflakeBackend:
+    """Backend over a live Snowpark session.
+
+    Attributes other than `sql` (e.g. get_current_account) are passed
+    through to the wrapped session.
+    """
+
+    def __init__(self, session, trace=None):
+        self.session = session
+        self.stats = QueryStats()
+        self.trace = trace
+
+    def sql(self, query, params=None):
+        """Snowpark's sql(); `params` are qmark bind values."""
+        self.stats.record(query, params)
+        statement = self.session.sql(query, params=list(params)) if params else self.session.sql(query)
+        return traced(statement, self.trace, query, params)
+
+    def write_pandas(self, df, table_name, **kwargs):
+        """Append `df` to an existing table with Snowpark's write_pandas (staged Parquet plus COPY)."""
+        return traced_bulk_load(
+            self, table_name, len(df), lambda: self.session.write_pandas(df, table_name, **kwargs)
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
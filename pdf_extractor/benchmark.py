@@ -0,0 +1,204 @@
+"""
+Offline benchmark of the extraction paths against LocalCortexBackend.
+
+Reports, per strategy and scenario, the queries issued, the bytes of SQL
+text and of bind values sent, wall-clock time per document and per field, and the share of
+fields answered correctly. Run from the repository root:
+
+    python -m pdf_extractor.benchmark
+    python -m pdf_extractor.benchmark --fields 7 29 --chars 20000 250000 --docs 1 20
+    python -m pdf_extractor.benchmark --strategies chunked_text --timing
+"""
+
+import argparse
+import itertools
+import time
+
+from pdf_extractor.chunking import extract_fields_from_chunks, split_chunks
+from pdf_extractor.execution import QueryRunner, RetryPolicy
+from pdf_extractor.extraction import extract_fields, run_batch_extract
+from pdf_extractor.instrumentation import RunTrace
+from pdf_extractor.local_cortex import LocalCortexBackend, make_documents
+from pdf_extractor.parsing import parse_document
+from pdf_extractor.schema import LOAN_DOC_FIELDS
+from pdf_extractor.sql import file_source, text_source
+
+STAGE_NAME = "pdf_upload_stage"
+
+LOAN_DOC_FIELD_NAMES = [field['name'] for field in LOAN_DOC_FIELDS]
+
+
+def _parsed_text(runner, doc):
+    parsed_text, _, errors = parse_document(
+        runner.session, STAGE_NAME, doc.relative_path, retry_policy=runner.retry_policy
+    )
+    if parsed_text is None:
+        raise RuntimeError(f"Could not parse {doc.relative_path}: {errors}")
+    return parsed_text
+
+
+def per_field_text(runner, docs, fields):
+    """The original app: parse, truncate to 100k characters, one call per field."""
+    results = {}
+    for doc in docs:
+        parsed_text = _parsed_text(runner, doc)[:100000]
+        results[doc.relative_path] = extract_fields(
+            runner, text_source(parsed_text), fields, mode="per_field"
+        )
+    return results
+
+
+def batched_text(runner, docs, fields):
+    """Parse, truncate to 100k characters, all fields in one call."""
+    results = {}
+    for doc in docs:
+        parsed_text = _parsed_text(runner, doc)[:100000]
+        results[doc.relative_path] = extract_fields(runner, text_source(parsed_text), fields)
+    return results
+
+
+def chunked_text(runner, docs, fields):
+    """Parse, then send each field only its best-ranked chunks."""
+    results = {}
+    for doc in docs:
+        chunks = split_chunks(_parsed_text(runner, doc))
+        results[doc.relative_path] = extract_fields_from_chunks(runner, chunks, fields)
+    return results
+
+
+def direct_file(runner, docs, fields):
+    """AI_EXTRACT on the staged file, all fields in one call per document."""
+    results = {}
+    for doc in docs:
+        results[doc.relative_path] = extract_fields(runner, file_source(STAGE_NAME, doc.relative_path), fields)
+    return results
+
+
+def set_based(runner, docs, fields):
+    """One set-based statement over DIRECTORY(@stage) for all documents."""
+    results = run_batch_extract(
+        runner, STAGE_NAME, fields, "direct", relative_paths=[doc.relative_path for doc in docs]
+    )
+    return {file['relative_path']: values for file, values in results}
+
+
+STRATEGIES = {
+    "per_field_text": per_field_text,
+    "batched_text": batched_text,
+    "chunked_text": chunked_text,
+    "direct_file": direct_file,
+    "set_based": set_based,
+}
+
+
+def run_scenario(strategy, field_count, chars, doc_count, args):
+    """Run one strategy on fresh documents and return its measurements."""
+    field_names = LOAN_DOC_FIELD_NAMES[:field_count] + [
+        f"Extra Field {idx}" for idx in range(max(0, field_count - len(LOAN_DOC_FIELD_NAMES)))
+    ]
+    fields = [{"name": name, "description": ""} for name in field_names]
+    docs, expected = make_documents(doc_count, chars, field_names, seed=args.seed)
+    backend = LocalCortexBackend(
+        docs,
+        stage_name=STAGE_NAME,
+        latency=args.latency,
+        latency_per_kchar=args.latency_per_kchar,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
+    backend.trace = RunTrace()
+    runner = QueryRunner(
+        backend,
+        args.concurrency,
+        RetryPolicy(args.max_attempts, base_delay=args.latency, max_delay=args.latency * 8),
+        poll_interval=0.002,
+    )
+
+    started = time.perf_counter()
+    results = STRATEGIES[strategy](runner, docs, fields)
+    elapsed = time.perf_counter() - started
+    queries, sql_bytes = backend.stats.snapshot()
+    backend.pool.shutdown()
+
+    correct = sum(
+        1
+        for path, values in expected.items()
+        for name, value in values.items()
+        if results.get(path, {}).get(name) == value
+    )
+    return {
+        "strategy": strategy,
+        "fields": field_count,
+        "chars": chars,
+        "docs": doc_count,
+        "queries": queries,
+        "sql_kb": sql_bytes / 1024,
+        "bind_kb": backend.stats.bind_bytes / 1024,
+        "wall_s": elapsed,
+        "ms_per_doc": 1000 * elapsed / doc_count,
+        "ms_per_field": 1000 * elapsed / (doc_count * field_count),
+        "accuracy": correct / (doc_count * field_count),
+        "retries": sum(runner.errors.retries.values()),
+        "trace": backend.trace,
+    }
+
+
+def format_table(rows):
+    columns = [
+        ("strategy", "{:<15}"), ("fields", "{:>6}"), ("chars", "{:>8}"), ("docs", "{:>5}"),
+        ("queries", "{:>8}"), ("sql_kb", "{:>10.1f}"), ("bind_kb", "{:>10.1f}"), ("wall_s", "{:>8.2f}"),
+        ("ms_per_doc", "{:>11.1f}"), ("ms_per_field", "{:>13.1f}"), ("accuracy", "{:>9.0%}"),
+        ("retries", "{:>8}"),
+    ]
+    header = " ".join(
+        f"{{:>{len(fmt.format(rows[0][name]))}}}".format(name) if rows else name
+        for name, fmt in columns
+    )
+    lines = [header]
+    for row in rows:
+        lines.append(" ".join(fmt.format(row[name]) for name, fmt in columns))
+    return "\n".join(lines)
+
+
+def format_breakdown(trace):
+    lines = [f"  {'stage':<15} {'queries':>8} {'seconds':>9} {'slowest_s':>10} {'input_kchars':>13} {'retries':>8}"]
+    for stage in trace.breakdown():
+        lines.append(
+            f"  {stage['stage']:<15} {stage['queries']:>8} {stage['seconds']:>9.2f} "
+            f"{stage['slowest_s']:>10.3f} {stage['input_chars'] / 1000:>13.1f} {stage['retries']:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--strategies", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--fields", nargs="+", type=int, default=[1, 7, 29])
+    parser.add_argument("--chars", nargs="+", type=int, default=[5000, 50000, 250000])
+    parser.add_argument("--docs", nargs="+", type=int, default=[1, 10])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-attempts", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per Cortex call")
+    parser.add_argument("--latency-per-kchar", type=float, default=0.0005,
+                        help="extra seconds per 1000 characters a Cortex call reads")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timing", action="store_true", help="print a per-stage breakdown of each scenario")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for field_count, chars, doc_count in itertools.product(args.fields, args.chars, args.docs):
+        for strategy in args.strategies:
+            rows.append(run_scenario(strategy, field_count, chars, doc_count, args))
+    print(format_table(rows))
+    if args.timing:
+        for row in rows:
+            print(f"\n{row['strategy']}, {row['fields']} fields, {row['chars']} chars, {row['docs']} docs")
+            print(format_breakdown(row['trace']))
+    return rows
+
+
+if __name__ == "__main__":
+    main()
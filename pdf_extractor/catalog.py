@@ -0,0 +1,202 @@
+"""
+Paged, filtered listing of the PDFs on a stage, backed by its directory table.
+"""
+
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from pdf_extractor.sql import sql_string
+
+# File catalog paging: files per page, pages kept in session
+CATALOG_PAGE_SIZE = 50
+CATALOG_CACHED_PAGES = 10
+
+# Substrings of the errors Snowflake raises for stage DDL the role may not run
+PRIVILEGE_MARKERS = ("insufficient privileges", "not authorized", "access control")
+
+
+def is_privilege_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in PRIVILEGE_MARKERS)
+
+
+class FileCatalog:
+    """Paged, filtered view of the PDFs on a stage, backed by its directory table.
+
+    Filtering, ordering and paging run in Snowflake, so only one page of
+    file metadata is held in the session at a time. refresh() syncs the
+    directory table and compares the file count and newest `last_modified`
+    with the last refresh, dropping cached pages only when either changed.
+
+    A role that may not create or alter the stage gets the catalog from
+    `LIST @stage` instead (`use_directory` is False): the whole listing is
+    held in the session and filtered and paged there.
+    """
+
+    def __init__(self, stage_name):
+        self.stage_name = stage_name
+        self.ready = False
+        self.use_directory = True
+        self.watermark = None
+        self.file_count = None
+        self._pages = OrderedDict()
+        self._counts = {}
+        self._listed = []
+
+    def ensure_stage(self, session):
+        """Create the stage (once per session), enable and sync its directory table.
+
+        Without the privileges for that, falls back to LIST; either way the
+        DDL is not attempted again on later reruns.
+        """
+        if self.ready:
+            return
+        try:
+            # Server-side encryption lets AI_EXTRACT read files directly; the
+            # directory table backs listing and batch extraction
+            session.sql(
+                f"CREATE STAGE IF NOT EXISTS {self.stage_name} "
+                f"ENCRYPTION = (TYPE = 'SNOWFLAKE_SSE') DIRECTORY = (ENABLE = TRUE)"
+            ).collect()
+            # CREATE ... IF NOT EXISTS leaves an existing stage as it is, so stages
+            # made before directory tables were used need it switched on
+            session.sql(f"ALTER STAGE {self.stage_name} SET DIRECTORY = (ENABLE = TRUE)").collect()
+            self.refresh(session)
+        except Exception as e:
+            if not is_privilege_error(e):
+                raise
+            self.use_directory = False
+            self.refresh(session)
+        self.ready = True
+
+    def refresh(self, session):
+        """Sync the directory table; returns True when the stage's PDFs changed since the last refresh."""
+        if self.use_directory:
+            session.sql(f"ALTER STAGE {self.stage_name} REFRESH").collect()
+            summary = session.sql(f"""
+            SELECT COUNT(*) AS file_count, MAX(last_modified) AS watermark
+            FROM DIRECTORY(@{self.stage_name})
+            WHERE LOWER(relative_path) LIKE '%.pdf'
+            """).collect()[0]
+            file_count, watermark = summary['FILE_COUNT'], summary['WATERMARK']
+        else:
+            self._listed = self._list_files(session)
+            file_count = len(self._listed)
+            watermark = max((file['last_modified'] for file in self._listed), default=None)
+
+        watermark = None if watermark is None else str(watermark)
+        changed = (file_count, watermark) != (self.file_count, self.watermark)
+        if changed:
+            self._pages.clear()
+            self._counts.clear()
+        self.file_count = file_count
+        self.watermark = watermark
+        return changed
+
+    def count(self, session, filters):
+        """Number of PDFs matching `filters`."""
+        if not self.use_directory:
+            return sum(1 for file in self._listed if self._matches(file, filters))
+        if filters not in self._counts:
+            result = session.sql(
+                f"SELECT COUNT(*) AS file_count FROM DIRECTORY(@{self.stage_name}) "
+                f"WHERE {self._conditions(filters)}"
+            ).collect()
+            self._counts[filters] = result[0]['FILE_COUNT']
+        return self._counts[filters]
+
+    def page(self, session, filters, page, page_size=CATALOG_PAGE_SIZE):
+        """One page (0-based) of files matching `filters`, ordered by relative path."""
+        if not self.use_directory:
+            matching = [file for file in self._listed if self._matches(file, filters)]
+            return matching[int(page) * int(page_size):(int(page) + 1) * int(page_size)]
+        key = (filters, page, page_size)
+        if key in self._pages:
+            self._pages.move_to_end(key)
+            return self._pages[key]
+        rows = session.sql(f"""
+        SELECT relative_path, size, last_modified, md5
+        FROM DIRECTORY(@{self.stage_name})
+        WHERE {self._conditions(filters)}
+        ORDER BY relative_path
+        LIMIT {int(page_size)} OFFSET {int(page) * int(page_size)}
+        """).collect()
+        self._pages[key] = [self._file(row) for row in rows]
+        while len(self._pages) > CATALOG_CACHED_PAGES:
+            self._pages.popitem(last=False)
+        return self._pages[key]
+
+    @staticmethod
+    def make_filters(prefix="", name_pattern="", min_size=0, max_size=0, modified_since=None):
+        """Hashable filter spec; empty or zero values mean no filter."""
+        return (prefix, name_pattern, int(min_size), int(max_size),
+                str(modified_since) if modified_since else None)
+
+    @staticmethod
+    def _conditions(filters):
+        prefix, name_pattern, min_size, max_size, modified_since = filters
+        conditions = ["LOWER(relative_path) LIKE '%.pdf'"]
+        if prefix:
+            conditions.append(f"STARTSWITH(relative_path, {sql_string(prefix)})")
+        if name_pattern:
+            conditions.append(f"relative_path ILIKE {sql_string(name_pattern)}")
+        if min_size:
+            conditions.append(f"size >= {min_size}")
+        if max_size:
+            conditions.append(f"size <= {max_size}")
+        if modified_since:
+            conditions.append(f"last_modified >= {sql_string(modified_since)}::TIMESTAMP_TZ")
+        return " AND ".join(conditions)
+
+    @staticmethod
+    def _matches(file, filters):
+        """The Python side of _conditions, for files from LIST."""
+        prefix, name_pattern, min_size, max_size, modified_since = filters
+        relative_path = file['relative_path']
+        if prefix and not relative_path.startswith(prefix):
+            return False
+        if name_pattern:
+            regex = "".join(
+                ".*" if char == "%" else "." if char == "_" else re.escape(char) for char in name_pattern
+            )
+            if not re.fullmatch(regex, relative_path, re.IGNORECASE | re.DOTALL):
+                return False
+        if (min_size and file['size'] < min_size) or (max_size and file['size'] > max_size):
+            return False
+        if modified_since:
+            since = datetime.fromisoformat(modified_since)
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            if file['last_modified'] < since:
+                return False
+        return True
+
+    def _list_files(self, session):
+        """Every PDF on the stage from LIST, ordered by relative path."""
+        files = []
+        for row in session.sql(f"LIST @{self.stage_name}").collect():
+            # LIST names files as <stage name>/<relative path>
+            relative_path = row['name'].split('/', 1)[-1]
+            if relative_path.lower().endswith('.pdf'):
+                files.append({
+                    'display_name': relative_path.split('/')[-1],
+                    'relative_path': relative_path,
+                    'full_path': f"{self.stage_name}/{relative_path}",
+                    'size': row['size'],
+                    'md5': row['md5'],
+                    'last_modified': parsedate_to_datetime(row['last_modified']),
+                })
+        return sorted(files, key=lambda file: file['relative_path'])
+
+    def _file(self, row):
+        relative_path = row['RELATIVE_PATH']
+        return {
+            'display_name': relative_path.split('/')[-1],
+            'relative_path': relative_path,
+            'full_path': f"{self.stage_name}/{relative_path}",
+            'size': row['SIZE'],
+            'md5': row['MD5'],
+            'last_modified': row['LAST_MODIFIED'],
+        }
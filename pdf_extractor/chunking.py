@@ -0,0 +1,194 @@
+"""
+Relevance chunking of parsed documents: page/section splitting and BM25 ranking.
+"""
+
+import json
+import math
+import re
+from collections import Counter, OrderedDict
+
+from pdf_extractor.extraction import build_extract_query
+from pdf_extractor.sql import MAX_FIELDS_PER_CALL, format_error, is_error_value, parse_response, text_source
+
+# Relevance chunking of parsed text: target chunk size, default chunks per call / rounds,
+# and the most text windows of different fields are merged into for one call
+CHUNK_MAX_CHARS = 4000
+CHUNKS_PER_CALL = 4
+MAX_CHUNK_ROUNDS = 3
+MAX_CALL_CHARS = 100000
+
+
+def split_chunks(parsed_text, max_chars=CHUNK_MAX_CHARS):
+    """Split PARSE_DOCUMENT output into chunks by page, then section, then paragraph.
+
+    Pages come from a `pages` array when the parse was page-split; each page
+    is split at markdown headings and then into paragraphs. Consecutive
+    pieces are packed together into chunks of up to `max_chars`, so a chunk
+    only ends at a section or paragraph boundary when the next piece would
+    not fit; pieces longer than `max_chars` are cut.
+    """
+    try:
+        parsed = json.loads(parsed_text)
+    except (TypeError, ValueError):
+        parsed = parsed_text
+    if isinstance(parsed, dict) and isinstance(parsed.get('pages'), list):
+        pages = [str(page.get('content', '')) for page in parsed['pages'] if isinstance(page, dict)]
+    elif isinstance(parsed, dict) and 'content' in parsed:
+        pages = [str(parsed['content'])]
+    else:
+        pages = [str(parsed)]
+
+    pieces = [
+        paragraph
+        for page in pages
+        for section in re.split(r"\n(?=#{1,6} )", page)
+        for paragraph in re.split(r"\n\s*\n", section)
+        if paragraph.strip()
+    ]
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        while len(piece) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(piece[:max_chars])
+            piece = piece[max_chars:]
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def tokenize(text):
+    """Lower-case word tokens used for lexical ranking."""
+    return re.findall(r"[a-z0-9]+", str(text).lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a list of text chunks."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(chunk)) for chunk in chunks]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        document_frequency = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        total = len(chunks)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def score(self, query_tokens, idx):
+        counts = self.term_counts[idx]
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[idx] / (self.avg_length or 1))
+        total = 0.0
+        for term in query_tokens:
+            tf = counts.get(term, 0)
+            if tf:
+                total += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return total
+
+    def rank(self, query):
+        """Chunk indexes ordered by relevance to `query`, ties in document order."""
+        query_tokens = set(tokenize(query))
+        scores = [self.score(query_tokens, idx) for idx in range(len(self.term_counts))]
+        return sorted(range(len(scores)), key=lambda idx: (-scores[idx], idx))
+
+
+def extract_fields_from_chunks(runner, chunks, fields, mode="batched", on_progress=None,
+                               chunks_per_call=CHUNKS_PER_CALL, max_rounds=MAX_CHUNK_ROUNDS,
+                               max_call_chars=MAX_CALL_CHARS):
+    """Extract fields from parsed text, sending each field only its most relevant chunks.
+
+    Chunks are ranked per field with BM25 on the field name and description.
+    Round N sends each unanswered field its N-th best window of
+    `chunks_per_call` chunks. Windows are merged while their combined text
+    stays within `max_call_chars`, and the fields of a merged window share a
+    call (or get one call each in per-field mode), so a document whose
+    relevant chunks fit in one call costs one call per round. Stops early
+    once every field has an answer. Returns a dict of field name -> value,
+    in field order.
+    """
+    if len(chunks) <= chunks_per_call:
+        # The whole text fits in one window: every field shares it in a single round
+        rankings = {field['name']: list(range(len(chunks))) for field in fields}
+    else:
+        index = BM25Index(chunks)
+        rankings = {
+            field['name']: index.rank(f"{field['name']} {field['description'] or ''}")
+            for field in fields
+        }
+    values = {}
+
+    def answered(field):
+        value = values.get(field['name'])
+        return value is not None and not is_error_value(value)
+
+    for round_idx in range(max_rounds):
+        windows = OrderedDict()
+        for field in fields:
+            if answered(field):
+                continue
+            window = rankings[field['name']][round_idx * chunks_per_call:(round_idx + 1) * chunks_per_call]
+            if window:
+                windows.setdefault(tuple(sorted(window)), []).append(field)
+        if not windows:
+            break
+
+        merged = []
+        for window, window_fields in windows.items():
+            for group in merged:
+                union = group[0] | set(window)
+                if sum(len(chunks[idx]) for idx in union) <= max_call_chars:
+                    group[0] = union
+                    group[1].extend(window_fields)
+                    break
+            else:
+                merged.append([set(window), list(window_fields)])
+
+        calls = []
+        for window, window_fields in merged:
+            # Chunks go out in document order so surrounding context reads naturally
+            window_text = "\n\n".join(chunks[idx] for idx in sorted(window))
+            source_arg = text_source(window_text)
+            size = MAX_FIELDS_PER_CALL if mode == "batched" else 1
+            for start in range(0, len(window_fields), size):
+                calls.append((source_arg, window_fields[start:start + size]))
+
+        def call_done(idx, result):
+            call_fields = calls[idx][1]
+            if isinstance(result, Exception):
+                for field in call_fields:
+                    if not answered(field):
+                        values[field['name']] = format_error(result)
+            else:
+                response = parse_response(result[0]['EXTRACT_DATA'])
+                for field in call_fields:
+                    if response.get(field['name']) is not None:
+                        values[field['name']] = response[field['name']]
+            if on_progress:
+                on_progress(
+                    sum(1 for field in fields if answered(field)),
+                    len(fields),
+                    f"round {round_idx + 1}: {len(call_fields)} field(s)"
+                )
+
+        runner.run(
+            [build_extract_query(source_arg, call_fields) for source_arg, call_fields in calls],
+            call_done,
+            labels=[
+                f"round {round_idx + 1}: " + ", ".join(field['name'] for field in call_fields)
+                for _, call_fields in calls
+            ]
+        )
+
+    return {field['name']: values.get(field['name']) for field in fields}
@@ -0,0 +1,183 @@
+"""
+Concurrent query execution with retries, backoff and adaptive concurrency.
+"""
+
+import random
+import time
+from collections import Counter
+
+from pdf_extractor.instrumentation import step
+from pdf_extractor.sql import bound
+
+# Substrings that mark an error as Cortex throttling or as a transient failure
+THROTTLE_MARKERS = (
+    "429", "too many requests", "rate limit", "throttl", "quota", "concurrency limit",
+)
+TRANSIENT_MARKERS = (
+    "timeout", "timed out", "502", "503", "504", "service unavailable", "temporarily",
+    "connection reset", "connection aborted", "try again", "internal error",
+)
+
+
+def classify_error(error):
+    """Classify an error as 'throttled', 'transient' or 'permanent'."""
+    message = str(error).lower()
+    if any(marker in message for marker in THROTTLE_MARKERS):
+        return "throttled"
+    if any(marker in message for marker in TRANSIENT_MARKERS):
+        return "transient"
+    return "permanent"
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for throttled and transient errors."""
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, kind, attempt):
+        return kind != "permanent" and attempt + 1 < self.max_attempts
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def collect_with_retry(session, query, retry_policy=None, stage=None, label=None):
+    """Collect one query (SQL text or BoundQuery), retrying throttled and transient errors with backoff.
+
+    Raises the last error once it is permanent or the attempts run out.
+    """
+    retry_policy = retry_policy or RetryPolicy()
+    attempt = 0
+    while True:
+        try:
+            with step(session, stage, label, attempt):
+                return session.sql(*bound(query)).collect()
+        except Exception as e:
+            if not retry_policy.should_retry(classify_error(e), attempt):
+                raise
+            time.sleep(retry_policy.delay(attempt))
+            attempt += 1
+
+
+class AdaptiveConcurrency:
+    """Additive-increase / multiplicative-decrease limit on queries in flight.
+
+    The limit halves on every throttling error and grows by one after a
+    full window of successes, never above `max_limit`.
+    """
+
+    def __init__(self, max_limit):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self._successes = 0
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+
+    def on_throttle(self):
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+
+
+class ErrorSummary:
+    """Retries and final failures of one run, by error class."""
+
+    def __init__(self):
+        self.retries = Counter()
+        self.failures = Counter()
+        self.samples = {}
+        self.min_concurrency = None
+
+    def __bool__(self):
+        return bool(self.retries or self.failures)
+
+    def record_retry(self, kind):
+        self.retries[kind] += 1
+
+    def record_failure(self, kind, error):
+        self.failures[kind] += 1
+        self.samples.setdefault(kind, str(error)[:200])
+
+
+class QueryRunner:
+    """Runs independent queries concurrently with retries and adaptive concurrency.
+
+    Queries are submitted with Snowpark's collect_nowait() and polled until
+    done. Throttled and transient failures are retried with backoff; each
+    throttling error also halves the number of queries allowed in flight.
+    Retries and failures are recorded in `errors`.
+    """
+
+    def __init__(self, session, max_concurrency=4, retry_policy=None, poll_interval=0.2):
+        self.session = session
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.errors = ErrorSummary()
+        self.poll_interval = poll_interval
+
+    def run(self, queries, on_complete=None, stage="extract", labels=None):
+        """Run `queries` (SQL text or BoundQuery), calling `on_complete(idx, result)` as each one finishes.
+
+        Each attempt is tagged in the session's trace with `stage`, the
+        query's entry in `labels` and its attempt number. Returns one entry
+        per query, in order: the collected rows, or the exception the query
+        finally raised.
+        """
+        results = [None] * len(queries)
+        waiting = [(idx, query, 0, 0.0) for idx, query in enumerate(queries)]
+        running = {}
+
+        def finish(idx, result):
+            results[idx] = result
+            if on_complete:
+                on_complete(idx, result)
+
+        def failed(idx, query, attempt, error):
+            kind = classify_error(error)
+            if kind == "throttled":
+                self.concurrency.on_throttle()
+                self.errors.min_concurrency = min(
+                    self.concurrency.limit, self.errors.min_concurrency or self.concurrency.limit
+                )
+            if self.retry_policy.should_retry(kind, attempt):
+                self.errors.record_retry(kind)
+                retry_at = time.time() + self.retry_policy.delay(attempt)
+                waiting.append((idx, query, attempt + 1, retry_at))
+            else:
+                self.errors.record_failure(kind, error)
+                finish(idx, error)
+
+        while waiting or running:
+            now = time.time()
+            for item in list(waiting):
+                if len(running) >= self.concurrency.limit:
+                    break
+                idx, query, attempt, not_before = item
+                if not_before > now:
+                    continue
+                waiting.remove(item)
+                try:
+                    with step(self.session, stage, labels[idx] if labels else None, attempt):
+                        running[idx] = (self.session.sql(*bound(query)).collect_nowait(), query, attempt)
+                except Exception as e:
+                    failed(idx, query, attempt, e)
+            for idx, (job, query, attempt) in list(running.items()):
+                if not job.is_done():
+                    continue
+                del running[idx]
+                try:
+                    result = job.result()
+                except Exception as e:
+                    failed(idx, query, attempt, e)
+                    continue
+                self.concurrency.on_success()
+                finish(idx, result)
+            if waiting or running:
+                time.sleep(self.poll_interval)
+        return results
@@ -0,0 +1,112 @@
+"""
+Chunked export of result tables to CSV, JSON, NDJSON and Parquet.
+
+Rows are serialized EXPORT_ROWS_PER_CHUNK at a time, so an export never
+holds a second full-size text copy of the table next to the output.
+Parquet needs pyarrow, which is imported only when it is asked for.
+"""
+
+import io
+import json
+import math
+
+EXPORT_ROWS_PER_CHUNK = 1000
+
+# Export formats: file extension and MIME type
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "JSON": ("json", "application/json"),
+    "NDJSON": ("ndjson", "application/x-ndjson"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def cell_text(value):
+    """A result cell as text: strings as they are, other values as JSON, missing as None."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+
+def iter_frames(data, rows_per_chunk=EXPORT_ROWS_PER_CHUNK):
+    """Slices of a DataFrame, or the chunks of an iterable of DataFrames as they are."""
+    if not hasattr(data, "iloc"):
+        yield from data
+        return
+    for start in range(0, max(len(data), 1), rows_per_chunk):
+        yield data.iloc[start:start + rows_per_chunk]
+
+
+def iter_export_chunks(data, export_format, rows_per_chunk=EXPORT_ROWS_PER_CHUNK):
+    """Yield `data` serialized as `export_format`, one bytes chunk per slice of rows.
+
+    `data` is a DataFrame or an iterable of DataFrame chunks with the same
+    columns, e.g. ResultStore.iter_frames().
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    frames = iter_frames(data, rows_per_chunk)
+    if export_format == "Parquet":
+        yield _parquet_bytes(frames)
+        return
+    if export_format == "JSON":
+        yield b"["
+    first = True
+    for chunk in frames:
+        if export_format == "CSV":
+            yield chunk.to_csv(index=False, header=first).encode("utf-8")
+            first = False
+        elif export_format == "NDJSON":
+            if len(chunk):
+                yield (chunk.to_json(orient='records', lines=True).rstrip("\n") + "\n").encode("utf-8")
+        else:
+            records = chunk.to_json(orient='records', indent=2)[1:-1].strip("\n")
+            if records:
+                yield (("\n" if first else ",\n") + records).encode("utf-8")
+                first = False
+    if export_format == "JSON":
+        yield b"\n]"
+
+
+def export_bytes(data, export_format, rows_per_chunk=EXPORT_ROWS_PER_CHUNK):
+    """The whole export as bytes, e.g. for a download button."""
+    buffer = io.BytesIO()
+    write_export(data, export_format, buffer, rows_per_chunk)
+    return buffer.getvalue()
+
+
+def write_export(data, export_format, target, rows_per_chunk=EXPORT_ROWS_PER_CHUNK):
+    """Stream the export into a binary file object or a path; returns the bytes written."""
+    if isinstance(target, str):
+        with open(target, "wb") as handle:
+            return write_export(data, export_format, handle, rows_per_chunk)
+    written = 0
+    for chunk in iter_export_chunks(data, export_format, rows_per_chunk):
+        target.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def _parquet_bytes(frames):
+    # Every column is written as nullable text so mixed answers (strings,
+    # lists, numbers) share one schema across row groups
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    buffer = io.BytesIO()
+    writer = None
+    for chunk in frames:
+        if writer is None:
+            schema = pa.schema([(str(col), pa.string()) for col in chunk.columns])
+            writer = pq.ParquetWriter(buffer, schema)
+        if len(chunk):
+            writer.write_table(pa.table(
+                {str(col): [cell_text(value) for value in chunk[col]] for col in chunk.columns},
+                schema=schema,
+            ))
+    if writer is None:
+        writer = pq.ParquetWriter(buffer, pa.schema([]))
+    writer.close()
+    return buffer.getvalue()
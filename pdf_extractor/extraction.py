@@ -0,0 +1,302 @@
+"""
+AI_EXTRACT query building and field extraction for single documents and batches.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from pdf_extractor.instrumentation import step
+from pdf_extractor.parsing import parse_expression
+from pdf_extractor.sql import (
+    MAX_FIELDS_PER_CALL,
+    BoundQuery,
+    bind_response_format,
+    bound,
+    format_error,
+    is_error_value,
+    parse_response,
+    sql_string,
+)
+
+# Explicitly picked files are sent in groups of this size, one query per group
+BATCH_FILES_PER_QUERY = 25
+
+# Extraction result cache: how long answers are kept and how many, for the whole app
+RESULT_CACHE_TTL_SECONDS = 24 * 3600
+RESULT_CACHE_MAX_ENTRIES = 5000
+
+# Substrings of the error AI_EXTRACT raises for a staged file that is not server-side encrypted
+ENCRYPTION_ERROR_MARKERS = ("encrypt", "snowflake_sse")
+
+
+def build_extract_query(source, fields):
+    """Build one AI_EXTRACT query for `fields` as a BoundQuery.
+
+    `source` is the input argument, e.g. text_source(parsed_text) or
+    file_source(stage, path); the text and the field spec are bind values.
+    """
+    source = bound(source)
+    response_format = bind_response_format(fields)
+    return BoundQuery(f"""
+    SELECT
+        AI_EXTRACT(
+            {source.text},
+            responseFormat => {response_format.text}
+        ) AS extract_data
+    """, tuple(source.params) + response_format.params)
+
+
+def extract_fields(runner, source, fields, mode="batched", on_progress=None):
+    """Extract all fields from one document.
+
+    In batched mode the whole field list goes out in a single AI_EXTRACT call
+    (split only past MAX_FIELDS_PER_CALL); fields that come back missing or
+    whose batch failed are retried with one call each, unless the batch failed
+    because the stage is not SNOWFLAKE_SSE encrypted, which per-field calls
+    on the same file would only repeat. Independent calls run
+    concurrently through `runner` (a QueryRunner) and `on_progress(done,
+    total, label)` follows completed calls. Returns a dict of field name ->
+    value, in field order.
+    """
+    values = {}
+    pending = list(fields)
+
+    def report(label):
+        if on_progress:
+            on_progress(len(values), len(fields), label)
+
+    if mode == "batched":
+        batches = [
+            fields[start:start + MAX_FIELDS_PER_CALL]
+            for start in range(0, len(fields), MAX_FIELDS_PER_CALL)
+        ]
+
+        encryption_errors = []
+
+        def batch_done(idx, result):
+            if isinstance(result, Exception):
+                if is_encryption_error(result):
+                    encryption_errors.append(result)
+            else:
+                response = parse_response(result[0]['EXTRACT_DATA'])
+                for field in batches[idx]:
+                    if response.get(field['name']) is not None:
+                        values[field['name']] = response[field['name']]
+            report(f"{len(batches[idx])} fields in one call")
+
+        runner.run(
+            [build_extract_query(source, batch) for batch in batches],
+            batch_done,
+            labels=[f"{len(batch)} fields in one call" for batch in batches]
+        )
+        pending = [field for field in fields if field['name'] not in values]
+        if encryption_errors:
+            for field in pending:
+                values[field['name']] = format_error(encryption_errors[0])
+            pending = []
+            report("needs a SNOWFLAKE_SSE stage")
+
+    def field_done(idx, result):
+        field = pending[idx]
+        if isinstance(result, Exception):
+            values[field['name']] = format_error(result)
+        else:
+            values[field['name']] = parse_response(result[0]['EXTRACT_DATA']).get(field['name'])
+        report(field['name'])
+
+    runner.run(
+        [build_extract_query(source, [field]) for field in pending],
+        field_done,
+        labels=[field['name'] for field in pending]
+    )
+
+    return {field['name']: values.get(field['name']) for field in fields}
+
+
+def build_batch_query(stage_name, fields, engine, relative_paths=None, pattern=None, parse_form=0):
+    """Build one set-based AI_EXTRACT statement over DIRECTORY(@stage).
+
+    Files are chosen either by an explicit list of relative paths or by a
+    LIKE pattern. Field lists longer than MAX_FIELDS_PER_CALL become several
+    AI_EXTRACT columns (extract_data_0, extract_data_1, ...) on the same row.
+    Returns a BoundQuery; field specs, paths and the pattern are bind values.
+    """
+    stage = sql_string('@' + stage_name)
+    parsed_column = ""
+    if engine == "direct":
+        source_arg = f"file => TO_FILE({stage}, relative_path)"
+    else:
+        # Parse once per file in the subquery, however many AI_EXTRACT columns use it
+        expression = parse_expression(
+            parse_form, stage_name, "relative_path", f"{sql_string('@' + stage_name + '/')} || relative_path"
+        )
+        parsed_column = f", {expression}:content::STRING AS parsed_text"
+        source_arg = "text => parsed_text"
+
+    # Bind values follow the placeholders in text order: field specs, then paths, then the pattern
+    params = []
+    columns = []
+    for idx, start in enumerate(range(0, len(fields), MAX_FIELDS_PER_CALL)):
+        response_format = bind_response_format(fields[start:start + MAX_FIELDS_PER_CALL])
+        columns.append(f"AI_EXTRACT({source_arg}, responseFormat => {response_format.text}) AS extract_data_{idx}")
+        params.extend(response_format.params)
+    columns = ",\n        ".join(columns)
+
+    conditions = ["LOWER(relative_path) LIKE '%.pdf'"]
+    if relative_paths is not None:
+        conditions.append("relative_path IN (" + ", ".join("?" for _ in relative_paths) + ")")
+        params.extend(relative_paths)
+    if pattern:
+        conditions.append("relative_path ILIKE ?")
+        params.append(pattern)
+
+    return BoundQuery(f"""
+    SELECT relative_path, md5,
+        {columns}
+    FROM (
+        SELECT relative_path, md5{parsed_column}
+        FROM DIRECTORY(@{stage_name})
+        WHERE {' AND '.join(conditions)}
+    )
+    ORDER BY relative_path
+    """, tuple(params))
+
+
+def is_encryption_error(error):
+    """True when an error, or an error value, says the stage is not SNOWFLAKE_SSE encrypted."""
+    message = str(error).lower()
+    return any(marker in message for marker in ENCRYPTION_ERROR_MARKERS)
+
+
+def needs_server_side_encryption(values):
+    """True when direct-file values failed because the stage is not SNOWFLAKE_SSE encrypted.
+
+    AI_EXTRACT reads staged files only from stages with server-side
+    encryption; on other stages the parse engine has to be used instead.
+    """
+    return any(is_error_value(value) and is_encryption_error(value) for value in values.values())
+
+
+def run_batch_extract(runner, stage_name, fields, engine, relative_paths=None, pattern=None,
+                      parse_form=0, on_progress=None, refresh=True):
+    """Extract every field from many staged PDFs with set-based queries.
+
+    A pattern selection runs as one statement; an explicit file list is
+    split into groups of BATCH_FILES_PER_QUERY that run concurrently through
+    `runner` (a QueryRunner), so
+    progress can be reported as groups complete. Returns a list of
+    (file, values) pairs, where file carries the relative path and md5
+    reported by the directory table; files in a failed group get error
+    values.
+    """
+    if refresh:
+        with step(runner.session, "catalog"):
+            runner.session.sql(f"ALTER STAGE {stage_name} REFRESH").collect()
+    if relative_paths is None:
+        groups = [None]
+    else:
+        groups = [
+            relative_paths[start:start + BATCH_FILES_PER_QUERY]
+            for start in range(0, len(relative_paths), BATCH_FILES_PER_QUERY)
+        ]
+    queries = [
+        build_batch_query(stage_name, fields, engine, group, pattern, parse_form) for group in groups
+    ]
+
+    completed = []
+
+    def report(idx, result):
+        completed.append(idx)
+        if on_progress:
+            on_progress(len(completed), len(queries), f"{len(completed)} of {len(queries)} file group(s)")
+
+    batch_count = (len(fields) + MAX_FIELDS_PER_CALL - 1) // MAX_FIELDS_PER_CALL
+    results = []
+    labels = [
+        f"{len(group)} file(s) from {group[0]}" if group else (pattern or "all PDFs") for group in groups
+    ]
+    for group, rows in zip(groups, runner.run(queries, report, stage="batch_extract", labels=labels)):
+        if isinstance(rows, Exception):
+            if group is None:
+                raise rows
+            error_value = format_error(rows)
+            for path in group:
+                results.append(({'relative_path': path, 'md5': None},
+                                {field['name']: error_value for field in fields}))
+            continue
+        for row in rows:
+            response = {}
+            for idx in range(batch_count):
+                response.update(parse_response(row[f'EXTRACT_DATA_{idx}']))
+            values = {field['name']: response.get(field['name']) for field in fields}
+            results.append(({'relative_path': row['RELATIVE_PATH'], 'md5': row['MD5']}, values))
+    return results
+
+
+class ExtractionCache:
+    """Extracted field values keyed by document content, field spec and mode.
+
+    One instance is shared by every session of the app (see
+    get_extraction_cache), so it is guarded by a lock and its limits are set
+    once for the app rather than per session. Entries expire after
+    `ttl_seconds` and the least recently used ones are dropped once there are
+    more than `max_entries`.
+    """
+
+    def __init__(self, ttl_seconds=RESULT_CACHE_TTL_SECONDS, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(doc_key, field, mode):
+        return (doc_key, field['name'], field['description'] or "", mode)
+
+    def lookup(self, doc_key, fields, mode):
+        """Return {field name: value} for the fields that have a live entry."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for field in fields:
+                key = self.make_key(doc_key, field, mode)
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[0] > self.ttl_seconds:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[field['name']] = entry[1]
+                self.hits += 1
+        return found
+
+    def store(self, doc_key, fields, mode, values):
+        """Cache the extracted values of `fields`, skipping error markers."""
+        now = time.time()
+        with self._lock:
+            for field in fields:
+                value = values.get(field['name'])
+                if is_error_value(value):
+                    continue
+                key = self.make_key(doc_key, field, mode)
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
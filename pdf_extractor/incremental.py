@@ -0,0 +1,129 @@
+"""
+Incremental AI_EXTRACT pipeline for the doc_extract table.
+
+Only PDFs whose relative_path is new, whose content md5 changed, or that
+were extracted with a different field set are sent to AI_EXTRACT; the
+results are merged into the table with one set-based MERGE. Works with any
+session object exposing Snowpark's `sql(query).collect()`.
+"""
+
+import hashlib
+import json
+
+from pdf_extractor.extraction import is_encryption_error
+from pdf_extractor.instrumentation import step
+from pdf_extractor.parsing import parse_expression
+from pdf_extractor.sql import MAX_FIELDS_PER_CALL, build_response_format, field_question, sql_string
+
+DEFAULT_TABLE = "pdf_extractor_db.pdf_processing.doc_extract"
+DEFAULT_STAGE = "pdf_extractor_db.pdf_processing.pdf_upload_stage"
+
+
+def field_set_id(fields):
+    """Stable id of a field list; changes whenever a name or question changes."""
+    spec = sorted((field['name'], field_question(field)) for field in fields)
+    return hashlib.sha256(json.dumps(spec).encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_doc_extract_table(session, table=DEFAULT_TABLE):
+    """Create doc_extract, or add the change-tracking columns to an existing one."""
+    session.sql(
+        f"CREATE TABLE IF NOT EXISTS {table} (relative_path STRING, extract_data VARIANT)"
+    ).collect()
+    for column, column_type in (
+        ("md5", "STRING"),
+        ("field_set_id", "STRING"),
+        ("extracted_at", "TIMESTAMP_LTZ"),
+    ):
+        session.sql(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type}").collect()
+
+
+def build_pending_query(table, stage, set_id):
+    """Select the staged PDFs that are missing from `table` or out of date."""
+    return f"""
+    SELECT d.relative_path, d.md5
+    FROM DIRECTORY(@{stage}) d
+    LEFT JOIN {table} e ON e.relative_path = d.relative_path
+    WHERE LOWER(d.relative_path) LIKE '%.pdf'
+      AND (e.relative_path IS NULL
+           OR e.md5 IS DISTINCT FROM d.md5
+           OR e.field_set_id IS DISTINCT FROM {sql_string(set_id)})
+    """
+
+
+def build_merge_query(table, stage, fields, set_id=None, engine="direct", parse_form=0):
+    """MERGE fresh AI_EXTRACT results for pending PDFs only into `table`.
+
+    Rows are stamped with `set_id`, by default the field_set_id of `fields`.
+    The "direct" engine hands AI_EXTRACT the staged file, which needs a
+    SNOWFLAKE_SSE encrypted stage; "parse" sends it the PARSE_DOCUMENT text
+    (call form `parse_form`) instead.
+    """
+    if len(fields) > MAX_FIELDS_PER_CALL:
+        raise ValueError(f"AI_EXTRACT accepts at most {MAX_FIELDS_PER_CALL} fields per call")
+    set_id = set_id or field_set_id(fields)
+    if engine == "direct":
+        source_arg = f"file => TO_FILE({sql_string('@' + stage)}, p.relative_path)"
+    else:
+        expression = parse_expression(
+            parse_form, stage, "p.relative_path", f"{sql_string('@' + stage + '/')} || p.relative_path"
+        )
+        source_arg = f"text => {expression}:content::STRING"
+    return f"""
+    MERGE INTO {table} t
+    USING (
+        SELECT p.relative_path, p.md5, {sql_string(set_id)} AS field_set_id,
+            AI_EXTRACT(
+                {source_arg},
+                responseFormat => {build_response_format(fields)}
+            ) AS extract_data
+        FROM ({build_pending_query(table, stage, set_id)}) p
+    ) s
+    ON t.relative_path = s.relative_path
+    WHEN MATCHED THEN UPDATE SET
+        md5 = s.md5,
+        field_set_id = s.field_set_id,
+        extract_data = s.extract_data,
+        extracted_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (relative_path, md5, field_set_id, extract_data, extracted_at)
+        VALUES (s.relative_path, s.md5, s.field_set_id, s.extract_data, CURRENT_TIMESTAMP())
+    """
+
+
+def run_incremental_extract(session, fields, table=DEFAULT_TABLE, stage=DEFAULT_STAGE,
+                            refresh=True, dry_run=False, set_id=None, engine="direct", parse_form=0):
+    """Bring `table` up to date with the PDFs on `stage`.
+
+    Rows are stamped with `set_id`, by default the field_set_id of `fields`;
+    pass the id the refresh_doc_extract() procedure is called with (e.g.
+    'loan_docs_v1') when both maintain the same table, or each run will
+    re-extract what the other wrote. When the direct engine fails because
+    the stage is not SNOWFLAKE_SSE encrypted, the MERGE (which wrote
+    nothing) runs again with the parse engine. Returns a dict with the
+    number of pending files and of rows inserted and updated. With
+    `dry_run` only the pending files are counted.
+    """
+    with step(session, "catalog"):
+        ensure_doc_extract_table(session, table)
+        if refresh:
+            session.sql(f"ALTER STAGE {stage} REFRESH").collect()
+
+        set_id = set_id or field_set_id(fields)
+        pending = session.sql(
+            f"SELECT COUNT(*) AS pending FROM ({build_pending_query(table, stage, set_id)})"
+        ).collect()[0]['PENDING']
+    summary = {'pending': pending, 'inserted': 0, 'updated': 0}
+    if dry_run or not pending:
+        return summary
+
+    with step(session, "merge"):
+        try:
+            result = session.sql(build_merge_query(table, stage, fields, set_id, engine, parse_form)).collect()
+        except Exception as e:
+            if engine != "direct" or not is_encryption_error(e):
+                raise
+            result = session.sql(build_merge_query(table, stage, fields, set_id, "parse", parse_form)).collect()
+    if result:
+        summary['inserted'] = result[0][0]
+        summary['updated'] = result[0][1]
+    return summary
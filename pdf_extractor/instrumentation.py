@@ -0,0 +1,155 @@
+"""
+Per-query timing of a run: where the time and the Cortex spend went.
+
+A RunTrace is attached to a backend (see pdf_extractor.backends) and gets
+one StepEvent per query: its stage, label, duration, query ID, input size,
+outcome and attempt number. Callers tag the queries they issue with
+`step(session, stage, label)`; nested steps join their labels, so an
+AI_EXTRACT call inside a document's step is labelled e.g.
+"loans/a.pdf · Company Name". Events can be appended to RUN_LOG_TABLE and
+joined to ACCOUNT_USAGE views on query_id.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager, nullcontext
+
+from pdf_extractor.sql import sql_string
+
+RUN_LOG_TABLE = "AI_EXTRACT_RUN_LOG"
+
+# Events sent per INSERT statement when saving a trace
+RUN_LOG_ROWS_PER_INSERT = 500
+
+StepEvent = namedtuple(
+    "StepEvent",
+    "stage label started_at duration_s query_id input_chars outcome attempt",
+)
+
+
+class RunTrace:
+    """Events of one run, recorded from any thread.
+
+    `input_chars` is the length of the SQL text plus the characters of its
+    bind values, where document text and field specs are sent; a failed
+    event's outcome is the class from classify_error ('throttled',
+    'transient' or 'permanent').
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.started_at = time.time()
+        self.events = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.events)
+
+    def current(self):
+        """The (stage, label, attempt) that queries issued now are tagged with."""
+        return getattr(self._local, "step", ("other", "", 0))
+
+    @contextmanager
+    def step(self, stage=None, label=None, attempt=0):
+        """Tag queries issued in this block; None keeps the enclosing stage or label."""
+        outer = self.current()
+        if label and outer[1]:
+            label = f"{outer[1]} · {label}"
+        self._local.step = (stage or outer[0], label or outer[1], attempt)
+        try:
+            yield
+        finally:
+            self._local.step = outer
+
+    def record(self, step, started_at, query_id, input_chars, outcome):
+        stage, label, attempt = step
+        event = StepEvent(
+            stage, label, started_at, time.time() - started_at, query_id, input_chars, outcome, attempt
+        )
+        with self._lock:
+            self.events.append(event)
+
+    def snapshot(self):
+        """A copy of the events recorded so far."""
+        with self._lock:
+            return list(self.events)
+
+    def elapsed(self):
+        """Wall-clock seconds from the start of the run to its last finished query."""
+        ends = [event.started_at + event.duration_s for event in self.snapshot()]
+        return max(ends, default=self.started_at) - self.started_at
+
+    def breakdown(self):
+        """One summary dict per stage, in the order stages first ran.
+
+        Concurrent queries overlap, so the seconds of all stages can add up
+        to more than the run's wall-clock time.
+        """
+        stages = OrderedDict()
+        for event in self.snapshot():
+            summary = stages.setdefault(event.stage, {
+                'stage': event.stage, 'queries': 0, 'seconds': 0.0, 'slowest_s': 0.0,
+                'input_chars': 0, 'retries': 0, 'failed': 0,
+            })
+            summary['queries'] += 1
+            summary['seconds'] += event.duration_s
+            summary['slowest_s'] = max(summary['slowest_s'], event.duration_s)
+            summary['input_chars'] += event.input_chars
+            summary['retries'] += event.attempt > 0
+            summary['failed'] += event.outcome != "ok"
+        return list(stages.values())
+
+    def slowest(self, count=10):
+        """The `count` slowest events, slowest first."""
+        return sorted(self.snapshot(), key=lambda event: -event.duration_s)[:count]
+
+
+def step(session, stage=None, label=None, attempt=0):
+    """Tag the queries issued on `session` in this block, if it carries a trace."""
+    trace = getattr(session, "trace", None)
+    if trace is None:
+        return nullcontext()
+    return trace.step(stage, label, attempt)
+
+
+def ensure_run_log_table(session):
+    """Create the run-log table if it does not exist yet."""
+    session.sql(f"""
+    CREATE TABLE IF NOT EXISTS {RUN_LOG_TABLE} (
+        run_id STRING,
+        event_seq NUMBER,
+        stage STRING,
+        label STRING,
+        started_at TIMESTAMP_LTZ,
+        duration_ms NUMBER,
+        query_id STRING,
+        input_chars NUMBER,
+        outcome STRING,
+        attempt NUMBER,
+        logged_at TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """).collect()
+
+
+def save_run_log(session, trace):
+    """Append the events of `trace` to the run-log table; returns the number written."""
+    events = trace.snapshot()
+    for start in range(0, len(events), RUN_LOG_ROWS_PER_INSERT):
+        rows = ",\n        ".join(
+            f"({sql_string(trace.run_id)}, {start + offset}, {sql_string(event.stage)}, "
+            f"{sql_string(event.label[:1000])}, {event.started_at:.6f}, {round(event.duration_s * 1000)}, "
+            f"{'NULL' if event.query_id is None else sql_string(event.query_id)}, {int(event.input_chars)}, "
+            f"{sql_string(event.outcome)}, {int(event.attempt)})"
+            for offset, event in enumerate(events[start:start + RUN_LOG_ROWS_PER_INSERT])
+        )
+        session.sql(f"""
+        INSERT INTO {RUN_LOG_TABLE}
+            (run_id, event_seq, stage, label, started_at, duration_ms, query_id, input_chars, outcome, attempt)
+        SELECT $1, $2, $3, $4, TO_TIMESTAMP_LTZ($5::NUMBER(20, 6)), $6, $7, $8, $9, $10
+        FROM VALUES
+        {rows}
+        """).collect()
+    return len(events)
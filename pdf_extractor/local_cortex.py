@@ -0,0 +1,466 @@
+"""
+Local stand-in for Snowflake and Cortex, for benchmarks and offline runs.
+
+LocalCortexBackend answers the statements the extractor issues (LIST,
+directory table queries, PARSE_DOCUMENT, AI_EXTRACT on text or staged files,
+the parse cache table and stage DDL) from an in-memory set of synthetic
+documents. Bind values are checked against the statement's `?`
+placeholders and substituted as literals before a statement is answered.
+Bulk loads through write_pandas are kept in `tables`, and a MERGE from
+one of them into another is applied on the keys of its ON clause. Latency,
+error and throttling rates are configurable, and every statement is
+counted in `stats`, and timed in `trace` when one is set, just like
+SnowflakeBackend.
+
+AI_EXTRACT is simulated by looking for a "<field name>: <value>" line in
+the input text, so an answer is only found when the text sent actually
+contains it.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from pdf_extractor.backends import QueryStats, traced, traced_bulk_load
+from pdf_extractor.sql import sql_string
+
+_LITERAL = r"'((?:[^'\\]|''|\\.)*)'"
+
+_FILLER_WORDS = (
+    "the", "borrower", "agreement", "shall", "pursuant", "section", "lender", "payment",
+    "schedule", "collateral", "notice", "party", "herein", "terms", "account", "signature",
+)
+
+
+def unquote(literal):
+    """Undo sql_string() quoting of a literal's body."""
+    return re.sub(r"\\(.)|''", lambda m: m.group(1) or "'", literal)
+
+
+def literals(text):
+    """All string literals in `text`, unquoted, in order."""
+    return [unquote(match) for match in re.findall(_LITERAL, text, re.DOTALL)]
+
+
+def inline_params(query, params):
+    """`query` with each `?` placeholder outside string literals replaced by its bind value."""
+    if not params:
+        return query
+    values = list(params)
+    used = []
+
+    def substitute(match):
+        if match.group(0) != "?":
+            return match.group(0)
+        if len(used) == len(values):
+            raise RuntimeError("SQL compilation error: Bind variable ? not set.")
+        value = values[len(used)]
+        used.append(value)
+        return "NULL" if value is None else sql_string(value)
+
+    text = re.sub(_LITERAL + r"|\?", substitute, query, flags=re.DOTALL)
+    if len(used) != len(values):
+        raise RuntimeError("SQL compilation error: more bind values than placeholders")
+    return text
+
+
+def response_format_keys(query, start=0):
+    """Keys of the first responseFormat OBJECT_CONSTRUCT at or after `start`."""
+    idx = query.find("responseFormat => OBJECT_CONSTRUCT(", start)
+    if idx < 0:
+        return []
+    pos = idx + len("responseFormat => OBJECT_CONSTRUCT(")
+    pair = re.compile(r"\s*" + _LITERAL + r"\s*,\s*" + _LITERAL + r"\s*(,|\))", re.DOTALL)
+    keys = []
+    while True:
+        match = pair.match(query, pos)
+        if not match:
+            break
+        keys.append(unquote(match.group(1)))
+        pos = match.end()
+        if match.group(3) == ")":
+            break
+    return keys
+
+
+def answer(text, key):
+    """The simulated model: the value of a "<key>: <value>" line in `text`.
+
+    Newlines escaped inside JSON (raw PARSE_DOCUMENT output) count as line breaks.
+    """
+    match = re.search(r"(?m)^" + re.escape(key) + r": (.+?)$", text.replace("\\n", "\n"))
+    return match.group(1).strip() if match else None
+
+
+class LocalDocument:
+    """A synthetic PDF on the local stage."""
+
+    def __init__(self, relative_path, text, last_modified=None):
+        self.relative_path = relative_path
+        self.text = text
+        self.size = len(text.encode("utf-8"))
+        self.md5 = hashlib.md5(text.encode("utf-8")).hexdigest()
+        self.last_modified = last_modified or datetime.now(timezone.utc)
+
+
+def make_documents(count, chars, field_names, seed=0, prefix="doc"):
+    """Build `count` documents of about `chars` characters each.
+
+    Every document holds one "<field>: <value>" line per field, spread
+    evenly through the text, so documents longer than a truncation cutoff
+    hide some answers past it. Returns (documents, expected) where expected
+    maps relative path -> {field: value}.
+    """
+    rng = random.Random(seed)
+    documents, expected = [], {}
+    for doc_idx in range(count):
+        relative_path = f"{prefix}_{doc_idx:05d}.pdf"
+        values = {name: f"{name.lower().replace(' ', '_')}-{doc_idx}" for name in field_names}
+        slots = len(field_names) + 1
+        segment = max(1, chars // slots)
+        parts = []
+        for slot in range(slots):
+            words, length = [], 0
+            while length < segment:
+                word = rng.choice(_FILLER_WORDS)
+                words.append(word)
+                length += len(word) + 1
+                if len(words) % 12 == 0:
+                    words.append("\n\n")
+            parts.append(" ".join(words))
+            if slot < len(field_names):
+                name = field_names[slot]
+                parts.append(f"\n\n## {name}\n{name}: {values[name]}\n\n")
+        documents.append(LocalDocument(relative_path, "".join(parts)))
+        expected[relative_path] = values
+    return documents, expected
+
+
+class LocalRow(dict):
+    """Result row addressable by column name or by position, like a Snowpark Row."""
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return dict.__getitem__(self, key)
+
+
+class LocalJob:
+    """Async job returned by collect_nowait()."""
+
+    def __init__(self, future, query_id):
+        self._future = future
+        self.query_id = query_id
+
+    def is_done(self):
+        return self._future.done()
+
+    def result(self):
+        return self._future.result()
+
+
+class LocalStatement:
+    def __init__(self, backend, query, params=None):
+        self.backend = backend
+        self.query = inline_params(query, params)
+
+    def collect(self):
+        return self.backend.execute(self.query)
+
+    def collect_nowait(self):
+        return LocalJob(self.backend.pool.submit(self.backend.execute, self.query), self.backend.next_query_id())
+
+
+class LocalCortexBackend:
+    """In-memory stand-in for a Snowpark session with Cortex functions.
+
+    `latency` is added to every Cortex call and `latency_per_kchar` per 1000
+    characters of text it reads. `error_rate` and `throttle_rate` are the
+    chances that a Cortex call fails with a transient or a throttling error.
+    Only the PARSE_DOCUMENT forms listed in `working_parse_forms` succeed,
+    and AI_EXTRACT reads staged files only when `server_side_encrypted`.
+    Without `stage_owner`, CREATE STAGE and ALTER STAGE fail for lack of
+    privileges. Set-based statements over the directory table process up to
+    `warehouse_parallelism` files at once. The incremental pipeline's
+    doc_extract tables are kept in `extract_tables`, by table name.
+    """
+
+    def __init__(self, documents=(), stage_name="pdf_upload_stage", latency=0.05,
+                 latency_per_kchar=0.002, ddl_latency=0.005, error_rate=0.0, throttle_rate=0.0,
+                 working_parse_forms=(0, 1, 2), server_side_encrypted=True, stage_owner=True,
+                 warehouse_parallelism=16, seed=0, max_workers=32):
+        self.stage_name = stage_name
+        self.documents = {doc.relative_path: doc for doc in documents}
+        self.latency = latency
+        self.latency_per_kchar = latency_per_kchar
+        self.ddl_latency = ddl_latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.working_parse_forms = tuple(working_parse_forms)
+        self.server_side_encrypted = server_side_encrypted
+        self.stage_owner = stage_owner
+        self.warehouse_parallelism = warehouse_parallelism
+        self.stats = QueryStats()
+        self.trace = None
+        self.parse_cache = {}
+        self.tables = {}
+        self.extract_tables = {}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._query_ids = 0
+
+    def sql(self, query, params=None):
+        self.stats.record(query, params)
+        return traced(LocalStatement(self, query, params), self.trace, query, params)
+
+    def write_pandas(self, df, table_name, **kwargs):
+        """Append the rows of `df` to `tables[table_name]`."""
+        def load():
+            self._sleep(self.ddl_latency)
+            with self._lock:
+                self.tables.setdefault(table_name.upper(), []).extend(df.to_dict('records'))
+        return traced_bulk_load(self, table_name, len(df), load)
+
+    def next_query_id(self):
+        with self._lock:
+            self._query_ids += 1
+            return f"local-{self._query_ids:08d}"
+
+    def get_current_account(self):
+        return "LOCAL"
+
+    def execute(self, query):
+        """Run one statement and return its rows."""
+        statement = query.strip()
+        keyword = statement.split(None, 1)[0].upper() if statement else ""
+
+        if keyword == "LIST":
+            self._sleep(self.ddl_latency)
+            return [
+                LocalRow(name=f"{self.stage_name}/{doc.relative_path}", size=doc.size,
+                         md5=doc.md5, last_modified=format_datetime(doc.last_modified, usegmt=True))
+                for doc in self._sorted_documents()
+            ]
+        if keyword in ("CREATE", "ALTER", "USE"):
+            self._sleep(self.ddl_latency)
+            if not self.stage_owner and re.match(r"(CREATE|ALTER) STAGE", statement, re.IGNORECASE):
+                raise RuntimeError(
+                    f"SQL access control error: Insufficient privileges to operate on stage '{self.stage_name}'"
+                )
+            return [LocalRow(status="Statement executed successfully.")]
+        if "AI_EXTRACT_PARSE_CACHE" in statement:
+            return self._parse_cache_statement(keyword, statement)
+        if "DIRECTORY(" in statement.replace(" (", "("):
+            return self._directory_statement(statement)
+        if keyword == "MERGE" and re.match(r"MERGE INTO \S+ t\s+USING \w", statement):
+            return self._merge_table_statement(statement)
+        if keyword == "DROP":
+            self._sleep(self.ddl_latency)
+            with self._lock:
+                self.tables.pop(statement.split()[-1].upper(), None)
+            return [LocalRow(status="Statement executed successfully.")]
+        if "AI_EXTRACT(" in statement:
+            return [LocalRow(EXTRACT_DATA=self._ai_extract(statement, statement.index("AI_EXTRACT(")))]
+        if "PARSE_DOCUMENT(" in statement:
+            return [LocalRow(PARSED_CONTENT=self._parse_document(statement))]
+        self._sleep(self.ddl_latency)
+        return []
+
+    def _sorted_documents(self):
+        return [self.documents[path] for path in sorted(self.documents)]
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _cortex_call(self, chars):
+        """Simulate the latency and failure modes of one Cortex call."""
+        with self._lock:
+            roll = self._random.random()
+        self._sleep(self.latency + self.latency_per_kchar * chars / 1000)
+        if roll < self.throttle_rate:
+            raise RuntimeError("429 Too Many Requests: simulated Cortex throttling")
+        if roll < self.throttle_rate + self.error_rate:
+            raise RuntimeError("Internal error: simulated transient Cortex failure")
+
+    def _document(self, relative_path):
+        doc = self.documents.get(relative_path)
+        if doc is None:
+            raise RuntimeError(f"Remote file '{relative_path}' was not found")
+        return doc
+
+    def _parse_document(self, statement):
+        if "GET_PRESIGNED_URL" in statement:
+            form, path = 1, literals(statement)[-1]
+        elif re.search(r"PARSE_DOCUMENT\(\s*'@", statement) and "', " not in statement:
+            form, path = 2, literals(statement)[-1].split("/", 1)[1]
+        else:
+            form, path = 0, literals(statement)[-1]
+        if form not in self.working_parse_forms:
+            raise RuntimeError("SQL compilation error: invalid argument types for function 'PARSE_DOCUMENT'")
+        doc = self._document(path)
+        self._cortex_call(len(doc.text))
+        return json.dumps({"content": doc.text, "metadata": {"pageCount": 1 + len(doc.text) // 3000}})
+
+    def _ai_extract(self, statement, start, text=None):
+        """Evaluate the AI_EXTRACT call starting at `start`; `text` overrides its input."""
+        if text is None:
+            call = statement[start:]
+            file_match = re.match(r"AI_EXTRACT\(\s*file => TO_FILE\(" + _LITERAL + r",\s*" + _LITERAL, call)
+            text_match = re.match(r"AI_EXTRACT\(\s*text => " + _LITERAL, call, re.DOTALL)
+            if file_match:
+                if not self.server_side_encrypted:
+                    raise RuntimeError(
+                        "AI_EXTRACT file input requires a stage with ENCRYPTION = (TYPE = 'SNOWFLAKE_SSE')"
+                    )
+                text = self._document(unquote(file_match.group(2))).text
+            elif text_match:
+                text = unquote(text_match.group(1))
+            else:
+                raise RuntimeError("SQL compilation error: unsupported AI_EXTRACT input")
+        keys = response_format_keys(statement, start)
+        self._cortex_call(len(text))
+        return json.dumps({"response": {key: answer(text, key) for key in keys}})
+
+    def _matching_documents(self, statement):
+        docs = self._sorted_documents()
+        in_list = re.search(r"relative_path IN \(([^)]*)\)", statement)
+        if in_list:
+            wanted = set(literals(in_list.group(1)))
+            docs = [doc for doc in docs if doc.relative_path in wanted]
+        prefix = re.search(r"STARTSWITH\(relative_path, " + _LITERAL + r"\)", statement)
+        if prefix:
+            docs = [doc for doc in docs if doc.relative_path.startswith(unquote(prefix.group(1)))]
+        for pattern in re.findall(r"relative_path ILIKE " + _LITERAL, statement):
+            regex = re.escape(unquote(pattern)).replace("%", ".*").replace("_", ".")
+            docs = [doc for doc in docs if re.fullmatch(regex, doc.relative_path, re.IGNORECASE | re.DOTALL)]
+        if "LOWER(relative_path) LIKE '%.pdf'" in statement:
+            docs = [doc for doc in docs if doc.relative_path.lower().endswith(".pdf")]
+        minimum = re.search(r"\bsize >= (\d+)", statement)
+        if minimum:
+            docs = [doc for doc in docs if doc.size >= int(minimum.group(1))]
+        maximum = re.search(r"\bsize <= (\d+)", statement)
+        if maximum:
+            docs = [doc for doc in docs if doc.size <= int(maximum.group(1))]
+        since = re.search(r"last_modified >= " + _LITERAL + r"::TIMESTAMP_TZ", statement)
+        if since:
+            threshold = datetime.fromisoformat(unquote(since.group(1)))
+            if threshold.tzinfo is None:
+                threshold = threshold.replace(tzinfo=timezone.utc)
+            docs = [doc for doc in docs if doc.last_modified >= threshold]
+        return docs
+
+    def _directory_statement(self, statement):
+        docs = self._matching_documents(statement)
+        if "field_set_id IS DISTINCT FROM" in statement:
+            return self._doc_extract_statement(statement, docs)
+        if "AI_EXTRACT(" in statement:
+            return self._batch_extract(statement, docs)
+        self._sleep(self.ddl_latency)
+        if "MAX(last_modified)" in statement:
+            watermark = max((doc.last_modified for doc in docs), default=None)
+            return [LocalRow(FILE_COUNT=len(docs), WATERMARK=watermark)]
+        if "COUNT(*)" in statement:
+            return [LocalRow(FILE_COUNT=len(docs))]
+        limit = re.search(r"LIMIT (\d+)(?: OFFSET (\d+))?", statement)
+        if limit:
+            offset = int(limit.group(2) or 0)
+            docs = docs[offset:offset + int(limit.group(1))]
+        return [
+            LocalRow(RELATIVE_PATH=doc.relative_path, SIZE=doc.size,
+                     LAST_MODIFIED=doc.last_modified, MD5=doc.md5)
+            for doc in docs
+        ]
+
+    def _batch_extract(self, statement, docs):
+        """One set-based statement: the warehouse works on up to `warehouse_parallelism` files at once."""
+        starts = [match.start() for match in re.finditer(r"AI_EXTRACT\(", statement)]
+        if "file => TO_FILE(" in statement and not self.server_side_encrypted:
+            raise RuntimeError("AI_EXTRACT file input requires a stage with ENCRYPTION = (TYPE = 'SNOWFLAKE_SSE')")
+        with ThreadPoolExecutor(max_workers=self.warehouse_parallelism) as warehouse:
+            return list(warehouse.map(
+                lambda doc: LocalRow(
+                    RELATIVE_PATH=doc.relative_path,
+                    MD5=doc.md5,
+                    **{f"EXTRACT_DATA_{idx}": self._ai_extract(statement, start, doc.text)
+                       for idx, start in enumerate(starts)}
+                ),
+                docs
+            ))
+
+    def _doc_extract_statement(self, statement, docs):
+        """Pending count or MERGE of the incremental pipeline (see pdf_extractor.incremental)."""
+        table = re.search(r"LEFT JOIN (\S+) e ON", statement).group(1).upper()
+        set_id = unquote(re.search(r"field_set_id IS DISTINCT FROM " + _LITERAL, statement).group(1))
+        with self._lock:
+            rows = self.extract_tables.setdefault(table, {})
+            pending = [
+                doc for doc in docs
+                if doc.relative_path.lower().endswith(".pdf")
+                and (doc.relative_path not in rows
+                     or rows[doc.relative_path]['md5'] != doc.md5
+                     or rows[doc.relative_path]['field_set_id'] != set_id)
+            ]
+            inserted = sum(1 for doc in pending if doc.relative_path not in rows)
+        if not statement.upper().startswith("MERGE"):
+            self._sleep(self.ddl_latency)
+            return [LocalRow(PENDING=len(pending))]
+        extracted = self._batch_extract(statement, pending)
+        with self._lock:
+            for row in extracted:
+                rows[row['RELATIVE_PATH']] = {
+                    'md5': row['MD5'], 'field_set_id': set_id, 'extract_data': row['EXTRACT_DATA_0'],
+                }
+        return [LocalRow(**{
+            "number of rows inserted": inserted,
+            "number of rows updated": len(pending) - inserted,
+        })]
+
+    def _merge_table_statement(self, statement):
+        """MERGE INTO <table> t USING <table> s ON t.<key> = s.<key> AND ...; matches replace rows."""
+        self._sleep(self.ddl_latency)
+        match = re.match(r"MERGE INTO (\S+) t\s+USING (\S+) s\s+ON (.+?)\s+WHEN", statement, re.DOTALL)
+        target, source = match.group(1).upper(), match.group(2).upper()
+        keys = [key.upper() for key in re.findall(r"t\.(\w+) = s\.\1", match.group(3))]
+        inserted = updated = 0
+        with self._lock:
+            rows = self.tables.setdefault(target, [])
+            positions = {tuple(row[key] for key in keys): idx for idx, row in enumerate(rows)}
+            for row in self.tables.get(source, []):
+                key = tuple(row[key] for key in keys)
+                if key in positions:
+                    rows[positions[key]] = dict(row)
+                    updated += 1
+                else:
+                    positions[key] = len(rows)
+                    rows.append(dict(row))
+                    inserted += 1
+        return [LocalRow(**{"number of rows inserted": inserted, "number of rows updated": updated})]
+
+    def _parse_cache_statement(self, keyword, statement):
+        self._sleep(self.ddl_latency)
+        key_match = re.search(r"content_key = " + _LITERAL, statement)
+        key = unquote(key_match.group(1)) if key_match else None
+        if keyword == "SELECT":
+            if key in self.parse_cache:
+                return [LocalRow(PARSED_CONTENT=self.parse_cache[key])]
+            return []
+        if keyword == "MERGE":
+            values = literals(statement)
+            self.parse_cache[values[0]] = values[1]
+            return [LocalRow(inserted=1, updated=0)]
+        if keyword == "DELETE":
+            if key is None:
+                removed = len(self.parse_cache)
+                self.parse_cache.clear()
+            else:
+                removed = 1 if self.parse_cache.pop(key, None) is not None else 0
+            return [LocalRow(deleted=removed)]
+        return []
@@ -0,0 +1,239 @@
+"""
+PARSE_DOCUMENT helpers: call-form detection and the content-addressed parse cache.
+"""
+
+import json
+import time
+
+from pdf_extractor.execution import classify_error, collect_with_retry
+from pdf_extractor.instrumentation import step
+from pdf_extractor.sql import BoundQuery, sql_string
+
+# PARSE_DOCUMENT call forms, tried in order until one works on this account
+PARSE_DOCUMENT_FORMS = [
+    ("stage and file name", "SNOWFLAKE.CORTEX.PARSE_DOCUMENT('@{stage}', {file})"),
+    ("presigned URL", "SNOWFLAKE.CORTEX.PARSE_DOCUMENT(GET_PRESIGNED_URL(@{stage}, {file}))"),
+    ("stage path", "SNOWFLAKE.CORTEX.PARSE_DOCUMENT({path})"),
+]
+
+PARSE_CACHE_TABLE = "AI_EXTRACT_PARSE_CACHE"
+CAPABILITIES_TABLE = "AI_EXTRACT_CAPABILITIES"
+
+# Parsed documents kept in session memory on top of the cache table
+PARSE_MEMO_MAX_ENTRIES = 20
+
+
+def parse_expression(form, stage_name, file_expr, path_expr):
+    """SQL expression calling PARSE_DOCUMENT in call form `form` (an index into PARSE_DOCUMENT_FORMS)."""
+    return PARSE_DOCUMENT_FORMS[form][1].format(stage=stage_name, file=file_expr, path=path_expr)
+
+
+def parse_document(session, stage_name, file_name, preferred_form=None, retry_policy=None):
+    """Parse a staged file, trying each PARSE_DOCUMENT form in turn.
+
+    A known-good `preferred_form` is tried first so it normally costs a
+    single round trip. Throttled and transient errors are retried with
+    `retry_policy`'s backoff; only a permanent error moves on to the next
+    form, and a form that keeps failing transiently ends the attempt, since
+    the next form would hit the same limit. Returns (parsed_text, form,
+    errors); parsed_text and form are None if no form worked.
+    """
+    forms = list(range(len(PARSE_DOCUMENT_FORMS)))
+    if preferred_form is not None:
+        forms.remove(preferred_form)
+        forms.insert(0, preferred_form)
+
+    errors = []
+    for form in forms:
+        expression = parse_expression(
+            form, stage_name, sql_string(file_name), sql_string(f"@{stage_name}/{file_name}")
+        )
+        try:
+            parse_result = collect_with_retry(
+                session, f"SELECT {expression} AS parsed_content", retry_policy,
+                "parse", PARSE_DOCUMENT_FORMS[form][0]
+            )
+            return str(parse_result[0]['PARSED_CONTENT']), form, errors
+        except Exception as e:
+            errors.append((PARSE_DOCUMENT_FORMS[form][0], str(e)))
+            if classify_error(e) != "permanent":
+                break
+    return None, None, errors
+
+
+def probe_capabilities(session, stage_name, sample_path=None, retry_policy=None):
+    """Find out which Cortex functions and which PARSE_DOCUMENT form work here.
+
+    AI_EXTRACT is checked with a tiny text call; PARSE_DOCUMENT forms are
+    tried on `sample_path`, a PDF on the stage, when one is given. Only a
+    permanent error marks a function unavailable: a function that is still
+    throttled or failing transiently after the retries is listed in
+    `inconclusive` instead, and such a result should not be saved.
+    """
+    capabilities = {
+        'parse_form': None,
+        'functions': {},
+        'probed_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'inconclusive': [],
+    }
+    try:
+        collect_with_retry(
+            session,
+            BoundQuery("SELECT AI_EXTRACT(text => ?, responseFormat => OBJECT_CONSTRUCT(?, ?))",
+                       ("probe", "probe", "What is this?")),
+            retry_policy, "probe", "AI_EXTRACT"
+        )
+        capabilities['functions']['AI_EXTRACT'] = True
+    except Exception as e:
+        if classify_error(e) == "permanent":
+            capabilities['functions']['AI_EXTRACT'] = False
+        else:
+            capabilities['inconclusive'].append('AI_EXTRACT')
+    if sample_path:
+        with step(session, "probe", sample_path):
+            _, form, errors = parse_document(session, stage_name, sample_path, retry_policy=retry_policy)
+        if form is None and errors and classify_error(errors[-1][1]) != "permanent":
+            capabilities['inconclusive'].append('PARSE_DOCUMENT')
+        else:
+            capabilities['parse_form'] = form
+            capabilities['functions']['PARSE_DOCUMENT'] = form is not None
+    return capabilities
+
+
+def ensure_capabilities_table(session):
+    """Create the table that remembers probe results per account and stage."""
+    session.sql(f"""
+    CREATE TABLE IF NOT EXISTS {CAPABILITIES_TABLE} (
+        account STRING,
+        stage_name STRING,
+        parse_form NUMBER,
+        functions VARIANT,
+        probed_at STRING
+    )
+    """).collect()
+
+
+def load_capabilities(session, account, stage_name):
+    """Return the saved probe result for an account and stage, or None."""
+    result = session.sql(f"""
+    SELECT parse_form, functions, probed_at FROM {CAPABILITIES_TABLE}
+    WHERE account = {sql_string(account)} AND stage_name = {sql_string(stage_name)}
+    LIMIT 1
+    """).collect()
+    if not result:
+        return None
+    parse_form = result[0]['PARSE_FORM']
+    return {
+        'parse_form': None if parse_form is None else int(parse_form),
+        'functions': json.loads(result[0]['FUNCTIONS'] or "{}"),
+        'probed_at': result[0]['PROBED_AT'],
+    }
+
+
+def save_capabilities(session, account, stage_name, capabilities):
+    """Store a probe result for an account and stage."""
+    parse_form = capabilities['parse_form']
+    session.sql(f"""
+    MERGE INTO {CAPABILITIES_TABLE} c
+    USING (
+        SELECT {sql_string(account)} AS account,
+               {sql_string(stage_name)} AS stage_name,
+               {'NULL' if parse_form is None else int(parse_form)} AS parse_form,
+               PARSE_JSON({sql_string(json.dumps(capabilities['functions']))}) AS functions,
+               {sql_string(capabilities['probed_at'])} AS probed_at
+    ) s
+    ON c.account = s.account AND c.stage_name = s.stage_name
+    WHEN MATCHED THEN UPDATE SET
+        parse_form = s.parse_form, functions = s.functions, probed_at = s.probed_at
+    WHEN NOT MATCHED THEN INSERT (account, stage_name, parse_form, functions, probed_at)
+        VALUES (s.account, s.stage_name, s.parse_form, s.functions, s.probed_at)
+    """).collect()
+
+
+def file_content_key(file):
+    """Cache key for a staged file's content.
+
+    Uses the md5 reported by the stage so byte-identical uploads share an entry;
+    falls back to path, size and modification time when no md5 is available.
+    Only `relative_path` is required.
+    """
+    if file.get('md5'):
+        return f"md5:{file['md5']}"
+    path = file.get('full_path') or file['relative_path']
+    return f"file:{path}:{file.get('size')}:{file.get('last_modified')}"
+
+
+def ensure_parse_cache(session):
+    """Create the parse cache table if it does not exist yet."""
+    session.sql(f"""
+    CREATE TABLE IF NOT EXISTS {PARSE_CACHE_TABLE} (
+        content_key STRING,
+        parsed_content STRING,
+        source_path STRING,
+        file_size NUMBER,
+        cached_at TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """).collect()
+
+
+def remember_parse(memo, key, parsed_text):
+    """Keep a parsed document in the session memo, dropping the oldest past the limit."""
+    memo.pop(key, None)
+    memo[key] = parsed_text
+    while len(memo) > PARSE_MEMO_MAX_ENTRIES:
+        memo.pop(next(iter(memo)))
+
+
+def load_cached_parse(session, key, memo):
+    """Return the cached parse for `key` from the memo or the cache table, or None."""
+    if key in memo:
+        return memo[key]
+    with step(session, "parse_cache"):
+        result = session.sql(
+            f"SELECT parsed_content FROM {PARSE_CACHE_TABLE} WHERE content_key = {sql_string(key)} LIMIT 1"
+        ).collect()
+    if not result:
+        return None
+    remember_parse(memo, key, result[0]['PARSED_CONTENT'])
+    return memo[key]
+
+
+def store_cached_parse(session, key, file, parsed_text, memo):
+    """Write a parse result to the cache table and the session memo."""
+    with step(session, "parse_cache"):
+        # The parsed text is bound once rather than inlined twice as an escaped literal
+        session.sql(f"""
+        MERGE INTO {PARSE_CACHE_TABLE} c
+        USING (SELECT ? AS content_key, ? AS parsed_content, ? AS source_path, ? AS file_size) s
+        ON c.content_key = s.content_key
+        WHEN MATCHED THEN UPDATE SET
+            parsed_content = s.parsed_content,
+            source_path = s.source_path,
+            file_size = s.file_size,
+            cached_at = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (content_key, parsed_content, source_path, file_size)
+            VALUES (s.content_key, s.parsed_content, s.source_path, s.file_size)
+        """, [key, parsed_text, file['full_path'], int(file['size'])]).collect()
+    remember_parse(memo, key, parsed_text)
+
+
+def evict_parse_cache(session, max_age_days, memo):
+    """Delete cache entries older than `max_age_days`; returns the number removed."""
+    result = session.sql(
+        f"DELETE FROM {PARSE_CACHE_TABLE} "
+        f"WHERE cached_at < DATEADD(day, -{int(max_age_days)}, CURRENT_TIMESTAMP())"
+    ).collect()
+    memo.clear()
+    return result[0][0] if result else 0
+
+
+def invalidate_parse_cache(session, memo, key=None):
+    """Drop the cache entry for `key`, or every entry when no key is given."""
+    if key is None:
+        session.sql(f"DELETE FROM {PARSE_CACHE_TABLE}").collect()
+        memo.clear()
+    else:
+        session.sql(
+            f"DELETE FROM {PARSE_CACHE_TABLE} WHERE content_key = {sql_string(key)}"
+        ).collect()
+        memo.pop(key, None)
@@ -0,0 +1,211 @@
+"""
+Extraction results spilled to a SQLite file and read back a page at a time.
+
+The app keeps only a ResultStore handle in session state; the values live
+on disk in long form (one row per document and field), so reviewing a
+batch of thousands of documents costs one page of rows in memory. Edits
+are single-cell patches, and exports and write-back read the results in
+chunks.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import weakref
+
+import pandas as pd
+
+from pdf_extractor.exports import EXPORT_ROWS_PER_CHUNK, cell_text
+from pdf_extractor.sql import is_error_value
+
+# Result review paging: rows per page
+REVIEW_PAGE_SIZE = 50
+
+# Review filters: show every row, rows with an error, or rows with an empty answer
+REVIEW_CONDITIONS = ("all", "errors", "empty")
+
+# Columns of the wide result frames that are not fields, so no field may use these names
+RESERVED_FIELD_NAMES = ("seq", "relative_path")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fields (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS documents (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    relative_path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS cells (
+    relative_path TEXT NOT NULL,
+    field_name TEXT NOT NULL,
+    value TEXT,
+    is_error INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (relative_path, field_name)
+);
+CREATE INDEX IF NOT EXISTS cell_errors ON cells (relative_path) WHERE is_error = 1;
+"""
+
+
+def _close_and_remove(connection, path):
+    connection.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class ResultStore:
+    """Result table of one session: documents in extraction order, wide by field.
+
+    Values are stored as text (see cell_text), the same form exports and
+    AI_EXTRACT_RESULTS use. Without a `path` the store lives in a temporary
+    file that is removed when the store is closed or garbage collected.
+    Streamlit reruns come from different threads, so access is serialized.
+    """
+
+    def __init__(self, path=None):
+        temporary = path is None
+        if temporary:
+            handle, path = tempfile.mkstemp(prefix="ai_extract_results_", suffix=".sqlite")
+            os.close(handle)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        if temporary:
+            self._finalizer = weakref.finalize(self, _close_and_remove, self._connection, path)
+        else:
+            self._finalizer = weakref.finalize(self, self._connection.close)
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM documents")[0][0]
+
+    def close(self):
+        self._finalizer()
+
+    def field_names(self):
+        return [row[0] for row in self._query("SELECT name FROM fields ORDER BY position")]
+
+    def add(self, data):
+        """Add a result table (relative_path plus one column per field); rows for known paths are replaced.
+
+        A replaced document moves to the end, as when merging result tables
+        where newer rows win. Raises ValueError for a field named like one of
+        RESERVED_FIELD_NAMES.
+        """
+        names = [col for col in data.columns if col != 'relative_path']
+        reserved = [name for name in names if name in RESERVED_FIELD_NAMES]
+        if reserved or list(data.columns).count('relative_path') != 1:
+            raise ValueError(f"Field names {', '.join(RESERVED_FIELD_NAMES)} are reserved for result columns")
+        records = data.to_dict('records')
+        paths = [(record['relative_path'],) for record in records]
+        cells = []
+        for record in records:
+            for name in names:
+                text = cell_text(record[name])
+                cells.append((record['relative_path'], name, text, int(is_error_value(text))))
+        with self._lock, self._connection:
+            known = {row[0] for row in self._connection.execute("SELECT name FROM fields")}
+            start = self._connection.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM fields").fetchone()[0]
+            new_names = [name for name in names if name not in known]
+            self._connection.executemany(
+                "INSERT INTO fields (position, name) VALUES (?, ?)",
+                [(start + idx, name) for idx, name in enumerate(new_names)],
+            )
+            self._connection.executemany("DELETE FROM cells WHERE relative_path = ?", paths)
+            self._connection.executemany("DELETE FROM documents WHERE relative_path = ?", paths)
+            self._connection.executemany("INSERT INTO documents (relative_path) VALUES (?)", paths)
+            self._connection.executemany(
+                "INSERT INTO cells (relative_path, field_name, value, is_error) VALUES (?, ?, ?, ?)", cells
+            )
+
+    def patch(self, relative_path, field_name, value):
+        """Set one cell to `value` (text or None)."""
+        text = cell_text(value)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cells (relative_path, field_name, value, is_error) VALUES (?, ?, ?, ?)",
+                (relative_path, field_name, text, int(is_error_value(text))),
+            )
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.executescript("DELETE FROM cells; DELETE FROM documents; DELETE FROM fields;")
+
+    @staticmethod
+    def make_filters(condition="all", field_name=None, path_contains=""):
+        """Hashable filter spec: a REVIEW_CONDITIONS entry, the field it applies to (None for any) and a path substring."""
+        if condition not in REVIEW_CONDITIONS:
+            raise ValueError(f"Unknown review filter: {condition}")
+        return (condition, field_name or None, path_contains or "")
+
+    def count(self, filters):
+        """Number of documents matching `filters`."""
+        where, params = self._where(filters)
+        return self._query(f"SELECT COUNT(*) FROM documents d WHERE {where}", params)[0][0]
+
+    def page(self, filters, page, page_size=REVIEW_PAGE_SIZE):
+        """One page (0-based) of documents matching `filters`, as a wide DataFrame in extraction order."""
+        where, params = self._where(filters)
+        return self._frame(
+            f"SELECT seq, relative_path FROM documents d WHERE {where} ORDER BY seq LIMIT ? OFFSET ?",
+            params + [int(page_size), int(page) * int(page_size)],
+        )
+
+    def iter_frames(self, rows_per_chunk=EXPORT_ROWS_PER_CHUNK):
+        """Yield every document as wide DataFrames of up to `rows_per_chunk` rows."""
+        last_seq = 0
+        while True:
+            frame = self._frame(
+                "SELECT seq, relative_path FROM documents WHERE seq > ? ORDER BY seq LIMIT ?",
+                [last_seq, int(rows_per_chunk)],
+                with_seq=True,
+            )
+            if frame.empty:
+                return
+            last_seq = int(frame['seq'].iloc[-1])
+            yield frame.drop(columns='seq')
+
+    def _where(self, filters):
+        condition, field_name, path_contains = filters
+        conditions, params = ["1 = 1"], []
+        if condition == "errors":
+            # Errors are rare, so the partial index on them keeps this cheap
+            field_match = " AND field_name = ?" if field_name else ""
+            conditions.append(f"d.relative_path IN (SELECT relative_path FROM cells WHERE is_error = 1{field_match})")
+            params.extend([field_name] if field_name else [])
+        elif condition == "empty":
+            # A field is empty when its cell is missing, NULL or blank
+            candidates = "SELECT name FROM fields WHERE name = ?" if field_name else "SELECT name FROM fields"
+            conditions.append(
+                f"EXISTS (SELECT 1 FROM ({candidates}) f WHERE NOT EXISTS ("
+                f"SELECT 1 FROM cells c WHERE c.relative_path = d.relative_path "
+                f"AND c.field_name = f.name AND COALESCE(TRIM(c.value), '') <> ''))"
+            )
+            params.extend([field_name] if field_name else [])
+        if path_contains:
+            conditions.append("INSTR(LOWER(d.relative_path), LOWER(?)) > 0")
+            params.append(path_contains)
+        return " AND ".join(conditions), params
+
+    def _frame(self, documents_query, params, with_seq=False):
+        # Cells are joined to the selected documents in SQLite, so only this slice is read
+        rows = self._query(f"""
+        WITH selected AS ({documents_query})
+        SELECT selected.seq, selected.relative_path, c.field_name, c.value
+        FROM selected LEFT JOIN cells c ON c.relative_path = selected.relative_path
+        ORDER BY selected.seq
+        """, params)
+        names = self.field_names()
+        records = {}
+        for seq, relative_path, field_name, value in rows:
+            if seq not in records:
+                records[seq] = {'seq': seq, 'relative_path': relative_path, **dict.fromkeys(names)}
+            if field_name is not None:
+                records[seq][field_name] = value
+        columns = (['seq'] if with_seq else []) + ['relative_path'] + names
+        return pd.DataFrame(list(records.values()), columns=['seq', 'relative_path'] + names)[columns]
+
+    def _query(self, query, params=()):
+        with self._lock:
+            return self._connection.execute(query, params).fetchall()
@@ -0,0 +1,83 @@
+"""
+Bulk write-back of extracted results to a Snowflake table.
+
+Results are stored in long form, one row per document and field, keyed by
+run_id, relative_path and field_name, so downstream pipelines can read or
+pivot them without going through the app. A write loads its rows into a
+temporary table and merges them on that key in one statement, so a retried
+write replaces the rows of the failed one instead of duplicating them.
+"""
+
+import uuid
+
+import pandas as pd
+
+from pdf_extractor.exports import cell_text
+from pdf_extractor.sql import is_error_value
+
+RESULTS_TABLE = "AI_EXTRACT_RESULTS"
+
+RESULTS_COLUMNS = ["RUN_ID", "RELATIVE_PATH", "FIELD_NAME", "FIELD_VALUE", "IS_ERROR"]
+
+
+def ensure_results_table(session, table=RESULTS_TABLE):
+    """Create the results table if it does not exist yet."""
+    session.sql(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        run_id STRING NOT NULL,
+        relative_path STRING NOT NULL,
+        field_name STRING NOT NULL,
+        field_value STRING,
+        is_error BOOLEAN,
+        written_at TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
+        PRIMARY KEY (run_id, relative_path, field_name)
+    )
+    """).collect()
+
+
+def result_rows(data, run_id):
+    """Long-form rows of a result table (one row per document, wide by field)."""
+    rows = []
+    for record in data.to_dict('records'):
+        relative_path = record.get('relative_path')
+        for field_name, value in record.items():
+            if field_name == 'relative_path':
+                continue
+            text = cell_text(value)
+            rows.append((run_id, relative_path, field_name, text, is_error_value(text)))
+    return pd.DataFrame(rows, columns=RESULTS_COLUMNS)
+
+
+def write_results(session, data, run_id, table=RESULTS_TABLE):
+    """Write a result table, or an iterable of chunks of one; returns the rows written.
+
+    The chunks are bulk loaded (write_pandas) into a temporary table, then one
+    MERGE on (run_id, relative_path, field_name) makes them visible at once.
+    """
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    staging = f"{table}_LOAD_{uuid.uuid4().hex[:12]}".upper()
+    session.sql(f"""
+    CREATE TEMPORARY TABLE {staging} (
+        run_id STRING, relative_path STRING, field_name STRING, field_value STRING, is_error BOOLEAN
+    )
+    """).collect()
+    try:
+        written = 0
+        for chunk in chunks:
+            rows = result_rows(chunk, run_id)
+            if not rows.empty:
+                session.write_pandas(rows, staging)
+                written += len(rows)
+        if written:
+            session.sql(f"""
+            MERGE INTO {table} t
+            USING {staging} s
+            ON t.run_id = s.run_id AND t.relative_path = s.relative_path AND t.field_name = s.field_name
+            WHEN MATCHED THEN UPDATE SET
+                field_value = s.field_value, is_error = s.is_error, written_at = CURRENT_TIMESTAMP()
+            WHEN NOT MATCHED THEN INSERT (run_id, relative_path, field_name, field_value, is_error)
+                VALUES (s.run_id, s.relative_path, s.field_name, s.field_value, s.is_error)
+            """).collect()
+    finally:
+        session.sql(f"DROP TABLE IF EXISTS {staging}").collect()
+    return written
@@ -0,0 +1,276 @@
+"""
+Field schema registry: extraction fields with target types and normalization.
+
+A field is the dict the app already uses ({"name", "description"}) plus
+optional keys:
+
+    type       one of FIELD_TYPES (default "string")
+    normalize  names from NORMALIZERS applied in order (default DEFAULT_NORMALIZE)
+    column     column name in the typed table (default derived from the name)
+
+From a field list this module builds the SQL that turns raw AI_EXTRACT
+responses (a VARIANT `extract_data` column) into native typed columns,
+either as a dynamic table Snowflake keeps up to date or as a plain table
+refreshed with MERGE. Print the DDL for a template with:
+
+    python -m pdf_extractor.schema --template "Loan Docs: Full" --warehouse my_wh
+"""
+
+import argparse
+import re
+
+from pdf_extractor.incremental import field_set_id
+from pdf_extractor.sql import sql_string
+
+# Target types: column type and the conversion of normalized text to it
+FIELD_TYPES = {
+    "string": ("STRING", "{value}"),
+    "number": ("NUMBER(38, 4)", "TRY_TO_NUMBER(REGEXP_REPLACE({value}, '[^0-9.-]', ''), 38, 4)"),
+    "integer": ("NUMBER(38, 0)", "TRY_TO_NUMBER(REGEXP_REPLACE({value}, '[^0-9-]', ''))"),
+    "date": (
+        "DATE",
+        "COALESCE(TRY_TO_DATE({value}), TRY_TO_DATE({value}, 'MM/DD/YYYY'), "
+        "TRY_TO_DATE({value}, 'DD-MON-YYYY'), TRY_TO_DATE({value}, 'MMMM DD, YYYY'))",
+    ),
+    "boolean": ("BOOLEAN", "TRY_TO_BOOLEAN({value})"),
+}
+
+# Text normalization rules, applied before the type conversion
+NORMALIZERS = {
+    "trim": "TRIM({value})",
+    "collapse_whitespace": "REGEXP_REPLACE({value}, '[[:space:]]+', ' ')",
+    "null_placeholders": "IFF(UPPER({value}) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, {value})",
+    "upper": "UPPER({value})",
+    "lower": "LOWER({value})",
+    "digits": "REGEXP_REPLACE({value}, '[^0-9]', '')",
+}
+
+DEFAULT_NORMALIZE = ("trim", "null_placeholders")
+
+# Non-field columns the typed table can carry over from the source table
+KEY_COLUMN_TYPES = {
+    "relative_path": "STRING",
+    "md5": "STRING",
+    "field_set_id": "STRING",
+    "extracted_at": "TIMESTAMP_LTZ",
+}
+
+# The loan document fields of Initial_Setup.sql and Incremental_Pipeline.sql,
+# asked by name as in their responseFormat lists
+LOAN_DOC_FIELDS = [
+    {"name": "Company Name", "description": ""},
+    {"name": "Doing Business As", "description": ""},
+    {"name": "Primary ID Type", "description": ""},
+    {"name": "Primary ID Number", "description": ""},
+    {"name": "Country of Issue", "description": ""},
+    {"name": "State/Province of Issue", "description": ""},
+    {"name": "Date of Issue", "description": "", "type": "date"},
+    {"name": "Customer Name", "description": ""},
+    {"name": "Address Type", "description": ""},
+    {"name": "Primary Address", "description": "", "normalize": ("trim", "collapse_whitespace", "null_placeholders")},
+    {"name": "City", "description": ""},
+    {"name": "County", "description": ""},
+    {"name": "Country", "description": ""},
+    {"name": "Postal Code", "description": ""},
+    {"name": "State/Province", "description": ""},
+    {"name": "Primary Contact Name", "description": ""},
+    {"name": "Primary Contact Number", "description": "", "normalize": ("trim", "null_placeholders", "digits")},
+    {"name": "Contact Type", "description": ""},
+    {"name": "Primary Email Address", "description": "", "normalize": ("trim", "null_placeholders", "lower")},
+    {"name": "Fax #", "description": "", "normalize": ("trim", "null_placeholders", "digits")},
+    {"name": "Previous Address", "description": "", "normalize": ("trim", "collapse_whitespace", "null_placeholders")},
+    {"name": "Organization ID", "description": ""},
+    {"name": "Date Business Established", "description": "", "type": "date"},
+    {"name": "Country of Incorporation", "description": ""},
+    {"name": "State/Province of Organization", "description": ""},
+    {"name": "Resolution Date", "description": "", "type": "date"},
+    {"name": "# of Required Signers", "description": "", "type": "integer"},
+    {"name": "# of Employees", "description": "", "type": "integer"},
+    {"name": "Date Current Ownership Started", "description": "", "type": "date"},
+]
+
+# Field lists offered as templates in the app
+FIELD_TEMPLATES = {
+    "Loan Docs: Address": [
+        {"name": "Address Type", "description": "The classification of the address"},
+        {"name": "Primary Address", "description": "The street address of the customers primary location"},
+        {"name": "City", "description": "The city of the primary address"},
+        {"name": "State/Province", "description": "The state or province for the primary or previous address"},
+        {"name": "Postal Code", "description": "The zip or postal code for the primary or previous address"},
+        {"name": "Country", "description": "The country of the primary or previous address"},
+        {"name": "Primary Contact Number", "description": "The telephone number of the main point of contact",
+         "normalize": ("trim", "null_placeholders", "digits")}
+    ],
+    "Loan Docs: Initial": [
+        {"name": "Company Name", "description": "The official legal name of the entity"},
+        {"name": "Date of Issue", "description": "What is the date the primary identification was issued",
+         "type": "date"},
+        {"name": "Default Currency", "description": "What is the monetary unit used for financial transactions and reporting for the group (eg, US Dollar)"},
+        {"name": "Primary ID Number", "description": "The specific unique identification number"},
+        {"name": "# of Employees", "description": "The total headcount of the business", "type": "integer"}
+    ],
+    "Loan Docs: Full": LOAN_DOC_FIELDS,
+    "Contract Template": [
+        {"name": "contract_number", "description": "Contract ID or number"},
+        {"name": "effective_date", "description": "Contract effective date", "type": "date"},
+        {"name": "expiration_date", "description": "Contract expiration date", "type": "date"},
+        {"name": "parties", "description": "Names of parties involved"},
+        {"name": "contract_value", "description": "Total contract value", "type": "number"},
+        {"name": "terms", "description": "Key terms and conditions"}
+    ],
+}
+
+
+def field_type(field):
+    return field.get('type') or "string"
+
+
+def column_name(field):
+    """Column name of a field: its `column`, or its name as an upper-case identifier."""
+    if field.get('column'):
+        return field['column'].upper()
+    text = field['name'].replace('#', ' num ')
+    column = re.sub(r'[^0-9A-Za-z]+', '_', text).strip('_').upper()
+    if not column or column[0].isdigit():
+        column = f"F_{column}"
+    return column
+
+
+def column_names(fields):
+    """Column names of `fields`, suffixed with _2, _3, ... where they would collide."""
+    names = []
+    for field in fields:
+        column = base = column_name(field)
+        suffix = 2
+        while column in names or column.lower() in KEY_COLUMN_TYPES:
+            column = f"{base}_{suffix}"
+            suffix += 1
+        names.append(column)
+    return names
+
+
+def validate_fields(fields):
+    """Raise ValueError for unknown types or normalization rules."""
+    for field in fields:
+        if field_type(field) not in FIELD_TYPES:
+            raise ValueError(f"Unknown type {field_type(field)!r} for field {field['name']!r}")
+        for rule in field.get('normalize', DEFAULT_NORMALIZE):
+            if rule not in NORMALIZERS:
+                raise ValueError(f"Unknown normalization {rule!r} for field {field['name']!r}")
+
+
+def build_typed_select(fields, source_table, key_columns=("relative_path",), source_column="extract_data"):
+    """SELECT turning each row of `source_table` into key columns plus one typed column per field.
+
+    Three nested levels keep each expression small: the raw answer as text,
+    then the normalization rules, then the type conversion.
+    """
+    validate_fields(fields)
+    columns = column_names(fields)
+    keys = list(key_columns)
+
+    def level(expressions, source):
+        return "SELECT\n    " + ",\n    ".join(keys + expressions) + f"\nFROM {source}"
+
+    # TO_VARCHAR keeps list answers as JSON text where ::STRING would fail
+    raw = level([
+        f"TO_VARCHAR({source_column}['response'][{sql_string(field['name'])}]) AS {column}"
+        for field, column in zip(fields, columns)
+    ], source_table)
+    normalized = level([
+        f"{_normalize(field, column)} AS {column}" for field, column in zip(fields, columns)
+    ], f"(\n{raw}\n)")
+    return level([
+        f"{FIELD_TYPES[field_type(field)][1].format(value=column)}::{FIELD_TYPES[field_type(field)][0]} AS {column}"
+        for field, column in zip(fields, columns)
+    ], f"(\n{normalized}\n)")
+
+
+def _normalize(field, value):
+    for rule in field.get('normalize', DEFAULT_NORMALIZE):
+        value = NORMALIZERS[rule].format(value=value)
+    return value
+
+
+def build_typed_table_statements(fields, table, source_table, dynamic=True, warehouse=None,
+                                 target_lag="1 hour", cluster_by=None, key_columns=("relative_path",)):
+    """SQL statements that create or update the typed table for `fields`.
+
+    With `dynamic`, one CREATE OR REPLACE DYNAMIC TABLE that Snowflake
+    refreshes within `target_lag`. Otherwise a plain table is created if
+    missing, gains a column per new field and is refreshed with a MERGE on
+    relative_path; run the statements again to refresh it. `cluster_by` is a
+    list of column names.
+    """
+    select = build_typed_select(fields, source_table, key_columns)
+    comment = sql_string(f"Typed AI_EXTRACT fields, field set {field_set_id(fields)}")
+    cluster = f"\nCLUSTER BY ({', '.join(cluster_by)})" if cluster_by else ""
+
+    if dynamic:
+        if not warehouse:
+            raise ValueError("A dynamic table needs a warehouse")
+        return [
+            f"CREATE OR REPLACE DYNAMIC TABLE {table}\n"
+            f"TARGET_LAG = {sql_string(target_lag)}\n"
+            f"WAREHOUSE = {warehouse}{cluster}\n"
+            f"COMMENT = {comment}\n"
+            f"AS\n{select}"
+        ]
+
+    if "relative_path" not in key_columns:
+        raise ValueError("A MERGE-maintained table needs relative_path as a key column")
+    typed_columns = [
+        (column, FIELD_TYPES[field_type(field)][0]) for field, column in zip(fields, column_names(fields))
+    ]
+    all_columns = [(column, KEY_COLUMN_TYPES[column]) for column in key_columns] + typed_columns
+    statements = [
+        f"CREATE TABLE IF NOT EXISTS {table} (\n    "
+        + ",\n    ".join(f"{column} {column_type}" for column, column_type in all_columns)
+        + f"\n){cluster}\nCOMMENT = {comment}"
+    ]
+    statements += [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type}"
+        for column, column_type in all_columns
+    ]
+    names = [column for column, _ in all_columns]
+    statements.append(
+        f"MERGE INTO {table} t\nUSING (\n{select}\n) s\n"
+        f"ON t.relative_path = s.relative_path\n"
+        f"WHEN MATCHED THEN UPDATE SET "
+        + ", ".join(f"{name} = s.{name}" for name in names if name != "relative_path")
+        + f"\nWHEN NOT MATCHED THEN INSERT ({', '.join(names)})\n"
+        f"    VALUES ({', '.join(f's.{name}' for name in names)})"
+    )
+    return statements
+
+
+def materialize_typed_table(session, fields, table, source_table, **options):
+    """Run the statements of build_typed_table_statements; returns them."""
+    statements = build_typed_table_statements(fields, table, source_table, **options)
+    for statement in statements:
+        session.sql(statement).collect()
+    return statements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the typed-table SQL for a field template.")
+    parser.add_argument("--template", choices=list(FIELD_TEMPLATES), default="Loan Docs: Full")
+    parser.add_argument("--table", default="pdf_extractor_db.pdf_processing.doc_extract_typed")
+    parser.add_argument("--source", default="pdf_extractor_db.pdf_processing.doc_extract")
+    parser.add_argument("--plain", action="store_true", help="a MERGE-maintained table instead of a dynamic table")
+    parser.add_argument("--warehouse", default="compute_wh")
+    parser.add_argument("--target-lag", default="1 hour")
+    parser.add_argument("--cluster-by", nargs="*", default=None)
+    parser.add_argument("--key-columns", nargs="+", choices=list(KEY_COLUMN_TYPES), default=["relative_path"])
+    args = parser.parse_args(argv)
+
+    statements = build_typed_table_statements(
+        FIELD_TEMPLATES[args.template], args.table, args.source, dynamic=not args.plain,
+        warehouse=args.warehouse, target_lag=args.target_lag, cluster_by=args.cluster_by,
+        key_columns=tuple(args.key_columns),
+    )
+    print(";\n\n".join(statements) + ";")
+
+
+if __name__ == "__main__":
+    main()
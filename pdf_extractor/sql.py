@@ -0,0 +1,77 @@
+"""
+SQL building blocks shared by the app and the headless pipelines.
+"""
+
+import json
+from collections import namedtuple
+
+# AI_EXTRACT accepts at most this many questions in a single responseFormat
+MAX_FIELDS_PER_CALL = 100
+
+
+def sql_string(value):
+    """Quote a Python value as a Snowflake string literal."""
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def field_question(field):
+    """The question AI_EXTRACT answers for a field: its description, or its name."""
+    return field['description'] or field['name']
+
+
+# SQL text with qmark (?) placeholders and the values bound to them, in order.
+# Documents and field specs travel as bind values, so the SQL text stays
+# small whatever the document length and nothing in them needs escaping.
+BoundQuery = namedtuple("BoundQuery", ["text", "params"])
+
+
+def bound(query):
+    """`query` as a BoundQuery; plain SQL text has no parameters."""
+    return query if isinstance(query, BoundQuery) else BoundQuery(query, ())
+
+
+def text_source(text):
+    """AI_EXTRACT input argument for document text, passed as a bind value."""
+    return BoundQuery("text => ?", (text,))
+
+
+def file_source(stage_name, relative_path):
+    """AI_EXTRACT input argument for a staged file."""
+    return BoundQuery(f"file => TO_FILE({sql_string('@' + stage_name)}, {sql_string(relative_path)})", ())
+
+
+def bind_response_format(fields):
+    """responseFormat as OBJECT_CONSTRUCT with each field name and question bound."""
+    text = "OBJECT_CONSTRUCT(" + ", ".join("?, ?" for _ in fields) + ")"
+    return BoundQuery(text, tuple(value for field in fields for value in (field['name'], field_question(field))))
+
+
+def build_response_format(fields):
+    """responseFormat as OBJECT_CONSTRUCT of escaped literals, for statements run without binds."""
+    pairs = ", ".join(
+        f"{sql_string(field['name'])}, {sql_string(field_question(field))}"
+        for field in fields
+    )
+    return f"OBJECT_CONSTRUCT({pairs})"
+
+
+def parse_response(raw):
+    """Return the `response` object of an AI_EXTRACT result as a dict."""
+    if raw is None:
+        return {}
+    data = json.loads(raw) if isinstance(raw, str) else raw
+    response = data.get('response') if isinstance(data, dict) else None
+    return response if isinstance(response, dict) else {}
+
+
+def format_error(error):
+    """Short error marker stored in a result cell."""
+    error_msg = str(error)
+    if len(error_msg) > 100:
+        error_msg = error_msg[:100] + "..."
+    return f"[Error: {error_msg}]"
+
+
+def is_error_value(value):
+    """True for the error markers written by format_error()."""
+    return isinstance(value, str) and value.startswith("[Error:")
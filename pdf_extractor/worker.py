@@ -0,0 +1,355 @@
+"""
+Headless, sharded batch extraction with a resumable checkpoint manifest.
+
+Runs the same set-based extraction as the app's batch mode without
+Streamlit. A stage's PDFs are split into shards by a stable hash of their
+relative path; each shard runs in its own process (and session), so one
+machine can run a process pool and several machines can each take a slice
+of the shards. Every finished file is appended to the shard's manifest in
+`--output-dir`, and a rerun with the same output directory skips files
+already done with the same md5 and field list. Run from the repository
+root:
+
+    python -m pdf_extractor.worker --stage pdf_upload_stage --processes 4
+    python -m pdf_extractor.worker --stage pdf_upload_stage --shard-count 3 --shard-index 0
+    python -m pdf_extractor.worker --local-docs 500 --processes 4 --output-dir /tmp/worker
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from pdf_extractor.backends import SnowflakeBackend
+from pdf_extractor.catalog import FileCatalog
+from pdf_extractor.execution import QueryRunner, RetryPolicy
+from pdf_extractor.extraction import BATCH_FILES_PER_QUERY, needs_server_side_encryption, run_batch_extract
+from pdf_extractor.incremental import field_set_id
+from pdf_extractor.instrumentation import RunTrace, ensure_run_log_table, save_run_log
+from pdf_extractor.results_table import ensure_results_table, write_results
+from pdf_extractor.schema import FIELD_TEMPLATES
+from pdf_extractor.sql import is_error_value
+
+# Files listed per directory-table query while building the work list
+LIST_PAGE_SIZE = 5000
+
+
+def shard_of(relative_path, shard_count):
+    """Stable shard number of a file; the same on every machine and run."""
+    digest = hashlib.md5(relative_path.encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % shard_count
+
+
+def list_stage_files(session, stage_name, prefix="", name_pattern=""):
+    """All PDFs on the stage matching the filters, ordered by relative path."""
+    catalog = FileCatalog(stage_name)
+    filters = FileCatalog.make_filters(prefix, name_pattern)
+    files = []
+    page = 0
+    while True:
+        rows = catalog.page(session, filters, page, LIST_PAGE_SIZE)
+        files.extend(rows)
+        if len(rows) < LIST_PAGE_SIZE:
+            return files
+        page += 1
+
+
+def manifest_path(output_dir, shard_index, shard_count):
+    return os.path.join(output_dir, f"manifest-{shard_index:04d}-of-{shard_count:04d}.jsonl")
+
+
+def open_for_append(path):
+    """Open a JSON-lines file for appending, starting on a fresh line after a partial write."""
+    handle = open(path, "a+", encoding="utf-8")
+    if handle.tell():
+        handle.seek(handle.tell() - 1)
+        if handle.read(1) != "\n":
+            handle.write("\n")
+    return handle
+
+
+def load_manifest(output_dir):
+    """Latest manifest entry per relative path, read from every shard's manifest.
+
+    Reading all of them lets a rerun use a different shard layout.
+    """
+    entries = {}
+    for path in sorted(glob.glob(os.path.join(output_dir, "manifest-*.jsonl"))):
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                # A run killed mid-write can leave a partial last line
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                previous = entries.get(entry['relative_path'])
+                if previous is None or entry['finished_at'] >= previous['finished_at']:
+                    entries[entry['relative_path']] = entry
+    return entries
+
+
+def is_finished(entry, file, set_id, retry_failed=True):
+    """True when the manifest says `file` needs no more work for this field list."""
+    if entry is None or entry.get('field_set_id') != set_id:
+        return False
+    if file.get('md5') and entry.get('md5') and entry['md5'] != file['md5']:
+        return False
+    return entry['status'] == "done" or (entry['status'] == "failed" and not retry_failed)
+
+
+class ShardMetrics:
+    """Throughput counters of one shard."""
+
+    def __init__(self, shard_index, shard_count, planned, skipped):
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.planned = planned
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.missing = 0
+        self.fields = 0
+        self.started = time.perf_counter()
+        self.elapsed_s = 0.0
+
+    def add(self, status, field_count):
+        if status == "done":
+            self.done += 1
+            self.fields += field_count
+        elif status == "failed":
+            self.failed += 1
+        else:
+            self.missing += 1
+        self.elapsed_s = time.perf_counter() - self.started
+
+    def summary(self, queries=0, sql_bytes=0, breakdown=()):
+        processed = self.done + self.failed
+        minutes = self.elapsed_s / 60 if self.elapsed_s else 0
+        return {
+            "shard": self.shard_index,
+            "shard_count": self.shard_count,
+            "planned": self.planned,
+            "skipped": self.skipped,
+            "done": self.done,
+            "failed": self.failed,
+            "missing": self.missing,
+            "fields": self.fields,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "files_per_min": round(processed / minutes, 1) if minutes else 0.0,
+            "fields_per_min": round(self.fields / minutes, 1) if minutes else 0.0,
+            "queries": queries,
+            "sql_kb": round(sql_bytes / 1024, 1),
+            "stages": list(breakdown),
+        }
+
+    def progress_line(self):
+        processed = self.done + self.failed + self.missing
+        rate = 60 * (self.done + self.failed) / self.elapsed_s if self.elapsed_s else 0.0
+        return (f"[shard {self.shard_index}/{self.shard_count}] {processed}/{self.planned} files, "
+                f"{self.failed} failed, {rate:.1f} files/min")
+
+
+def open_backend(options, run_id):
+    """The session a shard works with: Snowflake, or the local fake with `--local-docs`."""
+    trace = RunTrace(run_id)
+    if options['local_docs']:
+        from pdf_extractor.local_cortex import LocalCortexBackend, make_documents
+
+        field_names = [field['name'] for field in options['fields']]
+        docs, _ = make_documents(options['local_docs'], options['local_chars'], field_names)
+        backend = LocalCortexBackend(docs, stage_name=options['stage'], latency=options['local_latency'])
+        backend.trace = trace
+        return backend
+
+    from snowflake.snowpark import Session
+
+    builder = Session.builder
+    if options['connection']:
+        builder = builder.config("connection_name", options['connection'])
+    return SnowflakeBackend(builder.create(), trace)
+
+
+def run_shard(options, shard_index, shard_count, run_id):
+    """Extract one shard's pending files, checkpointing after every step; returns its metrics."""
+    session = open_backend(options, run_id)
+    fields = options['fields']
+    set_id = field_set_id(fields)
+
+    # The stage is refreshed once here rather than before every step
+    session.sql(f"ALTER STAGE {options['stage']} REFRESH").collect()
+    files = [
+        file for file in list_stage_files(session, options['stage'], options['prefix'], options['pattern'])
+        if shard_of(file['relative_path'], shard_count) == shard_index
+    ]
+    manifest = load_manifest(options['output_dir'])
+    pending = [
+        file for file in files
+        if not is_finished(manifest.get(file['relative_path']), file, set_id, options['retry_failed'])
+    ]
+    metrics = ShardMetrics(shard_index, shard_count, len(pending), len(files) - len(pending))
+
+    runner = QueryRunner(session, options['concurrency'], RetryPolicy(options['max_attempts']))
+    if options['write_back']:
+        ensure_results_table(session)
+
+    # One step is as many file groups as run at once, so at most that much work is redone after a crash
+    step_size = BATCH_FILES_PER_QUERY * options['concurrency']
+    engine = options['engine']
+    results_path = os.path.join(options['output_dir'], f"results-{shard_index:04d}-of-{shard_count:04d}.ndjson")
+    with open_for_append(manifest_path(options['output_dir'], shard_index, shard_count)) as manifest_file, \
+            open_for_append(results_path) as results_file:
+        for start in range(0, len(pending), step_size):
+            step_files = pending[start:start + step_size]
+            results = run_batch_extract(
+                runner, options['stage'], fields, engine,
+                relative_paths=[file['relative_path'] for file in step_files],
+                parse_form=options['parse_form'], refresh=False,
+            )
+            reparsed = set()
+            if engine == "direct":
+                reparsed = {file['relative_path'] for file, values in results if needs_server_side_encryption(values)}
+            if reparsed:
+                # The stage is not SNOWFLAKE_SSE encrypted: parse these files instead, and every file after them
+                engine = "parse"
+                print(f"[shard {shard_index}/{shard_count}] direct file needs a SNOWFLAKE_SSE stage; "
+                      f"switching to --engine parse", flush=True)
+                results = [
+                    (file, values) for file, values in results if file['relative_path'] not in reparsed
+                ] + run_batch_extract(
+                    runner, options['stage'], fields, engine, relative_paths=sorted(reparsed),
+                    parse_form=options['parse_form'], refresh=False,
+                )
+            returned = {file['relative_path']: (file, values) for file, values in results}
+
+            rows = []
+            entries = []
+            for file in step_files:
+                path = file['relative_path']
+                if path not in returned:
+                    # Removed from the stage since it was listed
+                    status, md5 = "missing", file.get('md5')
+                else:
+                    result_file, values = returned[path]
+                    failed = any(is_error_value(value) for value in values.values())
+                    status, md5 = ("failed" if failed else "done"), result_file['md5'] or file.get('md5')
+                    rows.append({'relative_path': path, **values})
+                    results_file.write(json.dumps(
+                        {'relative_path': path, 'md5': md5, 'run_id': run_id, 'status': status, **values},
+                        default=str,
+                    ) + "\n")
+                entries.append({
+                    'relative_path': path, 'md5': md5, 'status': status, 'field_set_id': set_id,
+                    'run_id': run_id, 'finished_at': time.time(),
+                })
+                metrics.add(status, len(fields))
+
+            # Results go to disk, and to the results table, before the manifest says the files are
+            # done; if the write-back fails the step's files stay pending and the rerun writes them
+            results_file.flush()
+            os.fsync(results_file.fileno())
+            if options['write_back'] and rows:
+                write_results(session, pd.DataFrame(rows), run_id)
+            for entry in entries:
+                manifest_file.write(json.dumps(entry) + "\n")
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+            print(metrics.progress_line(), flush=True)
+
+    if options['run_log']:
+        ensure_run_log_table(session)
+        save_run_log(session, session.trace)
+    queries, sql_bytes = session.stats.snapshot()
+    summary = metrics.summary(queries, sql_bytes, session.trace.breakdown())
+    if options['local_docs']:
+        session.pool.shutdown()
+    return summary
+
+
+def combine_metrics(summaries, elapsed_s):
+    """Totals over shards; rates use wall-clock time, since shards run side by side."""
+    totals = {
+        name: sum(summary[name] for summary in summaries)
+        for name in ("planned", "skipped", "done", "failed", "missing", "fields", "queries")
+    }
+    minutes = elapsed_s / 60 if elapsed_s else 0
+    totals.update({
+        "shards": len(summaries),
+        "elapsed_s": round(elapsed_s, 3),
+        "files_per_min": round((totals['done'] + totals['failed']) / minutes, 1) if minutes else 0.0,
+        "fields_per_min": round(totals['fields'] / minutes, 1) if minutes else 0.0,
+    })
+    return totals
+
+
+def load_fields(options):
+    if options['fields_file']:
+        with open(options['fields_file'], encoding="utf-8") as handle:
+            return json.load(handle)
+    return FIELD_TEMPLATES[options['template']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stage", default="pdf_upload_stage")
+    parser.add_argument("--prefix", default="", help="only files whose relative path starts with this")
+    parser.add_argument("--pattern", default="", help="only files whose relative path matches this ILIKE pattern")
+    parser.add_argument("--template", choices=list(FIELD_TEMPLATES), default="Loan Docs: Full")
+    parser.add_argument("--fields-file", help="JSON list of {name, description} fields instead of a template")
+    parser.add_argument("--engine", choices=["direct", "parse"], default="direct")
+    parser.add_argument("--parse-form", type=int, default=0, help="PARSE_DOCUMENT call form for --engine parse")
+    parser.add_argument("--shard-count", type=int, default=1, help="worker instances sharing the stage")
+    parser.add_argument("--shard-index", type=int, default=0, help="this instance's slot, 0-based")
+    parser.add_argument("--processes", type=int, default=1, help="shards this instance runs side by side")
+    parser.add_argument("--concurrency", type=int, default=4, help="queries in flight per process")
+    parser.add_argument("--max-attempts", type=int, default=4)
+    parser.add_argument("--output-dir", default="worker_output", help="manifests, results and metrics")
+    parser.add_argument("--skip-failed", dest="retry_failed", action="store_false",
+                        help="do not retry files that failed in an earlier run")
+    parser.add_argument("--write-back", action="store_true", help="also append results to AI_EXTRACT_RESULTS")
+    parser.add_argument("--run-log", action="store_true", help="save per-query timings to AI_EXTRACT_RUN_LOG")
+    parser.add_argument("--run-id", default=None, help="defaults to a new id shared by all shards of this run")
+    parser.add_argument("--connection", default=None, help="connection name from connections.toml")
+    parser.add_argument("--local-docs", type=int, default=0, help="run against this many fake documents")
+    parser.add_argument("--local-chars", type=int, default=20000)
+    parser.add_argument("--local-latency", type=float, default=0.02)
+    args = parser.parse_args(argv)
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+
+    options = vars(args)
+    options['fields'] = load_fields(options)
+    run_id = args.run_id or uuid.uuid4().hex
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Each instance owns `processes` consecutive shards of the whole layout
+    shard_count = args.shard_count * args.processes
+    shards = range(args.shard_index * args.processes, (args.shard_index + 1) * args.processes)
+    started = time.perf_counter()
+    if args.processes == 1:
+        summaries = [run_shard(options, shards[0], shard_count, run_id)]
+    else:
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            futures = [pool.submit(run_shard, options, shard, shard_count, run_id) for shard in shards]
+            summaries = [future.result() for future in futures]
+    totals = combine_metrics(summaries, time.perf_counter() - started)
+
+    metrics_path = os.path.join(args.output_dir, f"metrics-{run_id}-{args.shard_index:04d}.json")
+    with open(metrics_path, "w", encoding="utf-8") as handle:
+        json.dump({"run_id": run_id, "totals": totals, "shards": summaries}, handle, indent=2)
+    print(
+        f"run {run_id}: {totals['done']} done, {totals['failed']} failed, {totals['skipped']} skipped, "
+        f"{totals['missing']} missing in {totals['elapsed_s']:.1f}s "
+        f"({totals['files_per_min']} files/min, {totals['fields_per_min']} fields/min, "
+        f"{totals['queries']} queries); metrics in {metrics_path}"
+    )
+    return totals
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Streamlit views of the PDF Data Extractor; SiS_setup.py draws them in order.
+"""
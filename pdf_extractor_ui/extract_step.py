@@ -0,0 +1,423 @@
+"""
+Step 3: single-document and batch extraction, and the panels describing the last run.
+"""
+
+import time
+
+import pandas as pd
+import streamlit as st
+
+from pdf_extractor.chunking import extract_fields_from_chunks, split_chunks
+from pdf_extractor.execution import QueryRunner, RetryPolicy
+from pdf_extractor.extraction import extract_fields, needs_server_side_encryption, run_batch_extract
+from pdf_extractor.instrumentation import RUN_LOG_TABLE, ensure_run_log_table, save_run_log, step
+from pdf_extractor.parsing import (
+    ensure_parse_cache,
+    file_content_key,
+    load_cached_parse,
+    parse_document,
+    save_capabilities,
+    store_cached_parse,
+)
+from pdf_extractor.sql import file_source, text_source
+from pdf_extractor_ui.state import store_results
+
+
+def finish_run_trace(session, description, log_to_table):
+    """Keep this run's query timings for the breakdown panel, optionally appending them to the run log."""
+    trace = session.trace
+    st.session_state.last_run_trace = (description, trace, log_to_table)
+    if log_to_table:
+        try:
+            with step(session, "run_log"):
+                if not st.session_state.run_log_ready:
+                    ensure_run_log_table(session)
+                    st.session_state.run_log_ready = True
+                save_run_log(session, trace)
+        except Exception as e:
+            st.session_state.last_run_trace = (description, trace, False)
+            st.warning(f"Could not write run log: {str(e)[:200]}")
+
+
+def render_extract_step(session, config):
+    """Draw Step 3 and run extractions when asked."""
+    stage_name = config['stage_name']
+    capability_key = config['capability_key']
+    remember_capabilities = config['remember_capabilities']
+    known_parse_form = config['known_parse_form']
+    extraction_engine = config['extraction_engine']
+    extraction_mode = config['extraction_mode']
+    use_chunking = config['use_chunking']
+    chunks_per_call = config['chunks_per_call']
+    max_chunk_rounds = config['max_chunk_rounds']
+    max_concurrency = config['max_concurrency']
+    max_attempts = config['max_attempts']
+    use_parse_cache = config['use_parse_cache']
+    use_result_cache = config['use_result_cache']
+    result_cache = config['result_cache']
+    log_run_timings = config['log_run_timings']
+    
+    st.header("🚀 Step 3: Extract Data")
+
+    # Direct file needs a SNOWFLAKE_SSE stage; stages found without it are parsed instead
+    if extraction_engine == "direct" and stage_name in st.session_state.parse_only_stages:
+        extraction_engine = "parse"
+        st.caption(f"ℹ️ {stage_name} is not server-side encrypted, so files are parsed before extraction")
+
+    can_extract = (
+        st.session_state.selected_file is not None 
+        and len(st.session_state.extraction_fields) > 0
+    )
+
+    if not st.session_state.extraction_fields:
+        st.warning("⚠️ Please define at least one extraction field in the sidebar.")
+    elif st.session_state.selected_file is None:
+        st.warning("⚠️ Please select a PDF file from the list above.")
+    else:
+        st.success("✅ Ready to extract data!")
+        
+        # Show what will be extracted
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Selected File", st.session_state.selected_file['display_name'])
+        with col2:
+            st.metric("Fields to Extract", len(st.session_state.extraction_fields))
+
+    if st.button("🚀 Extract Data from PDF", type="primary", disabled=not can_extract):
+        with st.spinner("Extracting data from PDF... This may take a moment."):
+            try:
+                selected_file = st.session_state.selected_file
+                selected_file_name = selected_file['display_name']
+                fields = st.session_state.extraction_fields
+                doc_key = file_content_key(selected_file)
+                cache_mode = f"{extraction_engine}/{extraction_mode}" + ("/chunked" if use_chunking else "")
+                
+                st.session_state.last_error_summary = None
+                
+                # Fill unchanged fields from earlier runs, only extract the rest
+                extracted_values = {}
+                if use_result_cache:
+                    extracted_values = result_cache.lookup(doc_key, fields, cache_mode)
+                pending_fields = [field for field in fields if field['name'] not in extracted_values]
+                st.session_state.last_cache_stats = (len(extracted_values), len(pending_fields))
+                
+                if not pending_fields:
+                    st.info("♻️ All fields answered from the result cache")
+                elif extraction_engine == "direct":
+                    # AI_EXTRACT reads the staged file itself; nothing is parsed into the app
+                    source_arg = file_source(stage_name, st.session_state.selected_file['relative_path'])
+                else:
+                    parsed_text = None
+                    
+                    if use_parse_cache:
+                        try:
+                            if not st.session_state.parse_cache_ready:
+                                ensure_parse_cache(session)
+                                st.session_state.parse_cache_ready = True
+                            parsed_text = load_cached_parse(session, doc_key, st.session_state.parse_memo)
+                        except Exception as e:
+                            st.warning(f"Parse cache unavailable, parsing directly: {str(e)[:200]}")
+                    
+                    if parsed_text is not None:
+                        st.info(f"♻️ Using cached parse ({len(parsed_text)} characters)")
+                    else:
+                        # Parse the document
+                        st.info("🔍 Parsing PDF document with AI...")
+                        parsed_text, parse_form, parse_errors = parse_document(
+                            session, stage_name, selected_file['relative_path'], known_parse_form,
+                            RetryPolicy(max_attempts)
+                        )
+                        
+                        # Remember the working form so later parses go straight to it
+                        if parse_form is not None and parse_form != known_parse_form:
+                            capabilities = st.session_state.capabilities.setdefault(capability_key, {
+                                'parse_form': None,
+                                'functions': {},
+                                'probed_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+                            })
+                            capabilities['parse_form'] = parse_form
+                            capabilities['functions']['PARSE_DOCUMENT'] = True
+                            if remember_capabilities:
+                                try:
+                                    save_capabilities(session, *capability_key, capabilities)
+                                except Exception as e:
+                                    st.warning(f"Could not save probe results: {str(e)[:200]}")
+                        
+                        if parsed_text is None:
+                            # All approaches failed
+                            st.error(f"Error parsing document with all methods")
+                            for idx, (label, error) in enumerate(parse_errors):
+                                st.error(f"Method {idx + 1} ({label}) error: {error[:200]}")
+                            
+                            with st.expander("🔍 Troubleshooting Information"):
+                                st.markdown("""
+                                **Possible causes:**
+                                1. PARSE_DOCUMENT function signature changed in your Snowflake version
+                                2. File path format is incorrect
+                                3. Cortex AI features not fully available
+                                
+                                **Try these steps:**
+                                1. Verify file is in stage:
+                                ```sql
+                                LIST @{stage};
+                                ```
+                                
+                                2. Test PARSE_DOCUMENT directly in SQL:
+                                ```sql
+                                SELECT SNOWFLAKE.CORTEX.PARSE_DOCUMENT(
+                                    BUILD_SCOPED_FILE_URL('@{stage}', '{file}')
+                                );
+                                ```
+                                
+                                3. Check Cortex AI availability:
+                                ```sql
+                                SELECT SNOWFLAKE.CORTEX.COMPLETE('llama2-70b-chat', 'test');
+                                ```
+                                """.format(stage=stage_name, file=selected_file_name))
+                            st.stop()
+                        
+                        st.info(f"✓ Document parsed successfully ({len(parsed_text)} characters)")
+                        
+                        if use_parse_cache and st.session_state.parse_cache_ready:
+                            try:
+                                store_cached_parse(
+                                    session, doc_key, selected_file, parsed_text, st.session_state.parse_memo
+                                )
+                            except Exception as e:
+                                st.warning(f"Could not cache parse result: {str(e)[:200]}")
+                    
+                    if parsed_text is None:
+                        st.error("Failed to parse document")
+                        st.stop()
+                    
+                    if use_chunking:
+                        chunks = split_chunks(parsed_text)
+                        st.info(f"🧩 Split into {len(chunks)} chunk(s) for relevance ranking")
+                    else:
+                        # Truncate parsed text if too long; it is sent once per call as a bind value
+                        parsed_text_truncated = parsed_text[:100000] if len(parsed_text) > 100000 else parsed_text
+                        source_arg = text_source(parsed_text_truncated)
+                
+                # Now extract the fields
+                progress_bar = st.progress(0)
+                status_text = st.empty()
+                
+                if pending_fields:
+                    st.info(
+                        f"🤖 Extracting {len(pending_fields)} field(s) with AI "
+                        f"({len(extracted_values)} from cache)..."
+                    )
+                    
+                    def show_progress(done, total, label):
+                        progress_bar.progress(done / total)
+                        if label:
+                            status_text.text(f"Completed: {label}")
+                    
+                    runner = QueryRunner(session, max_concurrency, RetryPolicy(max_attempts))
+                    if extraction_engine == "parse" and use_chunking:
+                        new_values = extract_fields_from_chunks(
+                            runner,
+                            chunks,
+                            pending_fields,
+                            mode=extraction_mode,
+                            on_progress=show_progress,
+                            chunks_per_call=chunks_per_call,
+                            max_rounds=max_chunk_rounds
+                        )
+                    else:
+                        new_values = extract_fields(
+                            runner,
+                            source_arg,
+                            pending_fields,
+                            mode=extraction_mode,
+                            on_progress=show_progress
+                        )
+                    if extraction_engine == "direct" and needs_server_side_encryption(new_values):
+                        # The stage is not SNOWFLAKE_SSE encrypted: parse the file instead, now and on later runs
+                        st.session_state.parse_only_stages.add(stage_name)
+                        st.info("🔁 Direct file needs a SNOWFLAKE_SSE stage; parsing the document instead...")
+                        cache_mode = "parse/batched"
+                        [(_, new_values)] = run_batch_extract(
+                            runner, stage_name, pending_fields, "parse",
+                            relative_paths=[selected_file['relative_path']],
+                            parse_form=known_parse_form or 0, refresh=False
+                        )
+                    st.session_state.last_error_summary = runner.errors or None
+                    if use_result_cache:
+                        result_cache.store(doc_key, pending_fields, cache_mode, new_values)
+                    extracted_values.update(new_values)
+                
+                progress_bar.progress(1.0)
+                status_text.text("✅ Extraction complete!")
+                
+                # Store results in session state, in field order
+                new_data = pd.DataFrame([
+                    {'relative_path': selected_file['relative_path'],
+                     **{field['name']: extracted_values.get(field['name']) for field in fields}}
+                ])
+                store_results(new_data, session.trace.run_id)
+                
+                finish_run_trace(session, f"Extraction of {selected_file_name}", log_run_timings)
+                st.success("✅ Data extraction complete!")
+                st.balloons()
+                st.experimental_rerun()
+                
+            except Exception as e:
+                finish_run_trace(session, f"Failed extraction of {st.session_state.selected_file['display_name']}", log_run_timings)
+                st.error(f"❌ Error during extraction: {str(e)}")
+                with st.expander("🔍 View Full Error Details"):
+                    st.exception(e)
+                    st.info("💡 Tips:")
+                    st.markdown("""
+                    - Ensure your Snowflake account supports Cortex AI
+                    - Verify you have permissions to use PARSE_DOCUMENT and EXTRACT_ANSWER
+                    - Check that the stage exists and files are accessible
+                    - Try with a smaller PDF file first
+                    """)
+
+    # Retries and failures from the last run
+    if st.session_state.last_error_summary:
+        summary = st.session_state.last_error_summary
+        with st.expander(
+            f"⚠️ Last run: {sum(summary.retries.values())} retried, "
+            f"{sum(summary.failures.values())} failed"
+        ):
+            for kind in ("throttled", "transient", "permanent"):
+                if summary.retries[kind] or summary.failures[kind]:
+                    st.write(f"**{kind.title()}:** {summary.retries[kind]} retried, {summary.failures[kind]} failed")
+                    if kind in summary.samples:
+                        st.caption(summary.samples[kind])
+            if summary.min_concurrency:
+                st.caption(f"Concurrency was lowered to {summary.min_concurrency} while Cortex was throttling")
+
+    # Where the time of the last run went, stage by stage
+    if st.session_state.last_run_trace:
+        run_description, run_trace, run_logged = st.session_state.last_run_trace
+        stage_breakdown = run_trace.breakdown()
+        with st.expander(
+            f"⏱️ Last run: {run_trace.elapsed():.1f}s, "
+            f"{sum(stage['queries'] for stage in stage_breakdown)} queries"
+        ):
+            st.caption(f"{run_description} · run id {run_trace.run_id}")
+            st.dataframe(
+                pd.DataFrame(stage_breakdown).round({'seconds': 2, 'slowest_s': 2}),
+                use_container_width=True
+            )
+            st.caption("Concurrent queries overlap, so stage seconds can add up to more than the run took.")
+            
+            st.markdown("**Slowest queries**")
+            st.dataframe(
+                pd.DataFrame([
+                    {'stage': event.stage, 'label': event.label, 'seconds': round(event.duration_s, 2),
+                     'input_chars': event.input_chars, 'outcome': event.outcome,
+                     'attempt': event.attempt + 1, 'query_id': event.query_id}
+                    for event in run_trace.slowest()
+                ]),
+                use_container_width=True
+            )
+            if run_logged:
+                st.caption(f"Logged to {RUN_LOG_TABLE}; join on query_id with SNOWFLAKE.ACCOUNT_USAGE views")
+
+    # Batch extraction over many staged files in one query
+    with st.expander("📚 Batch Extraction (many PDFs in one query)"):
+        st.info(
+            "Extract the current fields from many PDFs with a single set-based AI_EXTRACT "
+            "statement over the stage's directory table. Snowflake processes the files in parallel."
+        )
+        
+        batch_selection = st.radio("Select files by", ["Pick files", "Name pattern"], horizontal=True)
+        batch_paths = None
+        batch_pattern = None
+        if batch_selection == "Pick files":
+            batch_paths = st.multiselect(
+                "PDF files (from the current page of Step 2)",
+                [f['relative_path'] for f in st.session_state.available_files]
+            )
+        else:
+            batch_pattern = st.text_input(
+                "Relative path pattern",
+                value="%.pdf",
+                help="A LIKE pattern matched case-insensitively against relative_path, e.g. loans/2024_%"
+            )
+        
+        st.session_state.keep_results = st.checkbox(
+            "Add to current results (keep earlier rows)",
+            value=st.session_state.keep_results
+        )
+        
+        can_batch = bool(st.session_state.extraction_fields) and bool(batch_paths or batch_pattern)
+        if st.button("🚀 Extract Batch", disabled=not can_batch):
+            with st.spinner("Running batch extraction... This may take a while for many files."):
+                try:
+                    fields = st.session_state.extraction_fields
+                    cache_mode = f"{extraction_engine}/batched"
+                    
+                    # Picked files whose every field is already cached need no model call
+                    rows = []
+                    if batch_paths is not None and use_result_cache:
+                        files_by_path = {f['relative_path']: f for f in st.session_state.available_files}
+                        remaining = []
+                        for path in batch_paths:
+                            cached = result_cache.lookup(file_content_key(files_by_path[path]), fields, cache_mode)
+                            if len(cached) == len(fields):
+                                rows.append({'relative_path': path, **cached})
+                            else:
+                                remaining.append(path)
+                        batch_paths = remaining
+                    
+                    if batch_paths is None or batch_paths:
+                        batch_progress = st.progress(0)
+                        batch_status = st.empty()
+                        
+                        def show_batch_progress(done, total, label):
+                            batch_progress.progress(done / total)
+                            batch_status.text(f"Completed {label}")
+                        
+                        runner = QueryRunner(session, max_concurrency, RetryPolicy(max_attempts))
+                        results = run_batch_extract(
+                            runner, stage_name, fields, extraction_engine,
+                            relative_paths=batch_paths, pattern=batch_pattern,
+                            parse_form=known_parse_form or 0, on_progress=show_batch_progress
+                        )
+                        reparsed = set()
+                        if extraction_engine == "direct":
+                            reparsed = {
+                                file['relative_path'] for file, values in results
+                                if needs_server_side_encryption(values)
+                            }
+                        if reparsed:
+                            # The stage is not SNOWFLAKE_SSE encrypted: parse these files instead, now and on later runs
+                            st.session_state.parse_only_stages.add(stage_name)
+                            st.info(f"🔁 Direct file needs a SNOWFLAKE_SSE stage; parsing {len(reparsed)} file(s) instead...")
+                            results = [
+                                (file, values) for file, values in results if file['relative_path'] not in reparsed
+                            ] + run_batch_extract(
+                                runner, stage_name, fields, "parse", relative_paths=sorted(reparsed),
+                                parse_form=known_parse_form or 0, on_progress=show_batch_progress, refresh=False
+                            )
+                        st.session_state.last_error_summary = runner.errors or None
+                        for file, values in results:
+                            # Files of a failed group carry no md5 and only error values
+                            if use_result_cache and file['md5']:
+                                result_cache.store(
+                                    file_content_key(file), fields,
+                                    "parse/batched" if file['relative_path'] in reparsed else cache_mode, values
+                                )
+                            rows.append({'relative_path': file['relative_path'], **values})
+                    
+                    finish_run_trace(session, f"Batch extraction of {len(rows)} file(s)", log_run_timings)
+                    if not rows:
+                        st.warning("⚠️ No PDF files matched the selection.")
+                    else:
+                        new_data = pd.DataFrame(rows).sort_values('relative_path')
+                        store_results(new_data, session.trace.run_id)
+                        st.success(f"✅ Extracted {len(rows)} file(s)")
+                        st.experimental_rerun()
+                
+                except Exception as e:
+                    finish_run_trace(session, "Failed batch extraction", log_run_timings)
+                    st.error(f"❌ Error during batch extraction: {str(e)}")
+                    st.info(
+                        f"💡 Batch extraction needs a directory table on the stage: "
+                        f"ALTER STAGE {stage_name} SET DIRECTORY = (ENABLE = TRUE);"
+                    )
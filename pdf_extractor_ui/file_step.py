@@ -0,0 +1,107 @@
+"""
+Steps 1 and 2: upload instructions and the paged, filtered file picker.
+"""
+
+import streamlit as st
+
+from pdf_extractor.catalog import CATALOG_PAGE_SIZE, FileCatalog
+from pdf_extractor.instrumentation import step
+
+
+def render_file_step(session, config):
+    """Draw the upload help and the file picker; sets st.session_state.selected_file."""
+    stage_name = config['stage_name']
+    
+    st.header("📁 Step 1: Upload PDF to Stage")
+
+    st.info("""
+    **To upload PDFs to the stage, use one of these methods:**
+
+    **Option A: Via Snowsight UI**
+    1. Navigate to: Data → PDF_EXTRACTOR_DB → PDF_PROCESSING → Stages → {stage_name}
+    2. Click "Upload Files"
+    3. Select your PDF(s)
+
+    **Option B: Via SQL**
+    ```sql
+    PUT file:///path/to/your/file.pdf @{stage_name} AUTO_COMPRESS=FALSE;
+    ```
+
+    After uploading, click "🔄 Refresh File List" in the sidebar.
+    """.format(stage_name=stage_name))
+
+    st.markdown("---")
+
+    # Step 2: List available files
+    st.header("📋 Step 2: Select PDF File")
+
+    # The catalog pages through the stage's directory table instead of listing every file
+    catalog = st.session_state.file_catalog
+    if catalog is None or catalog.stage_name != stage_name:
+        catalog = st.session_state.file_catalog = FileCatalog(stage_name)
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        filter_prefix = st.text_input("Folder prefix", help="Only files whose relative path starts with this")
+    with col2:
+        filter_pattern = st.text_input("Name pattern", help="A LIKE pattern, e.g. %loan%")
+    with col3:
+        filter_min_kb = st.number_input("Min size (KB)", min_value=0, value=0)
+    with col4:
+        filter_max_kb = st.number_input("Max size (KB, 0 = any)", min_value=0, value=0)
+    filter_since = None
+    if st.checkbox("Only files modified since"):
+        filter_since = st.date_input("Modified since")
+    file_filters = FileCatalog.make_filters(
+        filter_prefix, filter_pattern, filter_min_kb * 1024, filter_max_kb * 1024, filter_since
+    )
+
+    st.session_state.available_files = []
+    matching_files = 0
+    try:
+        with step(session, "catalog"):
+            catalog.ensure_stage(session)
+            if st.session_state.catalog_refresh_requested:
+                st.session_state.catalog_refresh_requested = False
+                if catalog.refresh(session):
+                    st.info("🆕 Files changed since the last refresh; the list was reloaded")
+            
+            matching_files = catalog.count(session, file_filters)
+            page_count = max(1, (matching_files + CATALOG_PAGE_SIZE - 1) // CATALOG_PAGE_SIZE)
+            page_number = 1
+            if page_count > 1:
+                page_number = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1)
+            st.session_state.available_files = catalog.page(session, file_filters, page_number - 1)
+        
+    except Exception as e:
+        st.error(f"Error listing files: {str(e)}")
+        st.info(f"💡 Make sure the stage '{stage_name}' exists, has a directory table and contains PDF files")
+
+    # Display available files
+    if st.session_state.available_files:
+        st.success(
+            f"✅ {matching_files} matching PDF file(s) in stage "
+            f"(showing {len(st.session_state.available_files)})"
+        )
+        
+        # Create a selectbox with file names
+        file_options = [f"{f['display_name']} ({f['size']} bytes)" for f in st.session_state.available_files]
+        
+        selected_index = st.selectbox(
+            "Select a PDF file to process:",
+            range(len(file_options)),
+            format_func=lambda i: file_options[i]
+        )
+        
+        st.session_state.selected_file = st.session_state.available_files[selected_index]
+        
+        # Show selected file info
+        with st.expander("📎 File Details"):
+            st.write(f"**Name:** {st.session_state.selected_file['display_name']}")
+            st.write(f"**Size:** {st.session_state.selected_file['size']} bytes")
+            st.write(f"**Path:** {st.session_state.selected_file['full_path']}")
+    else:
+        st.warning("⚠️ No matching PDF files found in the stage. Upload a PDF file or loosen the filters.")
+        st.info("After uploading, click '🔄 Refresh File List' in the sidebar.")
+
+    st.markdown("---")
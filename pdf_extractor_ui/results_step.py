@@ -0,0 +1,215 @@
+"""
+Step 4: review, edit and download the extracted results.
+"""
+
+import pandas as pd
+import streamlit as st
+
+from pdf_extractor.exports import EXPORT_FORMATS, export_bytes
+from pdf_extractor.instrumentation import step
+from pdf_extractor.result_store import REVIEW_PAGE_SIZE, ResultStore
+from pdf_extractor.results_table import RESULTS_TABLE, ensure_results_table, write_results
+from pdf_extractor_ui.state import clear_results, has_results, touch_results
+
+# Review filter labels and their ResultStore conditions
+REVIEW_FILTERS = {
+    "All rows": "all",
+    "Rows with errors": "errors",
+    "Rows with an empty field": "empty",
+}
+
+
+# Prepared exports kept across reruns: a few, for at most this many seconds
+EXPORT_CACHE_MAX_ENTRIES = 4
+EXPORT_CACHE_TTL_SECONDS = 600
+
+
+@st.cache_data(max_entries=EXPORT_CACHE_MAX_ENTRIES, ttl=EXPORT_CACHE_TTL_SECONDS)
+def build_export(results_token, export_format, _store):
+    """Serialize the results; built once per results version and format.
+
+    `results_token` changes whenever the results do (see touch_results), so
+    the store is not read on every rerun.
+    """
+    return export_bytes(_store.iter_frames(), export_format)
+
+
+def render_results_step(session):
+    """Draw Step 4 when there are results."""
+    if not has_results():
+        return
+    store = st.session_state.result_store
+    total_rows = len(store)
+
+    st.markdown("---")
+    st.header("📊 Step 4: Review & Download Results")
+
+    # Rows are read from the result store one filtered page at a time
+    col1, col2, col3 = st.columns([2, 2, 2])
+    with col1:
+        condition = REVIEW_FILTERS[st.selectbox("Show", list(REVIEW_FILTERS), on_change=_first_page)]
+    with col2:
+        field_name = st.selectbox("Field", ["Any field"] + store.field_names(), on_change=_first_page)
+    with col3:
+        path_contains = st.text_input("Path contains", on_change=_first_page)
+    filters = ResultStore.make_filters(
+        condition, None if field_name == "Any field" else field_name, path_contains.strip()
+    )
+
+    matching = store.count(filters)
+    page_count = max(1, (matching + REVIEW_PAGE_SIZE - 1) // REVIEW_PAGE_SIZE)
+    page = min(st.session_state.review_page, page_count - 1)
+    if page_count > 1:
+        nav1, nav2, nav3 = st.columns([1, 2, 1])
+        with nav1:
+            st.button("◀ Previous", on_click=_set_page, args=(page - 1,), disabled=page == 0)
+        with nav2:
+            st.caption(f"Page {page + 1} of {page_count}")
+        with nav3:
+            st.button("Next ▶", on_click=_set_page, args=(page + 1,), disabled=page >= page_count - 1)
+    data = store.page(filters, page)
+    st.caption(
+        f"Showing {len(data)} of {matching} matching row(s)"
+        + (f" ({total_rows} in total)" if matching != total_rows else "")
+    )
+
+    # Display as dataframe
+    st.dataframe(data, use_container_width=True)
+
+    # Editors are only drawn for one row of the page; saving patches just the changed cells
+    if len(data) and st.checkbox("✏️ Edit Extracted Data"):
+        st.info("You can edit the extracted values below if needed:")
+
+        row_idx = 0
+        if len(data) > 1:
+            row_idx = st.selectbox(
+                "Row to edit",
+                range(len(data)),
+                format_func=lambda i: str(data['relative_path'].iloc[i])
+            )
+
+        # Keys carry the results token so editors start from the current values after any change
+        token = st.session_state.results_token
+        relative_path = data['relative_path'].iloc[row_idx]
+        shown = {
+            col: "" if pd.isna(data[col].iloc[row_idx]) else data[col].iloc[row_idx]
+            for col in data.columns if col != 'relative_path'
+        }
+        with st.form(f"edit_row_{row_idx}"):
+            # Text inputs for Streamlit 1.22.0 compatibility
+            for col, value in shown.items():
+                st.text_input(
+                    col,
+                    value=value,
+                    key=f"edit_{token}_{relative_path}_{col}"
+                )
+            st.form_submit_button("💾 Save Edits", on_click=_save_edits, args=(token, relative_path, shown))
+
+    # Download section
+    st.subheader("💾 Download Results")
+
+    if total_rows > 1 or st.session_state.selected_file is None:
+        export_name = "batch"
+    else:
+        export_name = st.session_state.selected_file['display_name'].replace('.pdf', '')
+
+    # The export is built only when asked for, in the chosen format, once per version of the results
+    col1, col2 = st.columns([2, 2])
+    with col1:
+        export_format = st.radio("Format", list(EXPORT_FORMATS), horizontal=True)
+    with col2:
+        extension, mime = EXPORT_FORMATS[export_format]
+        export_data = None
+        if st.session_state.export_request != (st.session_state.results_token, export_format):
+            st.button(
+                "📦 Prepare download",
+                on_click=_request_export,
+                args=(st.session_state.results_token, export_format),
+                use_container_width=True
+            )
+        else:
+            try:
+                with st.spinner(f"Preparing {export_format}..."):
+                    export_data = build_export(st.session_state.results_token, export_format, store)
+            except ImportError:
+                st.warning("⚠️ Parquet export needs the pyarrow package")
+        if export_data is not None:
+            st.download_button(
+                label=f"📥 Download as {export_format}",
+                data=export_data,
+                file_name=f"extracted_data_{export_name}.{extension}",
+                mime=mime,
+                use_container_width=True
+            )
+
+    # Note about Excel export
+    st.info("💡 Tip: CSV files can be opened directly in Excel")
+
+    # Bulk write-back so pipelines can read results without a download
+    token = st.session_state.results_token
+    already_saved = st.session_state.saved_results_token == token
+    if st.button(f"🗄️ Save to {RESULTS_TABLE}", disabled=already_saved):
+        try:
+            with step(session, "write_back"):
+                if not st.session_state.results_table_ready:
+                    ensure_results_table(session)
+                    st.session_state.results_table_ready = True
+                written = write_results(session, store.iter_frames(), token)
+            st.session_state.saved_results_token = token
+            st.success(f"✅ Wrote {written} value(s) to {RESULTS_TABLE} with run_id {token}")
+        except Exception as e:
+            st.error(f"❌ Error writing results: {str(e)}")
+    elif already_saved:
+        st.caption(f"Saved to {RESULTS_TABLE} with run_id {token}")
+
+    # Batch processing option
+    st.markdown("---")
+    with st.expander("🔄 Batch Processing"):
+        st.info("Process multiple PDFs with the same extraction fields")
+        st.markdown("""
+        To process multiple PDFs:
+        1. Keep your extraction fields defined
+        2. Use **📚 Batch Extraction** in Step 3 to extract many PDFs in one query, or
+        3. Click below, then select and process additional PDFs one at a time
+        4. Results are combined into one row per file
+        """)
+
+        if st.session_state.keep_results:
+            st.caption(f"New extractions are added to the current {total_rows} row(s)")
+        else:
+            st.button("➕ Process Another PDF (Keep Current Data)", on_click=_keep_results)
+
+        st.button("🗑️ Clear All Data", on_click=_clear_results)
+
+
+def _first_page():
+    st.session_state.review_page = 0
+
+
+def _set_page(page):
+    st.session_state.review_page = max(0, page)
+
+
+def _request_export(token, export_format):
+    st.session_state.export_request = (token, export_format)
+
+
+def _save_edits(token, relative_path, shown):
+    store = st.session_state.result_store
+    changed = False
+    for col, value in shown.items():
+        edited = st.session_state[f"edit_{token}_{relative_path}_{col}"]
+        if edited != value:
+            store.patch(relative_path, col, edited)
+            changed = True
+    if changed:
+        touch_results()
+
+
+def _keep_results():
+    st.session_state.keep_results = True
+
+
+def _clear_results():
+    clear_results()
+    st.session_state.keep_results = False
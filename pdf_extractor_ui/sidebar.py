@@ -0,0 +1,371 @@
+"""
+Sidebar: stage, engine and cache settings, and the extraction field list.
+"""
+
+import streamlit as st
+
+from pdf_extractor.chunking import CHUNKS_PER_CALL, MAX_CHUNK_ROUNDS
+from pdf_extractor.instrumentation import RUN_LOG_TABLE
+from pdf_extractor.parsing import (
+    CAPABILITIES_TABLE,
+    PARSE_CACHE_TABLE,
+    PARSE_DOCUMENT_FORMS,
+    ensure_capabilities_table,
+    ensure_parse_cache,
+    evict_parse_cache,
+    file_content_key,
+    invalidate_parse_cache,
+    load_capabilities,
+    probe_capabilities,
+    save_capabilities,
+)
+from pdf_extractor.result_store import RESERVED_FIELD_NAMES
+from pdf_extractor.schema import (
+    FIELD_TEMPLATES,
+    FIELD_TYPES,
+    build_typed_table_statements,
+    column_names,
+    materialize_typed_table,
+)
+from pdf_extractor_ui.state import get_extraction_cache
+
+EXTRACTION_ENGINES = {
+    "Direct file (AI_EXTRACT on staged PDF)": "direct",
+    "Parse then extract (PARSE_DOCUMENT + AI_EXTRACT)": "parse",
+}
+
+EXTRACTION_MODES = {
+    "Batched (one call per document)": "batched",
+    "Per field (one call per field)": "per_field",
+}
+
+
+def render_sidebar(session):
+    """Draw the sidebar and return the run settings as a dict."""
+    with st.sidebar:
+        st.header("⚙️ Configuration")
+        
+        # Stage selection
+        st.subheader("Snowflake Stage")
+        stage_name = st.text_input(
+            "Stage Name",
+            value="pdf_upload_stage",
+            help="The Snowflake stage where PDFs are stored (without @)"
+        )
+        
+        # Refresh files button
+        if st.button("🔄 Refresh File List"):
+            st.session_state.catalog_refresh_requested = True
+        
+        # Account capabilities: which Cortex functions and PARSE_DOCUMENT form work here
+        if st.session_state.current_account is None:
+            try:
+                st.session_state.current_account = session.get_current_account() or ""
+            except Exception:
+                st.session_state.current_account = ""
+        capability_key = (st.session_state.current_account, stage_name)
+        
+        with st.expander("🧪 Account Capabilities"):
+            remember_capabilities = st.checkbox(
+                "Remember in config table",
+                value=False,
+                help=f"Save probe results to {CAPABILITIES_TABLE} so new sessions skip probing"
+            )
+            # Read the config table once per session and stage, not on every rerun
+            if (remember_capabilities and capability_key not in st.session_state.capabilities
+                    and capability_key not in st.session_state.capabilities_loaded):
+                st.session_state.capabilities_loaded.add(capability_key)
+                try:
+                    ensure_capabilities_table(session)
+                    saved = load_capabilities(session, *capability_key)
+                    if saved:
+                        st.session_state.capabilities[capability_key] = saved
+                except Exception as e:
+                    st.warning(f"Could not read {CAPABILITIES_TABLE}: {str(e)[:200]}")
+            
+            capabilities = st.session_state.capabilities.get(capability_key)
+            if capabilities:
+                parse_form = capabilities['parse_form']
+                st.caption(
+                    "PARSE_DOCUMENT form: "
+                    + (PARSE_DOCUMENT_FORMS[parse_form][0] if parse_form is not None else "not detected")
+                )
+                for function_name, available in capabilities['functions'].items():
+                    st.caption(f"{'✅' if available else '❌'} {function_name}")
+                for function_name in capabilities.get('inconclusive', []):
+                    st.caption(f"⏳ {function_name}: throttled or unavailable while probing, re-probe later")
+                st.caption(f"Probed at {capabilities['probed_at']}")
+            else:
+                st.caption("Not probed yet; the first parse records the working form")
+            
+            if st.button("🔁 Re-probe"):
+                sample_file = st.session_state.selected_file or (
+                    st.session_state.available_files[0] if st.session_state.available_files else None
+                )
+                with st.spinner("Probing Cortex functions..."):
+                    capabilities = probe_capabilities(
+                        session, stage_name, sample_file['relative_path'] if sample_file else None
+                    )
+                # Throttled or transient failures say nothing about support; keep what was known
+                previous = st.session_state.capabilities.get(capability_key) or {}
+                for function_name in capabilities['inconclusive']:
+                    if function_name in previous.get('functions', {}):
+                        capabilities['functions'][function_name] = previous['functions'][function_name]
+                if 'PARSE_DOCUMENT' in capabilities['inconclusive']:
+                    capabilities['parse_form'] = previous.get('parse_form')
+                st.session_state.capabilities[capability_key] = capabilities
+                if remember_capabilities and not capabilities['inconclusive']:
+                    try:
+                        save_capabilities(session, *capability_key, capabilities)
+                    except Exception as e:
+                        st.warning(f"Could not save probe results: {str(e)[:200]}")
+                st.experimental_rerun()
+        
+        known_parse_form = (st.session_state.capabilities.get(capability_key) or {}).get('parse_form')
+        
+        # Extraction engine
+        extraction_engine = EXTRACTION_ENGINES[st.radio(
+            "Extraction Engine",
+            list(EXTRACTION_ENGINES),
+            help="Direct file runs AI_EXTRACT on the staged PDF inside Snowflake, so the "
+                 "document text never comes back to the app and is not truncated. It needs a "
+                 "stage with SNOWFLAKE_SSE encryption; files on other stages are parsed instead"
+        )]
+        
+        # Extraction mode
+        extraction_mode = EXTRACTION_MODES[st.radio(
+            "Extraction Mode",
+            list(EXTRACTION_MODES),
+            help="Batched sends every field in a single AI_EXTRACT call and only "
+                 "falls back to per-field calls for fields that come back empty"
+        )]
+        
+        # Relevance chunking for the parse-then-extract engine
+        use_chunking = False
+        chunks_per_call = CHUNKS_PER_CALL
+        max_chunk_rounds = MAX_CHUNK_ROUNDS
+        if extraction_engine == "parse":
+            use_chunking = st.checkbox(
+                "Send only relevant chunks",
+                value=True,
+                help="Split the parsed document by page and section, rank chunks per field with BM25 "
+                     "and send each call only the best chunks, trying later chunks for fields still empty"
+            )
+            if use_chunking:
+                chunks_per_call = st.slider("Chunks per call", 1, 10, CHUNKS_PER_CALL)
+                max_chunk_rounds = st.slider("Max chunk rounds", 1, 10, MAX_CHUNK_ROUNDS)
+        
+        max_concurrency = st.number_input(
+            "Max Concurrent Queries",
+            min_value=1,
+            max_value=16,
+            value=4,
+            help="Independent AI_EXTRACT calls are submitted asynchronously, up to this many at once; "
+                 "the limit is lowered automatically while Cortex is throttling"
+        )
+        max_attempts = st.number_input(
+            "Max Attempts per Query",
+            min_value=1,
+            max_value=8,
+            value=4,
+            help="Throttling and timeout errors are retried with exponential backoff"
+        )
+        
+        # Parse cache
+        with st.expander("🗄️ Parse Cache"):
+            use_parse_cache = st.checkbox(
+                "Reuse cached PARSE_DOCUMENT results",
+                value=True,
+                help=f"Parsed documents are stored in {PARSE_CACHE_TABLE}, keyed by file content, "
+                     "so re-running extraction on the same PDF skips parsing"
+            )
+            st.caption(f"{len(st.session_state.parse_memo)} parsed document(s) held in this session")
+            max_age_days = st.number_input("Evict entries older than (days)", min_value=0, value=30)
+            if st.button("🧹 Evict Old Entries"):
+                try:
+                    ensure_parse_cache(session)
+                    removed = evict_parse_cache(session, max_age_days, st.session_state.parse_memo)
+                    st.success(f"Evicted {removed} cached parse(s)")
+                except Exception as e:
+                    st.error(f"Error evicting parse cache: {str(e)}")
+            if st.session_state.selected_file and st.button("♻️ Re-parse Selected File"):
+                try:
+                    ensure_parse_cache(session)
+                    invalidate_parse_cache(
+                        session,
+                        st.session_state.parse_memo,
+                        file_content_key(st.session_state.selected_file)
+                    )
+                    st.success(f"Cached parse dropped for {st.session_state.selected_file['display_name']}")
+                except Exception as e:
+                    st.error(f"Error invalidating parse cache: {str(e)}")
+            if st.button("🗑️ Clear Parse Cache"):
+                try:
+                    ensure_parse_cache(session)
+                    invalidate_parse_cache(session, st.session_state.parse_memo)
+                    st.success("Parse cache cleared")
+                except Exception as e:
+                    st.error(f"Error clearing parse cache: {str(e)}")
+        
+        # Extraction result cache
+        result_cache = get_extraction_cache()
+        with st.expander("🧠 Result Cache"):
+            use_result_cache = st.checkbox(
+                "Reuse earlier answers for unchanged fields",
+                value=True,
+                help="Answers are keyed by document content, field name, field description "
+                     "and extraction mode, so a re-run only extracts new or edited fields"
+            )
+            # Shared by every session, so its limits are app settings, not sidebar inputs
+            st.caption(
+                f"Answers are kept for {result_cache.ttl_seconds // 3600} hour(s), "
+                f"up to {result_cache.max_entries} in total, for all sessions"
+            )
+            
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Entries", len(result_cache))
+            col2.metric("Hits", result_cache.hits)
+            col3.metric("Misses", result_cache.misses)
+            if st.session_state.last_cache_stats:
+                hits, misses = st.session_state.last_cache_stats
+                st.caption(f"Last run: {hits} field(s) from cache, {misses} extracted")
+            if st.button("🗑️ Clear Result Cache"):
+                result_cache.clear()
+                st.session_state.last_cache_stats = None
+                st.success("Result cache cleared")
+        
+        # Query timings of each run
+        with st.expander("⏱️ Run Timing"):
+            log_run_timings = st.checkbox(
+                f"Append query timings to {RUN_LOG_TABLE}",
+                value=False,
+                help="Each query of a run is logged with its stage, duration and query ID, "
+                     "for joins with QUERY_HISTORY and Cortex usage views"
+            )
+        
+        st.markdown("---")
+        
+        # Field definition
+        st.subheader("📋 Define Extraction Fields")
+        st.markdown("Add fields you want to extract from the PDF:")
+        
+        # Add new field; the form only reruns the app on submit, not on every edit
+        with st.form("add_field", clear_on_submit=True):
+            st.text_input("Field Name", key="new_field")
+            st.text_area(
+                "Field Description (optional)",
+                help="Provide context to help the AI understand what to extract",
+                key="field_desc"
+            )
+            st.selectbox(
+                "Type",
+                list(FIELD_TYPES),
+                help="Column type of the field in the typed results table",
+                key="field_type"
+            )
+            st.form_submit_button("➕ Add Field", on_click=_add_field)
+        if st.session_state.field_error:
+            st.warning(st.session_state.field_error)
+        
+        # Display current fields
+        if st.session_state.extraction_fields:
+            st.markdown("**Current Fields:**")
+            for idx, field in enumerate(st.session_state.extraction_fields):
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    st.text(f"• {field['name']}" + (f" ({field['type']})" if field.get('type') else ""))
+                    if field['description']:
+                        st.caption(field['description'])
+                with col2:
+                    st.button("🗑️", key=f"delete_{idx}", on_click=_delete_field, args=(idx,))
+        
+        # Quick templates
+        st.markdown("---")
+        st.subheader("🚀 Quick Templates")
+        
+        for template_name in FIELD_TEMPLATES:
+            st.button(template_name, on_click=_set_fields, args=(FIELD_TEMPLATES[template_name],))
+        
+        st.button("Clear All Fields", on_click=_set_fields, args=([],))
+        
+        # Typed columns for downstream analytics, built from the current field list
+        if st.session_state.extraction_fields:
+            with st.expander("🧱 Typed Table"):
+                typed_source = st.text_input("Raw responses table", value="pdf_extractor_db.pdf_processing.doc_extract")
+                typed_table = st.text_input("Typed table", value="pdf_extractor_db.pdf_processing.doc_extract_typed")
+                typed_dynamic = st.checkbox(
+                    "Dynamic table",
+                    value=True,
+                    help="Snowflake keeps a dynamic table up to date; otherwise a plain table is refreshed with MERGE"
+                )
+                typed_options = {'dynamic': typed_dynamic}
+                if typed_dynamic:
+                    typed_options['warehouse'] = st.text_input("Warehouse", value="compute_wh")
+                    typed_options['target_lag'] = st.text_input("Target lag", value="1 hour")
+                typed_options['cluster_by'] = st.multiselect(
+                    "Cluster by",
+                    [field['name'] for field in st.session_state.extraction_fields
+                     if field.get('type') in ("date", "number", "integer")]
+                )
+                try:
+                    # Cluster keys are picked by field name; the table uses column names
+                    columns = dict(zip(
+                        [field['name'] for field in st.session_state.extraction_fields],
+                        column_names(st.session_state.extraction_fields)
+                    ))
+                    typed_options['cluster_by'] = [columns[name] for name in typed_options['cluster_by']]
+                    statements = build_typed_table_statements(
+                        st.session_state.extraction_fields, typed_table, typed_source, **typed_options
+                    )
+                    st.code(";\n\n".join(statements) + ";", language="sql")
+                    if st.button("🧱 Create / Refresh Typed Table"):
+                        with st.spinner("Materializing typed table..."):
+                            materialize_typed_table(
+                                session, st.session_state.extraction_fields, typed_table, typed_source, **typed_options
+                            )
+                        st.success(f"✅ {typed_table} is up to date")
+                except Exception as e:
+                    st.error(f"❌ {str(e)[:300]}")
+    
+    return {
+        'stage_name': stage_name,
+        'capability_key': capability_key,
+        'remember_capabilities': remember_capabilities,
+        'known_parse_form': known_parse_form,
+        'extraction_engine': extraction_engine,
+        'extraction_mode': extraction_mode,
+        'use_chunking': use_chunking,
+        'chunks_per_call': chunks_per_call,
+        'max_chunk_rounds': max_chunk_rounds,
+        'max_concurrency': max_concurrency,
+        'max_attempts': max_attempts,
+        'use_parse_cache': use_parse_cache,
+        'use_result_cache': use_result_cache,
+        'result_cache': result_cache,
+        'log_run_timings': log_run_timings,
+    }
+
+
+# Field list changes run as button callbacks, before the rerun they trigger,
+# so the new list shows without a second script run
+def _add_field():
+    st.session_state.field_error = None
+    if st.session_state.new_field in RESERVED_FIELD_NAMES:
+        st.session_state.field_error = f"⚠️ \"{st.session_state.new_field}\" is a result column name; pick another field name"
+    elif any(field['name'] == st.session_state.new_field for field in st.session_state.extraction_fields):
+        # One AI_EXTRACT call asks for every field by name, so names must be unique
+        st.session_state.field_error = f"⚠️ \"{st.session_state.new_field}\" is already in the field list; pick another field name"
+    elif st.session_state.new_field:
+        st.session_state.extraction_fields.append({
+            "name": st.session_state.new_field,
+            "description": st.session_state.field_desc,
+            "type": st.session_state.field_type
+        })
+
+
+def _delete_field(idx):
+    st.session_state.extraction_fields.pop(idx)
+
+
+def _set_fields(fields):
+    st.session_state.extraction_fields = [dict(field) for field in fields]
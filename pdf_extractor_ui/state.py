@@ -0,0 +1,89 @@
+"""
+Session state of the app and the resources shared across sessions.
+"""
+
+import uuid
+
+import streamlit as st
+
+from pdf_extractor.extraction import ExtractionCache
+from pdf_extractor.result_store import ResultStore
+
+# Session state keys and their initial values
+SESSION_DEFAULTS = {
+    'result_store': None,
+    'review_page': 0,
+    'results_token': None,
+    'saved_results_token': None,
+    'export_request': None,
+    'results_table_ready': False,
+    'extraction_fields': [],
+    'field_error': None,
+    'available_files': [],
+    'file_catalog': None,
+    'catalog_refresh_requested': False,
+    'selected_file': None,
+    'parse_memo': {},
+    'parse_cache_ready': False,
+    'last_cache_stats': None,
+    'keep_results': False,
+    'last_error_summary': None,
+    'capabilities': {},
+    'capabilities_loaded': set(),
+    'parse_only_stages': set(),
+    'current_account': None,
+    'last_run_trace': None,
+    'run_log_ready': False,
+}
+
+
+def init_state():
+    """Fill in missing session state keys; fresh copies so sessions never share a list or dict."""
+    for key, value in SESSION_DEFAULTS.items():
+        if key not in st.session_state:
+            st.session_state[key] = value.copy() if hasattr(value, "copy") else value
+
+
+def has_results():
+    store = st.session_state.result_store
+    return store is not None and len(store) > 0
+
+
+def touch_results(run_id=None):
+    """Give the results a new token after they changed.
+
+    The token keys the cached exports and is the run_id written with the
+    results; extraction runs pass their trace's run_id so it matches the
+    run log, edits get a fresh one.
+    """
+    st.session_state.results_token = run_id or uuid.uuid4().hex
+
+
+def store_results(new_data, run_id=None):
+    """Add `new_data` to the results when keeping earlier rows, otherwise replace them.
+
+    Rows go to the session's ResultStore, so only a page of them is ever
+    loaded back; when keeping results, newer rows win per relative_path.
+    """
+    store = st.session_state.result_store
+    if store is None:
+        store = st.session_state.result_store = ResultStore()
+    elif not st.session_state.keep_results:
+        store.clear()
+    store.add(new_data)
+    st.session_state.review_page = 0
+    touch_results(run_id)
+
+
+def clear_results():
+    """Drop the results and their spill file."""
+    if st.session_state.result_store is not None:
+        st.session_state.result_store.close()
+    st.session_state.result_store = None
+    st.session_state.results_token = None
+
+
+@st.cache_resource
+def get_extraction_cache():
+    """The extraction result cache shared by all sessions of this app."""
+    return ExtractionCache()
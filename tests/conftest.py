@@ -0,0 +1,34 @@
+import pytest
+
+from pdf_extractor.execution import QueryRunner, RetryPolicy
+from pdf_extractor.local_cortex import LocalCortexBackend, make_documents
+from pdf_extractor.schema import LOAN_DOC_FIELDS
+
+STAGE_NAME = "pdf_upload_stage"
+
+
+@pytest.fixture
+def make_backend():
+    """Factory for a zero-latency LocalCortexBackend over fresh documents: (backend, docs, expected)."""
+    backends = []
+
+    def make(count=3, chars=2000, fields=LOAN_DOC_FIELDS[:7], backend_class=LocalCortexBackend, **options):
+        docs, expected = make_documents(count, chars, [field['name'] for field in fields])
+        options = {'latency': 0, 'latency_per_kchar': 0, 'ddl_latency': 0, **options}
+        backend = backend_class(docs, stage_name=STAGE_NAME, **options)
+        backends.append(backend)
+        return backend, docs, expected
+
+    yield make
+    for backend in backends:
+        backend.pool.shutdown()
+
+
+@pytest.fixture
+def make_runner():
+    """Factory for a QueryRunner with millisecond backoff and polling."""
+    def make(session, max_concurrency=4, max_attempts=4):
+        retry_policy = RetryPolicy(max_attempts, base_delay=0.001, max_delay=0.004)
+        return QueryRunner(session, max_concurrency, retry_policy, poll_interval=0.001)
+
+    return make
@@ -0,0 +1,50 @@
+import argparse
+
+import pytest
+
+from pdf_extractor.benchmark import run_scenario
+
+# Queries per scenario of 2 documents, as measured by `python -m pdf_extractor.benchmark`;
+# parse-based strategies spend one PARSE_DOCUMENT query per document
+QUERY_BUDGETS = [
+    ("per_field_text", 7, 5000, 16),
+    ("batched_text", 7, 5000, 4),
+    ("chunked_text", 7, 5000, 4),
+    ("direct_file", 7, 5000, 2),
+    ("set_based", 7, 5000, 2),
+    ("batched_text", 29, 50000, 4),
+    ("chunked_text", 29, 50000, 4),
+    ("direct_file", 29, 50000, 2),
+    ("set_based", 29, 50000, 2),
+    ("chunked_text", 7, 250000, 4),
+    ("chunked_text", 29, 250000, 6),
+]
+
+
+def benchmark_args(**overrides):
+    options = dict(
+        concurrency=4, max_attempts=4, latency=0.0, latency_per_kchar=0.0,
+        error_rate=0.0, throttle_rate=0.0, seed=0,
+    )
+    options.update(overrides)
+    return argparse.Namespace(**options)
+
+
+@pytest.mark.parametrize("strategy, fields, chars, max_queries", QUERY_BUDGETS)
+def test_query_budget(strategy, fields, chars, max_queries):
+    result = run_scenario(strategy, fields, chars, 2, benchmark_args())
+    assert result['queries'] <= max_queries
+    assert result['accuracy'] == 1.0
+    assert result['retries'] == 0
+
+
+def test_document_text_is_bound_not_inlined():
+    result = run_scenario("batched_text", 7, 50000, 2, benchmark_args())
+    # The SQL text stays small whatever the document size
+    assert result['sql_kb'] < 1
+    assert result['bind_kb'] > 90
+
+
+def test_throttling_is_absorbed_by_retries():
+    result = run_scenario("batched_text", 7, 5000, 4, benchmark_args(throttle_rate=0.3, max_attempts=8, latency=0.001))
+    assert result['accuracy'] == 1.0
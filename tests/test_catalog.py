@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from pdf_extractor.catalog import FileCatalog
+from pdf_extractor.local_cortex import LocalCortexBackend, LocalDocument
+
+from conftest import STAGE_NAME
+
+# (relative path, size in bytes, day of January 2024 it was last modified)
+FILES = [
+    ("loans/a.pdf", 100, 1),
+    ("loans/b.pdf", 2000, 2),
+    ("loans/notes.txt", 50, 3),
+    ("other/c.PDF", 500, 4),
+    ("other/d.pdf", 3000, 5),
+]
+
+
+def make_document(relative_path, size, day):
+    return LocalDocument(relative_path, "x" * size, datetime(2024, 1, day, tzinfo=timezone.utc))
+
+
+@pytest.fixture(params=[True, False], ids=["directory", "list"])
+def backend(request):
+    backend = LocalCortexBackend(
+        [make_document(*file) for file in FILES], stage_name=STAGE_NAME,
+        latency=0, latency_per_kchar=0, ddl_latency=0, stage_owner=request.param,
+    )
+    yield backend
+    backend.pool.shutdown()
+
+
+@pytest.fixture
+def catalog(backend):
+    catalog = FileCatalog(STAGE_NAME)
+    catalog.ensure_stage(backend)
+    return catalog
+
+
+def paths(files):
+    return [file['relative_path'] for file in files]
+
+
+def test_pages_are_ordered_by_path(backend, catalog):
+    filters = FileCatalog.make_filters()
+    assert catalog.count(backend, filters) == 4
+    assert paths(catalog.page(backend, filters, 0, page_size=3)) == ["loans/a.pdf", "loans/b.pdf", "other/c.PDF"]
+    assert paths(catalog.page(backend, filters, 1, page_size=3)) == ["other/d.pdf"]
+    file = catalog.page(backend, filters, 1, page_size=3)[0]
+    assert file['display_name'] == "d.pdf"
+    assert file['full_path'] == f"{STAGE_NAME}/other/d.pdf"
+    assert (file['size'], file['md5']) == (3000, backend.documents["other/d.pdf"].md5)
+
+
+def test_pages_are_cached_until_refresh(backend, catalog):
+    filters = FileCatalog.make_filters()
+    catalog.count(backend, filters)
+    catalog.page(backend, filters, 0)
+    queries = backend.stats.queries
+    catalog.count(backend, filters)
+    catalog.page(backend, filters, 0)
+    assert backend.stats.queries == queries
+
+
+@pytest.mark.parametrize("filters, expected", [
+    (dict(prefix="loans/"), ["loans/a.pdf", "loans/b.pdf"]),
+    (dict(name_pattern="%/c%"), ["other/c.PDF"]),
+    (dict(name_pattern="loans/_.pdf"), ["loans/a.pdf", "loans/b.pdf"]),
+    (dict(min_size=1000), ["loans/b.pdf", "other/d.pdf"]),
+    (dict(max_size=1000), ["loans/a.pdf", "other/c.PDF"]),
+    (dict(modified_since="2024-01-04"), ["other/c.PDF", "other/d.pdf"]),
+    (dict(prefix="other/", min_size=1000), ["other/d.pdf"]),
+])
+def test_filters(backend, catalog, filters, expected):
+    filters = FileCatalog.make_filters(**filters)
+    assert catalog.count(backend, filters) == len(expected)
+    assert paths(catalog.page(backend, filters, 0)) == expected
+
+
+def test_refresh_reports_changes_by_count_and_watermark(backend, catalog):
+    filters = FileCatalog.make_filters()
+    assert not catalog.refresh(backend)
+    assert catalog.file_count == 4
+
+    backend.documents["other/e.pdf"] = make_document("other/e.pdf", 10, 6)
+    assert catalog.refresh(backend)
+    assert catalog.count(backend, filters) == 5
+    assert not catalog.refresh(backend)
+
+    # Same number of files, one of them newer
+    backend.documents["loans/a.pdf"] = make_document("loans/a.pdf", 10, 7)
+    assert catalog.refresh(backend)
+    assert catalog.watermark.startswith("2024-01-07")
+    assert catalog.page(backend, filters, 0)[0]['size'] == 10
+
+
+def test_missing_stage_privileges_fall_back_to_list():
+    backend = LocalCortexBackend(
+        [make_document(*file) for file in FILES], stage_name=STAGE_NAME,
+        latency=0, latency_per_kchar=0, ddl_latency=0, stage_owner=False,
+    )
+    catalog = FileCatalog(STAGE_NAME)
+    catalog.ensure_stage(backend)
+    assert catalog.ready and not catalog.use_directory
+    assert catalog.count(backend, FileCatalog.make_filters()) == 4
+    # The DDL is not tried again on later reruns
+    queries = backend.stats.queries
+    catalog.ensure_stage(backend)
+    assert backend.stats.queries == queries
+    backend.pool.shutdown()
+
+
+def test_other_errors_are_raised_and_retried(make_backend):
+    class Unreachable(LocalCortexBackend):
+        def execute(self, query):
+            raise RuntimeError("Connection reset by peer")
+
+    backend, _, _ = make_backend(count=1, backend_class=Unreachable)
+    catalog = FileCatalog(STAGE_NAME)
+    with pytest.raises(RuntimeError):
+        catalog.ensure_stage(backend)
+    assert not catalog.ready
@@ -0,0 +1,100 @@
+import pytest
+
+from pdf_extractor.execution import AdaptiveConcurrency, RetryPolicy, classify_error, collect_with_retry
+from pdf_extractor.extraction import build_extract_query
+from pdf_extractor.sql import file_source, parse_response, text_source
+
+FIELDS = [{"name": "Company Name", "description": ""}]
+
+
+@pytest.mark.parametrize("message, kind", [
+    ("429 Too Many Requests", "throttled"),
+    ("Request rate limit exceeded", "throttled"),
+    ("Internal error: try again", "transient"),
+    ("503 Service Unavailable", "transient"),
+    ("SQL compilation error: invalid identifier", "permanent"),
+])
+def test_classify_error(message, kind):
+    assert classify_error(RuntimeError(message)) == kind
+
+
+def test_retry_policy_never_retries_permanent_errors():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry("throttled", 0)
+    assert policy.should_retry("transient", 1)
+    assert not policy.should_retry("transient", 2)
+    assert not policy.should_retry("permanent", 0)
+
+
+def test_adaptive_concurrency_halves_on_throttle_and_grows_back():
+    concurrency = AdaptiveConcurrency(8)
+    concurrency.on_throttle()
+    concurrency.on_throttle()
+    assert concurrency.limit == 2
+    for _ in range(2):
+        concurrency.on_success()
+    assert concurrency.limit == 3
+    for _ in range(100):
+        concurrency.on_success()
+    assert concurrency.limit == 8
+    for _ in range(10):
+        concurrency.on_throttle()
+    assert concurrency.limit == 1
+
+
+def test_runner_returns_results_in_query_order(make_backend, make_runner):
+    backend, docs, expected = make_backend(count=6)
+    completed = []
+    results = make_runner(backend, max_concurrency=2).run(
+        [build_extract_query(text_source(doc.text), FIELDS) for doc in docs],
+        lambda idx, result: completed.append(idx),
+    )
+    assert sorted(completed) == list(range(len(docs)))
+    assert [parse_response(rows[0]['EXTRACT_DATA'])["Company Name"] for rows in results] == [
+        expected[doc.relative_path]["Company Name"] for doc in docs
+    ]
+    assert backend.stats.queries == len(docs)
+
+
+def test_runner_retries_throttling_until_queries_succeed(make_backend, make_runner):
+    backend, docs, expected = make_backend(count=6, throttle_rate=0.3, seed=3)
+    runner = make_runner(backend, max_attempts=10)
+    queries = [build_extract_query(text_source(doc.text), FIELDS) for doc in docs]
+    results = runner.run(queries)
+    assert not any(isinstance(result, Exception) for result in results)
+    assert runner.errors.retries['throttled'] > 0
+    assert not runner.errors.failures
+    assert runner.errors.min_concurrency < 4
+    assert backend.stats.queries == len(docs) + sum(runner.errors.retries.values())
+
+
+def test_runner_gives_up_after_max_attempts(make_backend, make_runner):
+    backend, docs, _ = make_backend(count=2, throttle_rate=1.0)
+    runner = make_runner(backend, max_attempts=3)
+    results = runner.run([build_extract_query(text_source(doc.text), FIELDS) for doc in docs])
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert runner.errors.retries['throttled'] == 4
+    assert runner.errors.failures['throttled'] == 2
+    assert runner.concurrency.limit == 1
+
+
+def test_runner_does_not_retry_permanent_errors(make_backend, make_runner):
+    backend, _, _ = make_backend(count=1)
+    runner = make_runner(backend)
+    completed = []
+    results = runner.run(
+        [build_extract_query(file_source("pdf_upload_stage", "missing.pdf"), FIELDS)],
+        lambda idx, result: completed.append(idx),
+    )
+    assert isinstance(results[0], RuntimeError)
+    assert completed == [0]
+    assert runner.errors.failures['permanent'] == 1
+    assert backend.stats.queries == 1
+
+
+def test_collect_with_retry_raises_last_error(make_backend):
+    backend, docs, _ = make_backend(count=1, error_rate=1.0)
+    query = build_extract_query(text_source(docs[0].text), FIELDS)
+    with pytest.raises(RuntimeError, match="transient"):
+        collect_with_retry(backend, query, RetryPolicy(2, base_delay=0.001))
+    assert backend.stats.queries == 2
@@ -0,0 +1,71 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from pdf_extractor.exports import EXPORT_FORMATS, export_bytes, iter_export_chunks, write_export
+from pdf_extractor.result_store import ResultStore
+
+ROWS = [
+    {'relative_path': f"doc_{idx}.pdf", 'Name': f"Company {idx}, \"Ltd\"", 'Note': None if idx % 2 else "line\nbreak"}
+    for idx in range(5)
+]
+
+
+def records(frame):
+    return [{key: None if pd.isna(value) else value for key, value in row.items()} for row in frame.to_dict('records')]
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame(ROWS)
+
+
+def test_csv_round_trip(data):
+    restored = pd.read_csv(io.BytesIO(export_bytes(data, "CSV", rows_per_chunk=2)), dtype=str)
+    assert records(restored) == ROWS
+
+
+@pytest.mark.parametrize("rows_per_chunk", [1, 2, 1000])
+def test_json_round_trip(data, rows_per_chunk):
+    assert json.loads(export_bytes(data, "JSON", rows_per_chunk)) == ROWS
+
+
+def test_ndjson_round_trip(data):
+    lines = export_bytes(data, "NDJSON", rows_per_chunk=2).decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+
+
+def test_parquet_round_trip(data):
+    pytest.importorskip("pyarrow")
+    restored = pd.read_parquet(io.BytesIO(export_bytes(data, "Parquet", rows_per_chunk=2)))
+    assert records(restored) == ROWS
+
+
+@pytest.mark.parametrize("export_format", [name for name in EXPORT_FORMATS if name != "Parquet"])
+def test_chunking_does_not_change_the_output(data, export_format):
+    assert export_bytes(data, export_format, 2) == export_bytes(data, export_format, 1000)
+
+
+def test_empty_results(data):
+    empty = data.iloc[0:0]
+    assert json.loads(export_bytes(empty, "JSON")) == []
+    assert export_bytes(empty, "NDJSON") == b""
+
+
+def test_result_store_chunks_export_like_a_frame(data, tmp_path):
+    store = ResultStore()
+    store.add(data)
+    path = str(tmp_path / "results.json")
+    written = write_export(store.iter_frames(rows_per_chunk=2), "JSON", path)
+    with open(path, "rb") as handle:
+        content = handle.read()
+    assert written == len(content)
+    assert json.loads(content) == ROWS
+    store.close()
+
+
+def test_unknown_format(data):
+    with pytest.raises(ValueError):
+        list(iter_export_chunks(data, "XLSX"))
@@ -0,0 +1,177 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from pdf_extractor import extraction
+from pdf_extractor.extraction import (
+    BATCH_FILES_PER_QUERY,
+    ExtractionCache,
+    extract_fields,
+    needs_server_side_encryption,
+    run_batch_extract,
+)
+from pdf_extractor.local_cortex import LocalCortexBackend
+from pdf_extractor.schema import LOAN_DOC_FIELDS
+from pdf_extractor.sql import file_source, is_error_value, text_source
+
+from conftest import STAGE_NAME
+
+FIELDS = LOAN_DOC_FIELDS[:7]
+
+
+class FailFirstExtract(LocalCortexBackend):
+    """Fails the first AI_EXTRACT statement it runs with a permanent error."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failed_once = threading.Event()
+
+    def execute(self, query):
+        if "AI_EXTRACT(" in query and not self.failed_once.is_set():
+            self.failed_once.set()
+            raise RuntimeError("SQL execution error: simulated failure")
+        return super().execute(query)
+
+
+def test_batched_mode_is_one_call_per_document(make_backend, make_runner):
+    backend, docs, expected = make_backend(count=1)
+    values = extract_fields(make_runner(backend), text_source(docs[0].text), FIELDS)
+    assert values == expected[docs[0].relative_path]
+    assert list(values) == [field['name'] for field in FIELDS]
+    assert backend.stats.queries == 1
+
+
+def test_per_field_mode_is_one_call_per_field(make_backend, make_runner):
+    backend, docs, expected = make_backend(count=1)
+    values = extract_fields(make_runner(backend), text_source(docs[0].text), FIELDS, mode="per_field")
+    assert values == expected[docs[0].relative_path]
+    assert backend.stats.queries == len(FIELDS)
+
+
+def test_missing_fields_fall_back_to_one_call_each(make_backend, make_runner):
+    backend, docs, expected = make_backend(count=1)
+    fields = FIELDS + [{"name": "Not In Document", "description": ""}]
+    values = extract_fields(make_runner(backend), text_source(docs[0].text), fields)
+    assert values["Not In Document"] is None
+    assert backend.stats.queries == 2
+
+
+def test_failed_batch_falls_back_to_per_field_calls(make_backend, make_runner):
+    backend, docs, expected = make_backend(count=1, backend_class=FailFirstExtract)
+    progress = []
+    values = extract_fields(
+        make_runner(backend), text_source(docs[0].text), FIELDS,
+        on_progress=lambda done, total, label: progress.append((done, total)),
+    )
+    assert values == expected[docs[0].relative_path]
+    assert backend.stats.queries == 1 + len(FIELDS)
+    assert progress[-1] == (len(FIELDS), len(FIELDS))
+
+
+def test_failed_field_calls_become_error_values(make_backend, make_runner):
+    backend, docs, _ = make_backend(count=1, throttle_rate=1.0)
+    values = extract_fields(make_runner(backend, max_attempts=1), text_source(docs[0].text), FIELDS[:2])
+    assert all(is_error_value(value) for value in values.values())
+
+
+def test_direct_file_source(make_backend, make_runner):
+    backend, docs, expected = make_backend(count=1)
+    values = extract_fields(make_runner(backend), file_source(STAGE_NAME, docs[0].relative_path), FIELDS)
+    assert values == expected[docs[0].relative_path]
+
+
+@pytest.mark.parametrize("engine", ["direct", "parse"])
+def test_batch_extract_groups_picked_files(make_backend, make_runner, engine):
+    backend, docs, expected = make_backend(count=BATCH_FILES_PER_QUERY * 2 + 1)
+    results = run_batch_extract(
+        make_runner(backend), STAGE_NAME, FIELDS, engine, relative_paths=[doc.relative_path for doc in docs]
+    )
+    assert {file['relative_path']: values for file, values in results} == expected
+    assert all(file['md5'] == backend.documents[file['relative_path']].md5 for file, _ in results)
+    # Stage refresh plus one statement per group of files
+    assert backend.stats.queries == 1 + 3
+
+
+def test_batch_extract_pattern_is_one_statement(make_backend, make_runner):
+    backend, docs, expected = make_backend(count=5)
+    results = run_batch_extract(make_runner(backend), STAGE_NAME, FIELDS, "direct", pattern="doc_0000%", refresh=False)
+    assert len(results) == 5
+    assert backend.stats.queries == 1
+
+
+def test_batch_extract_keeps_other_groups_when_one_fails(make_backend, make_runner):
+    backend, docs, expected = make_backend(count=BATCH_FILES_PER_QUERY * 3, backend_class=FailFirstExtract)
+    results = run_batch_extract(
+        make_runner(backend, max_concurrency=1), STAGE_NAME, FIELDS, "direct",
+        relative_paths=[doc.relative_path for doc in docs], refresh=False
+    )
+    failed = [file for file, values in results if all(is_error_value(value) for value in values.values())]
+    assert len(results) == len(docs)
+    assert len(failed) == BATCH_FILES_PER_QUERY
+    assert all(file['md5'] is None for file in failed)
+    assert sum(1 for file, values in results if values == expected[file['relative_path']]) == len(docs) - len(failed)
+
+
+def test_batch_extract_pattern_failure_raises(make_backend, make_runner):
+    backend, _, _ = make_backend(count=2, backend_class=FailFirstExtract)
+    with pytest.raises(RuntimeError):
+        run_batch_extract(make_runner(backend), STAGE_NAME, FIELDS, "direct", pattern="%.pdf", refresh=False)
+
+
+def test_unencrypted_stage_is_detected(make_backend, make_runner):
+    backend, docs, _ = make_backend(count=2, server_side_encrypted=False)
+    runner = make_runner(backend)
+    results = run_batch_extract(runner, STAGE_NAME, FIELDS, "direct", relative_paths=[docs[0].relative_path])
+    assert needs_server_side_encryption(results[0][1])
+    assert needs_server_side_encryption(
+        extract_fields(runner, file_source(STAGE_NAME, docs[1].relative_path), FIELDS[:1])
+    )
+    parsed = run_batch_extract(runner, STAGE_NAME, FIELDS, "parse", relative_paths=[docs[0].relative_path])
+    assert not needs_server_side_encryption(parsed[0][1])
+
+
+def test_encryption_error_skips_per_field_calls(make_backend, make_runner):
+    backend, docs, _ = make_backend(count=1, server_side_encrypted=False)
+    values = extract_fields(make_runner(backend), file_source(STAGE_NAME, docs[0].relative_path), FIELDS)
+    assert all(needs_server_side_encryption({name: value}) for name, value in values.items())
+    # Only the batched call; per-field calls on the same file would fail the same way
+    assert backend.stats.queries == 1
+
+
+def test_result_cache_skips_errors():
+    cache = ExtractionCache()
+    fields = FIELDS[:3]
+    cache.store("md5:a", fields, "direct/batched", {
+        fields[0]['name']: "one", fields[1]['name']: "[Error: boom]", fields[2]['name']: "three",
+    })
+    assert cache.lookup("md5:a", fields, "direct/batched") == {fields[0]['name']: "one", fields[2]['name']: "three"}
+    assert cache.lookup("md5:a", fields, "parse/batched") == {}
+
+
+def test_result_cache_entries_expire_after_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(extraction, "time", SimpleNamespace(time=lambda: clock[0]))
+    cache = ExtractionCache(ttl_seconds=60, max_entries=10)
+    field = FIELDS[0]
+    cache.store("md5:a", [field], "direct/batched", {field['name']: "one"})
+    clock[0] += 60
+    assert cache.lookup("md5:a", [field], "direct/batched") == {field['name']: "one"}
+    clock[0] += 1
+    assert cache.lookup("md5:a", [field], "direct/batched") == {}
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_result_cache_drops_least_recently_used_entries():
+    cache = ExtractionCache(ttl_seconds=60, max_entries=2)
+    field = FIELDS[0]
+    for doc_key in ("md5:a", "md5:b"):
+        cache.store(doc_key, [field], "direct/batched", {field['name']: doc_key})
+    # Reading "md5:a" makes "md5:b" the least recently used entry
+    assert cache.lookup("md5:a", [field], "direct/batched") == {field['name']: "md5:a"}
+    cache.store("md5:c", [field], "direct/batched", {field['name']: "md5:c"})
+    assert len(cache) == 2
+    assert cache.lookup("md5:b", [field], "direct/batched") == {}
+    assert cache.lookup("md5:a", [field], "direct/batched") == {field['name']: "md5:a"}
+    assert cache.lookup("md5:c", [field], "direct/batched") == {field['name']: "md5:c"}
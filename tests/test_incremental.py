@@ -0,0 +1,72 @@
+from pdf_extractor.incremental import (
+    DEFAULT_STAGE,
+    DEFAULT_TABLE,
+    build_merge_query,
+    field_set_id,
+    run_incremental_extract,
+)
+from pdf_extractor.local_cortex import LocalCortexBackend, make_documents
+from pdf_extractor.schema import LOAN_DOC_FIELDS
+
+FIELDS = LOAN_DOC_FIELDS[:5]
+
+
+def make_backend(count=3, **options):
+    docs, expected = make_documents(count, 2000, [field['name'] for field in FIELDS])
+    return LocalCortexBackend(docs, latency=0, latency_per_kchar=0, ddl_latency=0, **options), expected
+
+
+def test_second_run_has_nothing_pending():
+    backend, _ = make_backend()
+    assert run_incremental_extract(backend, FIELDS) == {'pending': 3, 'inserted': 3, 'updated': 0}
+    queries = backend.stats.queries
+    assert run_incremental_extract(backend, FIELDS) == {'pending': 0, 'inserted': 0, 'updated': 0}
+    # No MERGE when nothing is pending: table DDL, stage refresh and the count
+    assert backend.stats.queries - queries <= 6
+
+
+def test_rows_carry_md5_field_set_and_answers():
+    backend, expected = make_backend()
+    run_incremental_extract(backend, FIELDS)
+    (rows,) = backend.extract_tables.values()
+    assert sorted(rows) == sorted(expected)
+    for path, row in rows.items():
+        assert row['md5'] == backend.documents[path].md5
+        assert row['field_set_id'] == field_set_id(FIELDS)
+        assert expected[path][FIELDS[0]['name']] in row['extract_data']
+
+
+def test_changed_file_and_field_set_are_extracted_again():
+    backend, _ = make_backend()
+    run_incremental_extract(backend, FIELDS)
+
+    doc = backend.documents['doc_00001.pdf']
+    doc.text += "\nAmended."
+    doc.md5 = "changed"
+    assert run_incremental_extract(backend, FIELDS)['updated'] == 1
+
+    # An explicit id, as the daily task uses, replaces the derived one
+    assert run_incremental_extract(backend, FIELDS, set_id='loan_docs_v1')['updated'] == 3
+    assert run_incremental_extract(backend, FIELDS, set_id='loan_docs_v1')['pending'] == 0
+
+
+def test_dry_run_only_counts():
+    backend, _ = make_backend()
+    assert run_incremental_extract(backend, FIELDS, dry_run=True)['pending'] == 3
+    assert not backend.extract_tables.get('PDF_EXTRACTOR_DB.PDF_PROCESSING.DOC_EXTRACT')
+
+
+def test_parse_engine_sends_parsed_text():
+    query = build_merge_query(DEFAULT_TABLE, DEFAULT_STAGE, FIELDS, engine="parse", parse_form=1)
+    assert "TO_FILE" not in query
+    assert "PARSE_DOCUMENT(GET_PRESIGNED_URL(" in query
+    assert "text => " in query
+
+
+def test_unencrypted_stage_switches_to_the_parse_engine():
+    backend, expected = make_backend(server_side_encrypted=False)
+    assert run_incremental_extract(backend, FIELDS) == {'pending': 3, 'inserted': 3, 'updated': 0}
+    (rows,) = backend.extract_tables.values()
+    for path, row in rows.items():
+        assert expected[path][FIELDS[0]['name']] in row['extract_data']
+    assert run_incremental_extract(backend, FIELDS)['pending'] == 0
@@ -0,0 +1,115 @@
+import pytest
+
+from pdf_extractor import instrumentation
+from pdf_extractor.extraction import build_extract_query
+from pdf_extractor.instrumentation import RUN_LOG_TABLE, RunTrace, ensure_run_log_table, save_run_log, step
+from pdf_extractor.local_cortex import LocalCortexBackend
+from pdf_extractor.sql import text_source
+
+FIELDS = [{"name": "Company Name", "description": ""}]
+
+
+class RecordingBackend(LocalCortexBackend):
+    """Keeps the text of every statement it runs."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = []
+
+    def execute(self, query):
+        self.statements.append(query)
+        return super().execute(query)
+
+
+@pytest.fixture
+def traced_backend(make_backend):
+    def make(**options):
+        backend, docs, expected = make_backend(**options)
+        backend.trace = RunTrace("run-1")
+        return backend, docs, expected
+
+    return make
+
+
+def test_breakdown_per_stage(traced_backend):
+    backend, docs, _ = traced_backend(count=2)
+    with step(backend, "catalog"):
+        backend.sql("ALTER STAGE pdf_upload_stage REFRESH").collect()
+    for doc in docs:
+        with step(backend, "extract", doc.relative_path):
+            with step(backend, label="Company Name"):
+                backend.sql(*build_extract_query(text_source(doc.text), FIELDS)).collect()
+
+    events = backend.trace.snapshot()
+    assert [event.stage for event in events] == ["catalog", "extract", "extract"]
+    assert events[1].label == f"{docs[0].relative_path} · Company Name"
+    assert all(event.outcome == "ok" and event.query_id for event in events)
+
+    catalog, extract = backend.trace.breakdown()
+    assert (catalog['stage'], catalog['queries']) == ("catalog", 1)
+    assert (extract['stage'], extract['queries'], extract['retries'], extract['failed']) == ("extract", 2, 0, 0)
+    # Input counts the SQL text and the document text sent as bind values
+    assert extract['input_chars'] > sum(len(doc.text) for doc in docs)
+    assert extract['slowest_s'] <= extract['seconds']
+    assert backend.trace.slowest(1)[0].duration_s == max(event.duration_s for event in events)
+    assert backend.trace.elapsed() >= events[-1].duration_s
+
+
+def test_queries_outside_a_step_are_other(traced_backend):
+    backend, _, _ = traced_backend(count=1)
+    backend.sql("ALTER STAGE pdf_upload_stage REFRESH").collect()
+    assert [summary['stage'] for summary in backend.trace.breakdown()] == ["other"]
+
+
+def test_step_without_a_trace_does_nothing(make_backend):
+    backend, _, _ = make_backend(count=1)
+    with step(backend, "extract", "a.pdf"):
+        backend.sql("ALTER STAGE pdf_upload_stage REFRESH").collect()
+    assert backend.trace is None
+
+
+def test_retries_are_separate_attempt_events(traced_backend, make_runner):
+    backend, docs, _ = traced_backend(count=6, throttle_rate=0.3, seed=3)
+    runner = make_runner(backend, max_attempts=10)
+    runner.run(
+        [build_extract_query(text_source(doc.text), FIELDS) for doc in docs],
+        labels=[doc.relative_path for doc in docs],
+    )
+    events = backend.trace.snapshot()
+    retried = [event for event in events if event.attempt > 0]
+    assert len(events) == backend.stats.queries
+    assert len(retried) == sum(runner.errors.retries.values()) > 0
+    assert {event.outcome for event in events if event.outcome != "ok"} == {"throttled"}
+    # Every document ends with one successful attempt, retried or not
+    succeeded = sorted(event.label for event in events if event.outcome == "ok")
+    assert succeeded == sorted(doc.relative_path for doc in docs)
+
+    (summary,) = backend.trace.breakdown()
+    assert summary['retries'] == len(retried)
+    assert summary['failed'] == len(events) - len(docs)
+
+
+def test_save_run_log_inserts_every_event(make_backend, monkeypatch):
+    monkeypatch.setattr(instrumentation, "RUN_LOG_ROWS_PER_INSERT", 2)
+    backend, docs, _ = make_backend(count=1, backend_class=RecordingBackend)
+    trace = RunTrace("run-1")
+    trace.record(("parse", "it's a.pdf", 0), 1700000000.25, "01b2-query", 1200, "ok")
+    trace.record(("extract", "a.pdf · Company Name", 0), 1700000001.5, None, 300, "throttled")
+    trace.record(("extract", "a.pdf · Company Name", 1), 1700000002.0, "01b3-query", 300, "ok")
+
+    ensure_run_log_table(backend)
+    assert save_run_log(backend, trace) == 3
+    inserts = [statement for statement in backend.statements if f"INSERT INTO {RUN_LOG_TABLE}" in statement]
+    assert len(inserts) == 2
+    assert "('run-1', 0, 'parse', 'it''s a.pdf', 1700000000.250000, " in inserts[0]
+    assert "'01b2-query', 1200, 'ok', 0)" in inserts[0]
+    assert "('run-1', 1, 'extract', 'a.pdf · Company Name', 1700000001.500000, " in inserts[0]
+    assert "NULL, 300, 'throttled', 0)" in inserts[0]
+    assert "('run-1', 2, 'extract', " in inserts[1]
+    assert "'01b3-query', 300, 'ok', 1)" in inserts[1]
+
+
+def test_empty_trace_saves_nothing(make_backend):
+    backend, _, _ = make_backend(count=1)
+    assert save_run_log(backend, RunTrace()) == 0
+    assert backend.stats.queries == 0
@@ -0,0 +1,68 @@
+from pdf_extractor.execution import RetryPolicy
+from pdf_extractor.parsing import (
+    file_content_key,
+    load_cached_parse,
+    parse_document,
+    probe_capabilities,
+    store_cached_parse,
+)
+
+from conftest import STAGE_NAME
+
+FAST_RETRIES = RetryPolicy(3, base_delay=0.001, max_delay=0.004)
+
+
+def test_preferred_form_costs_one_query(make_backend):
+    backend, docs, _ = make_backend(count=1)
+    parsed_text, form, errors = parse_document(backend, STAGE_NAME, docs[0].relative_path, preferred_form=2)
+    assert form == 2 and not errors
+    assert "Company Name" in parsed_text
+    assert backend.stats.queries == 1
+
+
+def test_unsupported_forms_fall_through(make_backend):
+    backend, docs, _ = make_backend(count=1, working_parse_forms=(2,))
+    parsed_text, form, errors = parse_document(backend, STAGE_NAME, docs[0].relative_path, retry_policy=FAST_RETRIES)
+    assert form == 2
+    assert [label for label, _ in errors] == ["stage and file name", "presigned URL"]
+    assert backend.stats.queries == 3
+
+
+def test_throttling_is_retried_not_treated_as_unsupported(make_backend):
+    backend, docs, _ = make_backend(count=1, throttle_rate=1.0)
+    parsed_text, form, errors = parse_document(backend, STAGE_NAME, docs[0].relative_path, retry_policy=FAST_RETRIES)
+    assert parsed_text is None and form is None
+    # Every attempt went to the first form; the others were not tried
+    assert len(errors) == 1
+    assert backend.stats.queries == FAST_RETRIES.max_attempts
+
+
+def test_probe_records_working_form(make_backend):
+    backend, docs, _ = make_backend(count=1, working_parse_forms=(1,))
+    capabilities = probe_capabilities(backend, STAGE_NAME, docs[0].relative_path, FAST_RETRIES)
+    assert capabilities['parse_form'] == 1
+    assert capabilities['functions'] == {'AI_EXTRACT': True, 'PARSE_DOCUMENT': True}
+    assert capabilities['inconclusive'] == []
+
+
+def test_probe_under_throttling_is_inconclusive(make_backend):
+    backend, docs, _ = make_backend(count=1, throttle_rate=1.0)
+    capabilities = probe_capabilities(backend, STAGE_NAME, docs[0].relative_path, FAST_RETRIES)
+    assert capabilities['parse_form'] is None
+    assert capabilities['functions'] == {}
+    assert capabilities['inconclusive'] == ['AI_EXTRACT', 'PARSE_DOCUMENT']
+
+
+def test_parse_cache_round_trip(make_backend):
+    backend, docs, _ = make_backend(count=1)
+    file = {'relative_path': docs[0].relative_path, 'full_path': f"{STAGE_NAME}/{docs[0].relative_path}",
+            'size': docs[0].size, 'md5': docs[0].md5}
+    key = file_content_key(file)
+    assert key == f"md5:{docs[0].md5}"
+    assert load_cached_parse(backend, key, {}) is None
+    store_cached_parse(backend, key, file, "it's parsed", {})
+    assert load_cached_parse(backend, key, {}) == "it's parsed"
+
+
+def test_content_key_without_md5_needs_only_the_path():
+    assert file_content_key({'relative_path': "a.pdf", 'md5': None}) == "file:a.pdf:None:None"
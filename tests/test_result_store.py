@@ -0,0 +1,83 @@
+import os
+
+import pandas as pd
+import pytest
+
+from pdf_extractor.result_store import ResultStore
+
+
+@pytest.fixture
+def store():
+    store = ResultStore()
+    store.add(pd.DataFrame([
+        {'relative_path': "loans/a.pdf", 'Name': "Acme", 'City': "Oslo"},
+        {'relative_path': "loans/b.pdf", 'Name': "[Error: throttled]", 'City': "Rome"},
+        {'relative_path': "other/c.pdf", 'Name': "Initech", 'City': None},
+        {'relative_path': "other/d.pdf", 'Name': "Globex", 'City': "  "},
+    ]))
+    yield store
+    store.close()
+
+
+def paths(frame):
+    return list(frame['relative_path'])
+
+
+def test_pages_keep_extraction_order(store):
+    filters = ResultStore.make_filters()
+    assert len(store) == 4
+    assert store.count(filters) == 4
+    assert paths(store.page(filters, 0, page_size=3)) == ["loans/a.pdf", "loans/b.pdf", "other/c.pdf"]
+    assert paths(store.page(filters, 1, page_size=3)) == ["other/d.pdf"]
+    assert list(store.page(filters, 0).columns) == ['relative_path', 'Name', 'City']
+
+
+def test_filters(store):
+    assert paths(store.page(ResultStore.make_filters("errors"), 0)) == ["loans/b.pdf"]
+    assert store.count(ResultStore.make_filters("errors", "City")) == 0
+    assert paths(store.page(ResultStore.make_filters("empty"), 0)) == ["other/c.pdf", "other/d.pdf"]
+    assert store.count(ResultStore.make_filters("empty", "Name")) == 0
+    assert paths(store.page(ResultStore.make_filters(path_contains="LOANS/"), 0)) == ["loans/a.pdf", "loans/b.pdf"]
+    assert store.count(ResultStore.make_filters("empty", "City", "other")) == 2
+    with pytest.raises(ValueError):
+        ResultStore.make_filters("unknown")
+
+
+def test_patches_update_one_cell_and_its_error_flag(store):
+    store.patch("loans/b.pdf", "Name", "Hooli")
+    store.patch("other/c.pdf", "City", "Lima")
+    assert store.count(ResultStore.make_filters("errors")) == 0
+    assert paths(store.page(ResultStore.make_filters("empty"), 0)) == ["other/d.pdf"]
+    row = store.page(ResultStore.make_filters(path_contains="b.pdf"), 0).iloc[0]
+    assert (row['Name'], row['City']) == ("Hooli", "Rome")
+
+
+def test_re_added_rows_replace_and_move_to_the_end(store):
+    store.add(pd.DataFrame([{'relative_path': "loans/a.pdf", 'Name': "Acme 2", 'Zip': "0150"}]))
+    frame = store.page(ResultStore.make_filters(), 0)
+    assert paths(frame)[-1] == "loans/a.pdf"
+    assert list(frame.columns) == ['relative_path', 'Name', 'City', 'Zip']
+    assert pd.isna(frame.iloc[-1]['City'])
+
+
+def test_iter_frames_reads_in_chunks(store):
+    chunks = list(store.iter_frames(rows_per_chunk=3))
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert 'seq' not in chunks[0].columns
+
+
+@pytest.mark.parametrize("name", ["seq", "relative_path"])
+def test_reserved_field_names_are_rejected(name):
+    store = ResultStore()
+    frame = pd.DataFrame([["a.pdf", "x"]], columns=['relative_path', name])
+    with pytest.raises(ValueError, match="reserved"):
+        store.add(frame)
+    store.close()
+
+
+def test_temporary_file_is_removed_on_close():
+    store = ResultStore()
+    path = store.path
+    assert os.path.exists(path)
+    store.close()
+    assert not os.path.exists(path)
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from pdf_extractor.results_table import RESULTS_TABLE, ensure_results_table, write_results
+
+DATA = pd.DataFrame([
+    {'relative_path': "a.pdf", 'Name': "Acme", 'City': "Oslo"},
+    {'relative_path': "b.pdf", 'Name': "[Error: throttled]", 'City': None},
+    {'relative_path': "c.pdf", 'Name': "Globex", 'City': "Rome"},
+])
+
+
+@pytest.fixture
+def backend(make_backend):
+    backend, _, _ = make_backend(count=0)
+    ensure_results_table(backend)
+    return backend
+
+
+def stored(backend):
+    """{(run_id, relative_path, field_name): (value, is_error)}; missing values as None."""
+    return {
+        (row['RUN_ID'], row['RELATIVE_PATH'], row['FIELD_NAME']):
+            (None if pd.isna(row['FIELD_VALUE']) else row['FIELD_VALUE'], row['IS_ERROR'])
+        for row in backend.tables.get(RESULTS_TABLE, [])
+    }
+
+
+def test_chunks_are_merged_in_one_statement(backend):
+    assert write_results(backend, [DATA.iloc[:2], DATA.iloc[2:]], "run-1") == 6
+    rows = stored(backend)
+    assert len(rows) == 6
+    assert rows[("run-1", "a.pdf", "Name")] == ("Acme", False)
+    assert rows[("run-1", "b.pdf", "Name")] == ("[Error: throttled]", True)
+    assert rows[("run-1", "b.pdf", "City")] == (None, False)
+    # The temporary table is gone once the rows are merged
+    assert list(backend.tables) == [RESULTS_TABLE]
+
+
+def test_writing_a_run_again_replaces_its_rows(backend):
+    write_results(backend, DATA, "run-1")
+    write_results(backend, DATA.assign(City="Lima"), "run-1")
+    write_results(backend, DATA.iloc[:1], "run-2")
+    rows = stored(backend)
+    assert len(rows) == 6 + 2
+    assert rows[("run-1", "a.pdf", "City")] == ("Lima", False)
+
+
+def test_failed_write_leaves_the_table_untouched(backend):
+    def chunks():
+        yield DATA.iloc[:2]
+        raise RuntimeError("connection lost")
+
+    with pytest.raises(RuntimeError):
+        write_results(backend, chunks(), "run-1")
+    assert stored(backend) == {}
+    assert backend.tables == {}
+
+
+def test_empty_results_write_nothing(backend):
+    assert write_results(backend, DATA.iloc[0:0], "run-1") == 0
+    assert stored(backend) == {}
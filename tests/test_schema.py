@@ -0,0 +1,158 @@
+import os
+
+import pytest
+
+from pdf_extractor.incremental import field_set_id
+from pdf_extractor.schema import (
+    FIELD_TYPES,
+    LOAN_DOC_FIELDS,
+    NORMALIZERS,
+    build_typed_select,
+    build_typed_table_statements,
+    column_names,
+    main,
+    materialize_typed_table,
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIELDS = [
+    {"name": "Company Name", "description": ""},
+    {"name": "Date of Issue", "description": "", "type": "date"},
+    {"name": "# of Employees", "description": "", "type": "integer"},
+]
+
+
+def converted(field):
+    """The outermost expression of a one-field typed SELECT."""
+    select = build_typed_select([field], "src")
+    return select.splitlines()[2].strip()
+
+
+def normalized(field):
+    """The normalization level of a one-field typed SELECT."""
+    select = build_typed_select([field], "src")
+    return select.split("FROM (\nSELECT")[1].splitlines()[2].strip()
+
+
+def test_generator_output_matches_typed_extract_sql(capsys):
+    main(["--template", "Loan Docs: Full", "--cluster-by", "DATE_OF_ISSUE"])
+    generated = capsys.readouterr().out
+    with open(os.path.join(REPO_ROOT, "Typed_Extract.sql"), encoding="utf-8") as handle:
+        checked_in = handle.read()
+    assert generated in checked_in
+    assert f"field set {field_set_id(LOAN_DOC_FIELDS)}" in generated
+
+
+@pytest.mark.parametrize("type_name, conversion", [
+    ("string", "X::STRING AS X"),
+    ("number", "TRY_TO_NUMBER(REGEXP_REPLACE(X, '[^0-9.-]', ''), 38, 4)::NUMBER(38, 4) AS X"),
+    ("integer", "TRY_TO_NUMBER(REGEXP_REPLACE(X, '[^0-9-]', ''))::NUMBER(38, 0) AS X"),
+    ("date", "COALESCE(TRY_TO_DATE(X), TRY_TO_DATE(X, 'MM/DD/YYYY'), TRY_TO_DATE(X, 'DD-MON-YYYY'), "
+             "TRY_TO_DATE(X, 'MMMM DD, YYYY'))::DATE AS X"),
+    ("boolean", "TRY_TO_BOOLEAN(X)::BOOLEAN AS X"),
+])
+def test_target_types(type_name, conversion):
+    assert converted({"name": "x", "type": type_name}) == conversion
+
+
+def test_every_target_type_is_tested():
+    assert set(FIELD_TYPES) == {"string", "number", "integer", "date", "boolean"}
+
+
+@pytest.mark.parametrize("rule, expression", [
+    ("trim", "TRIM(X) AS X"),
+    ("collapse_whitespace", "REGEXP_REPLACE(X, '[[:space:]]+', ' ') AS X"),
+    ("null_placeholders", "IFF(UPPER(X) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, X) AS X"),
+    ("upper", "UPPER(X) AS X"),
+    ("lower", "LOWER(X) AS X"),
+    ("digits", "REGEXP_REPLACE(X, '[^0-9]', '') AS X"),
+])
+def test_normalization_rules(rule, expression):
+    assert normalized({"name": "x", "normalize": (rule,)}) == expression
+
+
+def test_every_normalization_rule_is_tested():
+    assert set(NORMALIZERS) == {"trim", "collapse_whitespace", "null_placeholders", "upper", "lower", "digits"}
+
+
+def test_rules_apply_in_order_and_default_to_trim_and_placeholders():
+    assert normalized({"name": "x", "normalize": ("trim", "digits")}) == "REGEXP_REPLACE(TRIM(X), '[^0-9]', '') AS X"
+    assert normalized({"name": "x"}) == (
+        "IFF(UPPER(TRIM(X)) IN ('', 'N/A', 'NA', 'NONE', 'NULL', 'UNKNOWN'), NULL, TRIM(X)) AS X"
+    )
+    assert normalized({"name": "x", "normalize": ()}) == "X AS X"
+
+
+def test_raw_answers_are_read_as_text():
+    select = build_typed_select(FIELDS, "src")
+    assert "TO_VARCHAR(extract_data['response']['Date of Issue']) AS DATE_OF_ISSUE" in select
+    assert select.endswith("FROM src\n)\n)")
+
+
+@pytest.mark.parametrize("field", [
+    {"name": "x", "type": "money"},
+    {"name": "x", "normalize": ("trim", "titlecase")},
+])
+def test_unknown_types_and_rules_are_rejected(field):
+    with pytest.raises(ValueError):
+        build_typed_select([field], "src")
+
+
+def test_column_names():
+    fields = FIELDS + [
+        {"name": "Company-Name", "description": ""},
+        {"name": "relative_path", "description": ""},
+        {"name": "2nd Signer", "description": ""},
+        {"name": "Renamed", "description": "", "column": "other"},
+    ]
+    assert column_names(fields) == [
+        "COMPANY_NAME", "DATE_OF_ISSUE", "NUM_OF_EMPLOYEES",
+        "COMPANY_NAME_2", "RELATIVE_PATH_2", "F_2ND_SIGNER", "OTHER",
+    ]
+
+
+def test_dynamic_table_ddl():
+    (statement,) = build_typed_table_statements(
+        FIELDS, "typed", "src", warehouse="wh", target_lag="5 minutes", cluster_by=["DATE_OF_ISSUE"],
+    )
+    assert statement.startswith(
+        "CREATE OR REPLACE DYNAMIC TABLE typed\n"
+        "TARGET_LAG = '5 minutes'\n"
+        "WAREHOUSE = wh\n"
+        "CLUSTER BY (DATE_OF_ISSUE)\n"
+        f"COMMENT = 'Typed AI_EXTRACT fields, field set {field_set_id(FIELDS)}'\n"
+        "AS\nSELECT\n    relative_path,\n"
+    )
+    with pytest.raises(ValueError):
+        build_typed_table_statements(FIELDS, "typed", "src")
+
+
+def test_plain_table_is_merged_on_relative_path():
+    statements = build_typed_table_statements(
+        FIELDS, "typed", "src", dynamic=False, key_columns=("relative_path", "md5"),
+    )
+    create, *alters, merge = statements
+    assert create.startswith(
+        "CREATE TABLE IF NOT EXISTS typed (\n"
+        "    relative_path STRING,\n    md5 STRING,\n    COMPANY_NAME STRING,\n"
+        "    DATE_OF_ISSUE DATE,\n    NUM_OF_EMPLOYEES NUMBER(38, 0)\n)"
+    )
+    assert alters[-1] == "ALTER TABLE typed ADD COLUMN IF NOT EXISTS NUM_OF_EMPLOYEES NUMBER(38, 0)"
+    assert len(alters) == 5
+    assert merge.startswith("MERGE INTO typed t\nUSING (\nSELECT\n    relative_path,\n    md5,\n")
+    assert "ON t.relative_path = s.relative_path\n" in merge
+    assert ("WHEN MATCHED THEN UPDATE SET md5 = s.md5, COMPANY_NAME = s.COMPANY_NAME, "
+            "DATE_OF_ISSUE = s.DATE_OF_ISSUE, NUM_OF_EMPLOYEES = s.NUM_OF_EMPLOYEES\n") in merge
+    assert merge.endswith(
+        "WHEN NOT MATCHED THEN INSERT (relative_path, md5, COMPANY_NAME, DATE_OF_ISSUE, NUM_OF_EMPLOYEES)\n"
+        "    VALUES (s.relative_path, s.md5, s.COMPANY_NAME, s.DATE_OF_ISSUE, s.NUM_OF_EMPLOYEES)"
+    )
+    with pytest.raises(ValueError):
+        build_typed_table_statements(FIELDS, "typed", "src", dynamic=False, key_columns=("md5",))
+
+
+def test_materialize_runs_every_statement(make_backend):
+    backend, _, _ = make_backend(count=0)
+    statements = materialize_typed_table(backend, FIELDS, "typed", "src", dynamic=False)
+    assert backend.stats.queries == len(statements) == 1 + 4 + 1
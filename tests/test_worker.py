@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from pdf_extractor import local_cortex, worker
+from pdf_extractor.incremental import field_set_id
+from pdf_extractor.results_table import RESULTS_TABLE, write_results
+from pdf_extractor.schema import FIELD_TEMPLATES
+from pdf_extractor.worker import load_manifest, main, manifest_path, open_for_append, shard_of
+
+
+@pytest.fixture
+def run_worker(tmp_path, capsys):
+    output_dir = str(tmp_path)
+
+    def run(*extra):
+        totals = main([
+            "--local-docs", "30", "--local-chars", "2000", "--local-latency", "0",
+            "--output-dir", output_dir, *extra,
+        ])
+        capsys.readouterr()
+        return totals
+
+    run.output_dir = output_dir
+    return run
+
+
+def test_shards_split_every_file_once():
+    paths = [f"doc_{idx:05d}.pdf" for idx in range(200)]
+    shards = [shard_of(path, 4) for path in paths]
+    assert set(shards) == {0, 1, 2, 3}
+    assert shards == [shard_of(path, 4) for path in paths]
+
+
+def test_rerun_resumes_from_the_manifest(run_worker):
+    first = run_worker()
+    assert (first['done'], first['failed'], first['skipped']) == (30, 0, 0)
+
+    manifest = load_manifest(run_worker.output_dir)
+    assert len(manifest) == 30
+    fields = FIELD_TEMPLATES["Loan Docs: Full"]
+    assert {entry['field_set_id'] for entry in manifest.values()} == {field_set_id(fields)}
+
+    second = run_worker()
+    assert (second['done'], second['skipped']) == (0, 30)
+    # Only the stage refresh and the file listing
+    assert second['queries'] <= 2
+
+
+def test_failed_files_are_retried_unless_skipped(run_worker):
+    run_worker()
+    path = manifest_path(run_worker.output_dir, 0, 1)
+    entry = dict(next(iter(load_manifest(run_worker.output_dir).values())), status="failed")
+    entry['finished_at'] += 1
+    with open_for_append(path) as handle:
+        handle.write(json.dumps(entry) + "\n")
+
+    assert run_worker("--skip-failed")['done'] == 0
+    assert run_worker()['done'] == 1
+
+
+def test_other_field_list_extracts_again(run_worker, tmp_path):
+    run_worker()
+    fields_file = tmp_path / "fields.json"
+    fields_file.write_text(json.dumps(FIELD_TEMPLATES["Loan Docs: Full"][:3]))
+    assert run_worker("--fields-file", str(fields_file))['done'] == 30
+
+
+def test_partial_manifest_line_is_ignored(run_worker):
+    run_worker()
+    path = manifest_path(run_worker.output_dir, 0, 1)
+    with open(path, "a", encoding="utf-8") as handle:
+        handle.write('{"relative_path": "doc_00000.pdf", "sta')
+    assert len(load_manifest(run_worker.output_dir)) == 30
+
+    with open_for_append(path) as handle:
+        handle.write(json.dumps({'relative_path': "new.pdf", 'finished_at': 0}) + "\n")
+    assert "new.pdf" in load_manifest(run_worker.output_dir)
+
+
+def test_failed_write_back_leaves_files_pending(run_worker, monkeypatch):
+    def fail(session, data, run_id):
+        raise RuntimeError("write_pandas failed")
+
+    monkeypatch.setattr(worker, "write_results", fail)
+    with pytest.raises(RuntimeError):
+        run_worker("--write-back")
+    assert load_manifest(run_worker.output_dir) == {}
+
+    sessions = []
+
+    def write_and_keep(session, data, run_id):
+        sessions.append(session)
+        return write_results(session, data, run_id)
+
+    monkeypatch.setattr(worker, "write_results", write_and_keep)
+    assert run_worker("--write-back")['done'] == 30
+    rows = sessions[0].tables[RESULTS_TABLE]
+    assert len({row['RELATIVE_PATH'] for row in rows}) == 30
+    assert len(rows) == 30 * len(FIELD_TEMPLATES["Loan Docs: Full"])
+
+
+def test_unencrypted_stage_is_parsed_instead(run_worker, monkeypatch):
+    class UnencryptedStage(local_cortex.LocalCortexBackend):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, server_side_encrypted=False, **kwargs)
+
+    monkeypatch.setattr(local_cortex, "LocalCortexBackend", UnencryptedStage)
+    first = run_worker()
+    assert (first['done'], first['failed']) == (30, 0)
+    assert run_worker()['skipped'] == 30